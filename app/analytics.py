@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.colors import month_fingerprint
+from app.fileio import read_bytes
+from app.history_frame import HistoryFrame
+
+ANALYTICS_FILENAME = "analytics.json"
+ANALYTICS_VERSION = 1
+
+
+class Analytics:
+    """
+    Trend index over a listening history.
+
+    `months[month_key]` holds columns aligned with that month's artists (chart order):
+    `rank_change` (previous rank minus current rank, None for new entries), `playcount_delta`
+    (None for new entries) and `streak` (consecutive stored months in the chart), plus the `new`
+    entries and the `dropouts` relative to the previous stored month. `lifetime` holds columnar
+    per-artist totals over every stored chart, sorted by playcount.
+
+    Like the color ledger, the cumulative per-artist state is checkpointed after the second-newest
+    month together with a chained fingerprint of the months up to it, so a rerun that only changed
+    the newest month recomputes that one month.
+    """
+
+    __slots__ = ("through", "fingerprint", "checkpoint", "months", "lifetime")
+
+    def __init__(
+        self,
+        through: Optional[str] = None,
+        fingerprint: str = "",
+        checkpoint: Optional[Dict[str, List[Any]]] = None,
+        months: Optional[Dict[str, Dict[str, Any]]] = None,
+        lifetime: Optional[Dict[str, List[Any]]] = None,
+    ) -> None:
+        self.through = through
+        self.fingerprint = fingerprint
+        self.checkpoint: Dict[str, List[Any]] = checkpoint or {}
+        self.months: Dict[str, Dict[str, Any]] = months or {}
+        self.lifetime: Dict[str, List[Any]] = lifetime or {}
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[Analytics]:
+        try:
+            return cls.from_bytes(read_bytes(path))
+        except OSError:
+            return None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Optional[Analytics]:
+        try:
+            raw = json.loads(data)
+        except ValueError:
+            return None
+        if raw.get("version") != ANALYTICS_VERSION:
+            return None
+        return cls(
+            through=raw.get("through"),
+            fingerprint=raw.get("fingerprint", ""),
+            checkpoint=raw.get("checkpoint") or {},
+            months=raw.get("months") or {},
+            lifetime=raw.get("lifetime") or {},
+        )
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            "version": ANALYTICS_VERSION,
+            "through": self.through,
+            "fingerprint": self.fingerprint,
+            "checkpoint": self.checkpoint,
+            "months": self.months,
+            "lifetime": self.lifetime,
+        }
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _month_fingerprints(frame: HistoryFrame) -> List[str]:
+    fingerprints: List[str] = []
+    previous = ""
+    for idx, month_key in enumerate(frame.month_keys):
+        entries = (
+            f"{frame.artist_names[frame.artist_ids[pos]]}\t{frame.ranks[pos]}\t{frame.playcounts[pos]}"
+            for pos in frame.month_range(idx)
+        )
+        previous = month_fingerprint(previous, month_key, entries)
+        fingerprints.append(previous)
+    return fingerprints
+
+
+def compute_analytics(frame: HistoryFrame, previous: Optional[Analytics] = None) -> Analytics:
+    """
+    Compute the trend index for `frame`, reusing `previous` up to its checkpoint when it still matches.
+
+    Per-artist state lives in typed arrays indexed by the frame's artist ids, and each month is one
+    pass over its slice of the frame's columns plus a lookup table of the previous month's entries.
+    """
+    fingerprints = _month_fingerprints(frame)
+    artist_count = len(frame.artist_names)
+    totals = array("q", [0]) * artist_count
+    months_in_chart = array("l", [0]) * artist_count
+    best_rank = array("l", [0]) * artist_count
+    first_month = array("l", [-1]) * artist_count
+    last_month = array("l", [-1]) * artist_count
+    streaks = array("l", [0]) * artist_count
+
+    reuse_through = -1
+    if previous is not None and previous.through is not None:
+        idx = frame.month_index(previous.through)
+        if idx is not None and fingerprints[idx] == previous.fingerprint:
+            reuse_through = idx
+    if reuse_through >= 0:
+        for name, values in previous.checkpoint.items():
+            artist_id = frame.artist_id(name)
+            if artist_id is None:
+                continue
+            playcount, months, best, first, last, streak = values
+            totals[artist_id] = playcount
+            months_in_chart[artist_id] = months
+            best_rank[artist_id] = best
+            first_month[artist_id] = frame.month_index(first)
+            last_month[artist_id] = frame.month_index(last)
+            streaks[artist_id] = streak
+
+    analytics = Analytics()
+    checkpoint_idx = len(frame) - 2
+    names = frame.artist_names
+    for month_idx, month_key in enumerate(frame.month_keys):
+        if month_idx <= reuse_through:
+            analytics.months[month_key] = previous.months[month_key]
+            continue
+
+        previous_entries: Dict[int, int] = {}
+        if month_idx > 0:
+            previous_entries = {frame.artist_ids[pos]: pos for pos in frame.month_range(month_idx - 1)}
+        rank_change: List[Optional[int]] = []
+        playcount_delta: List[Optional[int]] = []
+        streak_column: List[int] = []
+        new_entries: List[str] = []
+        current_ids = set()
+        for pos in frame.month_range(month_idx):
+            artist_id = frame.artist_ids[pos]
+            rank, playcount = frame.ranks[pos], frame.playcounts[pos]
+            current_ids.add(artist_id)
+            previous_pos = previous_entries.get(artist_id)
+            if previous_pos is None:
+                rank_change.append(None)
+                playcount_delta.append(None)
+                new_entries.append(names[artist_id])
+            else:
+                rank_change.append(frame.ranks[previous_pos] - rank)
+                playcount_delta.append(playcount - frame.playcounts[previous_pos])
+
+            streaks[artist_id] = streaks[artist_id] + 1 if last_month[artist_id] == month_idx - 1 else 1
+            streak_column.append(streaks[artist_id])
+            totals[artist_id] += playcount
+            months_in_chart[artist_id] += 1
+            if rank and (not best_rank[artist_id] or rank < best_rank[artist_id]):
+                best_rank[artist_id] = rank
+            if first_month[artist_id] < 0:
+                first_month[artist_id] = month_idx
+            last_month[artist_id] = month_idx
+
+        analytics.months[month_key] = {
+            "rank_change": rank_change,
+            "playcount_delta": playcount_delta,
+            "streak": streak_column,
+            "new": new_entries,
+            "dropouts": [names[artist_id] for artist_id in previous_entries if artist_id not in current_ids],
+        }
+        if month_idx == checkpoint_idx:
+            analytics.through = month_key
+            analytics.fingerprint = fingerprints[month_idx]
+            analytics.checkpoint = {
+                names[artist_id]: [
+                    totals[artist_id],
+                    months_in_chart[artist_id],
+                    best_rank[artist_id],
+                    frame.month_keys[first_month[artist_id]],
+                    frame.month_keys[last_month[artist_id]],
+                    streaks[artist_id],
+                ]
+                for artist_id in range(artist_count)
+                if last_month[artist_id] >= 0
+            }
+
+    if 0 <= checkpoint_idx <= reuse_through:
+        analytics.through = previous.through
+        analytics.fingerprint = previous.fingerprint
+        analytics.checkpoint = previous.checkpoint
+
+    latest = len(frame) - 1
+    ranked = sorted(
+        (artist_id for artist_id in range(artist_count) if last_month[artist_id] >= 0),
+        key=lambda artist_id: (-totals[artist_id], names[artist_id]),
+    )
+    analytics.lifetime = {
+        "name": [names[artist_id] for artist_id in ranked],
+        "playcount": [totals[artist_id] for artist_id in ranked],
+        "months": [months_in_chart[artist_id] for artist_id in ranked],
+        "best_rank": [best_rank[artist_id] for artist_id in ranked],
+        "first_month": [frame.month_keys[first_month[artist_id]] for artist_id in ranked],
+        "last_month": [frame.month_keys[last_month[artist_id]] for artist_id in ranked],
+        # Current streak: only artists in the newest month are still on one.
+        "streak": [streaks[artist_id] if last_month[artist_id] == latest else 0 for artist_id in ranked],
+    }
+    return analytics
+
+
+def update_analytics(frame: HistoryFrame, output_dir: Path | str = "site") -> Analytics:
+    """Recompute the analytics index next to the site, reusing the previous `analytics.json` checkpoint."""
+    return compute_analytics(frame, Analytics.load(Path(output_dir) / ANALYTICS_FILENAME))
@@ -1,21 +1,356 @@
+from __future__ import annotations
+
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from app import metrics
+from app.response_cache import ResponseCache
+
+API_ROOT = "https://ws.audioscrobbler.com/2.0/"
+DEFAULT_TIMEOUT = 10
+DEFAULT_RATE_LIMIT = 5.0  # requests per second, Last.fm's documented fair-use ceiling
+DEFAULT_BURST = 5
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_POOL_SIZE = 16
+DEFAULT_PAGE_SIZE = 1000  # largest page Last.fm serves for chart methods
+DEFAULT_PAGE_CONCURRENCY = 4
+RECENT_TRACKS_PAGE_SIZE = 200  # user.getrecenttracks maximum
+
+RATE_LIMIT_ERROR = 29
+# 11 = service offline, 16 = temporary error, 29 = rate limit exceeded
+RETRYABLE_LASTFM_ERRORS = {11, 16, RATE_LIMIT_ERROR}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LastFmError(RuntimeError):
+    """Error payload returned by the Last.fm API."""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(f"Last.fm error {code}: {message}")
+        self.code = code
+
+
+class _RetryableResponse(Exception):
+    def __init__(self, reason: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire` blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class LastFmClient:
+    """
+    Last.fm API client with a keep-alive connection pool, rate limiting and retries.
+
+    One instance can be shared between threads: the session's connection pool holds up to
+    `pool_size` connections and the token bucket enforces `rate_limit` requests per second
+    across all of them. Responses with HTTP 429/5xx or Last.fm errors 11/16/29 are retried
+    with jittered exponential backoff, other errors are raised immediately. With a `cache`,
+    successful responses are stored and served from disk until they expire.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        burst: int = DEFAULT_BURST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.api_key = api_key
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_limit, burst)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    def __enter__(self) -> LastFmClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def request(self, method: str, refresh: bool = False, **params: Any) -> Dict[str, Any]:
+        """
+        Call a Last.fm API method and return the decoded JSON payload.
+
+        Args:
+            method: Last.fm API method, e.g. `user.gettopartists`.
+            refresh: Skip the cache lookup (the fresh response is still stored).
+            params: Method parameters.
+        """
+        query = {"method": method, **params, "api_key": self.api_key, "format": "json"}
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(query)
+            if cached is not None:
+                metrics.count("http_cache_hits")
+                return cached
+
+        data = self._send_with_retries(query)
+        if self.cache is not None:
+            self.cache.put(query, data)
+        return data
+
+    def _send_with_retries(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self._send(query)
+            except (_RetryableResponse, requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.max_retries:
+                    if isinstance(exc, _RetryableResponse):
+                        raise RuntimeError(f"Last.fm request failed after {attempt + 1} attempts: {exc}") from None
+                    raise
+                time.sleep(self._backoff_delay(attempt, getattr(exc, "retry_after", None)))
+                attempt += 1
+
+    def top_artists(
+        self,
+        user: str,
+        period: str = "1month",
+        limit: int = 15,
+        page: int = 1,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """Fetches the top artists for a given Last.fm user over a specified time period."""
+        return self.request(
+            "user.gettopartists",
+            refresh=refresh,
+            user=user,
+            period=period,  # overall | 7day | 1month | 3month | 6month | 12month
+            limit=limit,
+            page=page,
+        )
+
+    def weekly_chart_list(self, user: str, refresh: bool = False) -> List[Dict[str, str]]:
+        """The `{"from", "to"}` unix-timestamp ranges Last.fm has weekly charts for, oldest first."""
+        payload = self.request("user.getweeklychartlist", refresh=refresh, user=user)
+        return _list_items(payload, "weeklychartlist", "chart")
 
+    def weekly_artist_chart(self, user: str, from_ts: int, to_ts: int, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Artist playcounts for one weekly chart range (past weeks never change, so they cache well)."""
+        payload = self.request("user.getweeklyartistchart", refresh=refresh, user=user, to=to_ts, **{"from": from_ts})
+        return _list_items(payload, "weeklyartistchart", "artist")
 
-def fetch_top_artists(api_key: str, user: str, period: str = "1month", limit: int = 15, page: int = 1) -> dict:
+    def iter_top_artists(
+        self,
+        user: str,
+        period: str = "overall",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+        refresh: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every artist of a user's chart, page by page, in rank order.
+
+        The first page tells us `@attr.totalPages`; the remaining pages are prefetched with at most
+        `concurrency` requests in flight, so only that many pages are ever held in memory.
+        """
+
+        def fetch_page(page: int) -> Dict[str, Any]:
+            return self.top_artists(user=user, period=period, limit=page_size, page=page, refresh=refresh)
+
+        first = fetch_page(1)
+        yield from _list_items(first, "topartists", "artist")
+        for payload in _prefetch_pages(fetch_page, range(2, _total_pages(first, "topartists") + 1), concurrency):
+            yield from _list_items(payload, "topartists", "artist")
+
+    def iter_recent_tracks(
+        self,
+        user: str,
+        from_ts: Optional[int] = None,
+        to_ts: Optional[int] = None,
+        page_size: int = RECENT_TRACKS_PAGE_SIZE,
+        concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield a user's scrobbles between `from_ts` and `to_ts` (unix seconds), oldest first.
+
+        Last.fm pages newest first, so after the first page reveals `totalPages` the remaining pages are
+        fetched from the last one backwards (prefetching `concurrency` at a time) and each page is reversed.
+        `to_ts` defaults to "now" and is pinned for the whole stream so page boundaries don't shift while
+        we read. The currently playing track (no timestamp yet) is skipped. Responses are never cached.
+        """
+        if to_ts is None:
+            to_ts = int(time.time())
+        params: Dict[str, Any] = {"user": user, "limit": page_size, "to": to_ts, "extended": 1}
+        if from_ts is not None:
+            params["from"] = from_ts
+
+        def fetch_page(page: int) -> Dict[str, Any]:
+            return self._send_with_retries(
+                {"method": "user.getrecenttracks", **params, "page": page, "api_key": self.api_key, "format": "json"}
+            )
+
+        first = fetch_page(1)
+        total_pages = _total_pages(first, "recenttracks")
+        payloads = _prefetch_pages(fetch_page, range(total_pages, 1, -1), concurrency)
+        for payload in itertools.chain(payloads, [first]):
+            for track in reversed(_list_items(payload, "recenttracks", "track")):
+                if "date" in track:
+                    yield track
+
+    def _send(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        r = self.session.get(API_ROOT, params=query, timeout=self.timeout)
+        metrics.count("http_requests")
+        if r.status_code in RETRYABLE_STATUS_CODES:
+            raise _RetryableResponse(f"HTTP {r.status_code}", _retry_after(r))
+        r.raise_for_status()
+        data = r.json()
+        if isinstance(data, dict) and "error" in data:
+            if data["error"] in RETRYABLE_LASTFM_ERRORS:
+                raise _RetryableResponse(f"Last.fm error {data['error']}: {data.get('message')}")
+            raise LastFmError(data["error"], data.get("message", ""))
+        return data
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        ceiling = min(self.backoff_max, self.backoff_base * (2**attempt))
+        delay = random.uniform(0, ceiling)  # "full jitter" keeps parallel workers from retrying in lockstep
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def _total_pages(payload: Dict[str, Any], root: str) -> int:
+    try:
+        return int((payload.get(root) or {}).get("@attr", {}).get("totalPages") or 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _list_items(payload: Dict[str, Any], root: str, item: str) -> List[Dict[str, Any]]:
+    items = (payload.get(root) or {}).get(item) or []
+    # Last.fm collapses single-element lists into a bare object.
+    return [items] if isinstance(items, dict) else items
+
+
+def _prefetch_pages(
+    fetch_page: Callable[[int], Dict[str, Any]],
+    pages: Iterable[int],
+    concurrency: int,
+) -> Iterator[Dict[str, Any]]:
+    """Fetch `pages` on a small thread pool and yield payloads in order, keeping `concurrency` requests in flight."""
+    pages = iter(pages)
+    in_flight: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        try:
+            for page in pages:
+                in_flight.append(pool.submit(fetch_page, page))
+                if len(in_flight) >= concurrency:
+                    break
+            while in_flight:
+                payload = in_flight.popleft().result()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    in_flight.append(pool.submit(fetch_page, next_page))
+                yield payload
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+_clients: Dict[str, LastFmClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str) -> LastFmClient:
+    """Return the process-wide shared client for `api_key`, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = LastFmClient(api_key)
+        return client
+
+
+def configure_client(api_key: str, **client_options: Any) -> LastFmClient:
+    """Replace the shared client for `api_key` with one built from `client_options` (e.g. `cache=`)."""
+    with _clients_lock:
+        previous = _clients.get(api_key)
+        client = _clients[api_key] = LastFmClient(api_key, **client_options)
+    if previous is not None:
+        previous.close()
+    return client
+
+
+def fetch_top_artists(
+    api_key: str,
+    user: str,
+    period: str = "1month",
+    limit: int = 15,
+    page: int = 1,
+    refresh: bool = False,
+) -> dict:
     """Fetches the top artists for a given Last.fm user over a specified time period."""
-    endpoint = "https://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "user.gettopartists",
-        "user": user,
-        "api_key": api_key,
-        "period": period,  # overall | 7day | 1month | 3month | 6month | 12month
-        "limit": limit,
-        "page": page,
-        "format": "json",
-    }
-    r = requests.get(endpoint, params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    if isinstance(data, dict) and "error" in data:
-        raise RuntimeError(f"Last.fm error {data['error']}: {data['message']}")
-    return data
+    return get_client(api_key).top_artists(user=user, period=period, limit=limit, page=page, refresh=refresh)
+
+
+def iter_top_artists(
+    api_key: str,
+    user: str,
+    period: str = "overall",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    refresh: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """Stream a user's full artist chart page by page (see `LastFmClient.iter_top_artists`)."""
+    return get_client(api_key).iter_top_artists(
+        user=user,
+        period=period,
+        page_size=page_size,
+        concurrency=concurrency,
+        refresh=refresh,
+    )
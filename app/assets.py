@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import importlib.util
+import os
+import re
+import warnings
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from app.fileio import atomic_write_bytes
+
+try:  # optional: emit `.br` variants too when the brotli package is installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+ASSET_DIR = "assets"
+# The page draws a single scatter trace, so it ships plotly.js's `basic` partial bundle (scatter, bar,
+# pie; ~1 MB instead of the 4.8 MB full bundle). It is not part of the plotly Python package, so it is
+# vendored here from npm, at the plotly.js version bundled by the plotly release pinned in uv.lock:
+#   npm pack plotly.js-basic-dist-min@3.2.0 && tar -xzf plotly.js-basic-dist-min-3.2.0.tgz package/plotly-basic.min.js
+VENDOR_DIR = Path(__file__).parent / "vendor"
+PLOTLY_BASIC_JS = VENDOR_DIR / "plotly-basic.min.js"
+# Point at another bundle (e.g. a custom scatter-only build) to ship that instead.
+PLOTLY_JS_PATH = os.environ.get("PLOTLY_JS_PATH")
+
+_INLINE_SCRIPT = re.compile(r"(<script>)(.*?)(</script>)", re.DOTALL)
+
+
+@dataclass
+class StaticAsset:
+    """
+    A content-addressed file under `assets/`. The digest is computed once; the precompressed variants
+    (keyed by suffix) only when first asked for, i.e. when the asset actually has to be written.
+    """
+
+    stem: str
+    suffix: str
+    data: bytes
+    digest: str
+
+    @property
+    def filename(self) -> str:
+        return f"{self.stem}.{self.digest[:12]}{self.suffix}"
+
+    @property
+    def relpath(self) -> str:
+        return f"{ASSET_DIR}/{self.filename}"
+
+    @functools.cached_property
+    def variants(self) -> Dict[str, bytes]:
+        return compress_variants(self.data)
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """Precompressed copies for static servers (`gzip_static`, `brotli_static`), reproducible byte for byte."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data)
+    return variants
+
+
+def variant_suffixes() -> List[str]:
+    return [".gz", ".br"] if brotli is not None else [".gz"]
+
+
+def make_asset(stem: str, suffix: str, data: bytes) -> StaticAsset:
+    return StaticAsset(stem=stem, suffix=suffix, data=data, digest=hashlib.sha256(data).hexdigest())
+
+
+def plotly_bundle_path() -> Path:
+    """
+    `PLOTLY_JS_PATH`, else the vendored basic bundle, else (with a warning) the full bundle shipped
+    inside the installed plotly package, whose plotly.js version follows the installed release.
+
+    The page needs plotly.js 3 or newer (layout titles use the `{text: ...}` form).
+    """
+    if PLOTLY_JS_PATH:
+        return Path(PLOTLY_JS_PATH)
+    if PLOTLY_BASIC_JS.exists():
+        return PLOTLY_BASIC_JS
+    spec = importlib.util.find_spec("plotly")  # locates the package without importing it
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError(f"No plotly.js bundle: vendor {PLOTLY_BASIC_JS} or set PLOTLY_JS_PATH.")
+    warnings.warn(
+        f"{PLOTLY_BASIC_JS} is missing; shipping the full plotly.js bundle from the plotly package instead.",
+        stacklevel=2,
+    )
+    return Path(spec.submodule_search_locations[0]) / "package_data" / "plotly.min.js"
+
+
+@functools.lru_cache(maxsize=None)
+def plotly_asset() -> StaticAsset:
+    """The Plotly bundle, read and hashed once per process."""
+    return make_asset("plotly", ".min.js", plotly_bundle_path().read_bytes())
+
+
+def ensure_asset(root: Path, asset: StaticAsset) -> Path:
+    """
+    Make sure `root/assets/` holds `asset` and its precompressed variants; returns the asset's path.
+
+    The name embeds the content hash, so a file that is already there with the right size is
+    trusted and nothing is read, compressed or written. That also makes it safe for many sites
+    (and worker processes) to share one copy under a common root.
+    """
+    target = root / asset.relpath
+    if not _has_size(target, len(asset.data)):
+        atomic_write_bytes(target, asset.data)
+    for suffix in variant_suffixes():
+        variant = target.with_name(target.name + suffix)
+        if not variant.exists():
+            atomic_write_bytes(variant, asset.variants[suffix])
+    return target
+
+
+def prune_asset_versions(root: Path, asset: StaticAsset) -> None:
+    """Remove other versions of `asset` from `root/assets/`; only call once no page still references them."""
+    keep = {asset.filename} | {asset.filename + suffix for suffix in variant_suffixes()}
+    for stale in (root / ASSET_DIR).glob(f"{asset.stem}.*{asset.suffix}*"):
+        if stale.name not in keep:
+            stale.unlink()
+
+
+def _has_size(path: Path, size: int) -> bool:
+    try:
+        return path.stat().st_size == size
+    except OSError:
+        return False
+
+
+def gzip_tee(chunks: Iterable[bytes], sink: List[bytes]) -> Iterator[bytes]:
+    """Pass `chunks` through unchanged while appending their gzip encoding to `sink`."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)  # wbits=31: gzip container, zero mtime
+    for chunk in chunks:
+        sink.append(compressor.compress(chunk))
+        yield chunk
+    sink.append(compressor.flush())
+
+
+def minify_js(source: str) -> str:
+    """
+    Strip comments, indentation and blank lines from a script, keeping line breaks (so automatic
+    semicolon insertion behaves the same) and leaving string literals alone.
+
+    Deliberately simple: it does not understand regular-expression literals, which the page script
+    does not use, and it also trims indentation inside multi-line template literals (harmless for
+    the HTML snippets they build).
+    """
+    out: List[str] = []
+    quote = ""
+    idx = 0
+    length = len(source)
+    while idx < length:
+        char = source[idx]
+        if quote:
+            out.append(char)
+            if char == "\\" and idx + 1 < length:
+                out.append(source[idx + 1])
+                idx += 1
+            elif char == quote:
+                quote = ""
+        elif char in "\"'`":
+            quote = char
+            out.append(char)
+        elif source.startswith("//", idx):
+            end = source.find("\n", idx)
+            idx = length if end == -1 else end
+            continue
+        elif source.startswith("/*", idx):
+            end = source.find("*/", idx + 2)
+            idx = length if end == -1 else end + 2
+            continue
+        else:
+            out.append(char)
+        idx += 1
+    lines = (line.strip() for line in "".join(out).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def minify_inline_scripts(html: str) -> str:
+    """Minify the body of every attribute-less `<script>` element in a page."""
+    return _INLINE_SCRIPT.sub(lambda match: match.group(1) + minify_js(match.group(2)) + match.group(3), html)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from app.config import DEFAULT_BACKFILL_WORKERS
+from app.data_processor import MAX_ARTISTS, MonthlySnapshot, snapshot_from_counts
+from app.storage import DEFAULT_HISTORY_PATH, HistoryBackend, get_backend, save_snapshots
+
+if TYPE_CHECKING:
+    from app.api_client import LastFmClient
+
+
+def week_month(from_ts: int, to_ts: int) -> datetime:
+    """First day (UTC) of the calendar month containing the week's midpoint."""
+    midpoint = datetime.fromtimestamp((from_ts + to_ts) // 2, tz=timezone.utc)
+    return midpoint.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def backfill_snapshots(
+    client: LastFmClient,
+    user: str,
+    skip_months: Optional[Set[str]] = None,
+    max_workers: int = DEFAULT_BACKFILL_WORKERS,
+    run_timestamp: Optional[datetime] = None,
+    top_n: int = MAX_ARTISTS,
+    refresh: bool = False,
+) -> List[MonthlySnapshot]:
+    """
+    Rebuild monthly snapshots from a user's weekly artist charts.
+
+    Every week is attributed to the month of its midpoint, and its charts are summed per artist.
+    Weeks are fetched by `max_workers` threads; the client's token bucket keeps the combined
+    request rate within the API limit. Weeks that fall in `skip_months` are not fetched at all.
+    `refresh` bypasses the response cache for the chart list and every weekly chart.
+    """
+    if run_timestamp is None:
+        run_timestamp = datetime.now(tz=timezone.utc)
+    skip_months = skip_months or set()
+    weeks: List[Tuple[int, int, datetime]] = []
+    for chart in client.weekly_chart_list(user, refresh=refresh):
+        from_ts, to_ts = int(chart["from"]), int(chart["to"])
+        month_start = week_month(from_ts, to_ts)
+        if month_start.strftime("%Y-%m") not in skip_months:
+            weeks.append((from_ts, to_ts, month_start))
+
+    counts: Dict[datetime, Counter] = {}
+    urls: Dict[str, Optional[str]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(client.weekly_artist_chart, user, from_ts, to_ts, refresh): month_start
+            for from_ts, to_ts, month_start in weeks
+        }
+        for future in as_completed(futures):
+            month_counts = counts.setdefault(futures[future], Counter())
+            for artist in future.result():
+                month_counts[artist["name"]] += int(artist.get("playcount") or 0)
+                if artist.get("url"):
+                    urls[artist["name"]] = artist["url"]
+
+    return [
+        snapshot_from_counts(month_start, counts[month_start], urls, run_timestamp, top_n)
+        for month_start in sorted(counts)
+        if counts[month_start]
+    ]
+
+
+def backfill_history(
+    client: LastFmClient,
+    user: str,
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+    max_workers: int = DEFAULT_BACKFILL_WORKERS,
+    overwrite: bool = False,
+    run_timestamp: Optional[datetime] = None,
+    refresh: bool = False,
+) -> List[MonthlySnapshot]:
+    """
+    Backfill every past month into storage with a single bulk write.
+
+    Months that are already stored (and the current, still running month) are left alone unless
+    `overwrite` is set. `refresh` bypasses the response cache. Returns the snapshots that were written.
+    """
+    if run_timestamp is None:
+        run_timestamp = datetime.now(tz=timezone.utc)
+    owns_backend = backend is None
+    if backend is None:
+        backend = get_backend(history_path, user=user)
+    try:
+        skip = {run_timestamp.strftime("%Y-%m")}
+        if not overwrite:
+            skip.update(backend.months())
+        snapshots = backfill_snapshots(client, user, skip, max_workers, run_timestamp, refresh=refresh)
+        if snapshots:
+            save_snapshots(snapshots, backend=backend)
+    finally:
+        if owns_backend:
+            backend.close()
+    return snapshots
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from app import metrics
+from app.api_client import fetch_top_artists
+from app.config import DEFAULT_BATCH_WORKERS
+from app.data_processor import MAX_ARTISTS, process_data
+from app.history_frame import HistoryFrame
+from app.multisite import HISTORY_FILENAME, user_output_dir
+from app.storage import save_data_frame
+from app.ui_updater import update_ui
+
+
+@dataclass
+class UserResult:
+    user: str
+    output_dir: Path
+    ok: bool
+    months: int = 0
+    error: Optional[str] = None
+
+
+def read_users(source: TextIO) -> List[str]:
+    """
+    Read one Last.fm username per line, skipping blanks, `#` comments and duplicates.
+
+    Last.fm usernames are case-insensitive, so names are lower-cased: `Alice` and `alice` are one
+    user, with one fetch and one site directory.
+    """
+    users: List[str] = []
+    seen = set()
+    for line in source:
+        user = line.split("#", 1)[0].strip().lower()
+        if user and user not in seen:
+            seen.add(user)
+            users.append(user)
+    return users
+
+
+def refresh_user_site(
+    payload: dict,
+    output_dir: Path,
+    run_timestamp: datetime,
+    sharded: bool = False,
+    asset_root: Path | str | None = None,
+) -> HistoryFrame:
+    """
+    Process a fetched chart, store it in the user's history under `output_dir` and rebuild their site
+    (loading the Plotly bundle from `asset_root` when given, see `update_ui`).
+    """
+    with metrics.span("process_data"):
+        snapshot = process_data(payload, run_timestamp=run_timestamp)
+    with metrics.span("save_data"):
+        history = save_data_frame(snapshot, history_path=output_dir / HISTORY_FILENAME)
+    with metrics.span("update_ui"):
+        update_ui(history, output_dir=output_dir, sharded=sharded, asset_root=asset_root)
+    return history
+
+
+def run_batch(
+    api_key: str,
+    users: Iterable[str],
+    output_root: Path | str = "site/users",
+    period: str = "1month",
+    max_workers: int = DEFAULT_BATCH_WORKERS,
+    run_timestamp: Optional[datetime] = None,
+    refresh: bool = False,
+    sharded: bool = False,
+) -> List[UserResult]:
+    """
+    Fetch every user's chart concurrently, then process, save and render each user in turn.
+
+    Fetches run on a bounded thread pool; processing happens on the calling thread as soon as a
+    user's payload arrives, so storage and rendering overlap with the remaining network calls.
+
+    Args:
+        api_key: Last.fm API key shared by all requests.
+        users: Last.fm usernames to refresh.
+        output_root: Parent directory; every user gets its own sub-directory, and all of them share
+            one copy of the Plotly bundle under `output_root/assets/`.
+        period: Last.fm chart period passed to `fetch_top_artists`.
+        max_workers: Upper bound on concurrent Last.fm requests.
+        run_timestamp: Timestamp used to label the month (defaults to now, shared by all users).
+        refresh: Bypass the Last.fm response cache.
+        sharded: Build each user's site with per-month JSON shards (see `update_ui`).
+
+    Returns:
+        One UserResult per user, in input order.
+    """
+    if run_timestamp is None:
+        run_timestamp = datetime.now(tz=timezone.utc)
+
+    user_list = list(users)
+    output_dirs = {user: user_output_dir(output_root, user) for user in user_list}  # reject bad names up front
+    results: Dict[str, UserResult] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(
+                fetch_top_artists,
+                api_key=api_key,
+                user=user,
+                period=period,
+                limit=MAX_ARTISTS,
+                page=1,
+                refresh=refresh,
+            ): user
+            for user in user_list
+        }
+        for future in as_completed(futures):
+            user = futures[future]
+            output_dir = output_dirs[user]
+            try:
+                history = refresh_user_site(
+                    future.result(), output_dir, run_timestamp, sharded=sharded, asset_root=output_root
+                )
+            except Exception as exc:  # one bad user must not abort the batch
+                results[user] = UserResult(user=user, output_dir=output_dir, ok=False, error=f"{exc}")
+                continue
+            results[user] = UserResult(user=user, output_dir=output_dir, ok=True, months=len(history))
+
+    return [results[user] for user in user_list]
+
+
+def format_summary(results: List[UserResult]) -> str:
+    """Human readable summary of a batch run."""
+    failures = [result for result in results if not result.ok]
+    lines = [f"Batch finished: {len(results) - len(failures)} succeeded, {len(failures)} failed."]
+    for result in failures:
+        lines.append(f"  FAILED {result.user}: {result.error}")
+    return "\n".join(lines)
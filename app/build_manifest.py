@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from app import metrics
+from app.fileio import AtomicFile, atomic_write_bytes, read_text
+
+BUILD_MANIFEST_FILENAME = ".build-manifest.json"
+BUILD_MANIFEST_VERSION = 1
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_digest(path: Path) -> Optional[str]:
+    """sha256 of a file, hashed in chunks so large pages are never loaded whole."""
+    try:
+        with path.open("rb") as existing:
+            digest = hashlib.file_digest(existing, "sha256").hexdigest()
+            metrics.count("bytes_read", existing.tell())
+            return digest
+    except OSError:
+        return None
+
+
+class BuildManifest:
+    """
+    Record of the last site build: a fingerprint of its inputs and a content hash per artifact.
+
+    `is_current` tells the builder it can skip rendering altogether; `write` skips artifacts whose
+    bytes are unchanged, so untouched files keep their mtime and produce no diff on deploy.
+    """
+
+    def __init__(self, output_path: Path) -> None:
+        self.output_path = output_path
+        self.path = output_path / BUILD_MANIFEST_FILENAME
+        self.inputs = ""
+        self.artifacts: Dict[str, str] = {}
+        self.written: List[Path] = []
+        self.removed: List[Path] = []
+        self._seen: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, output_path: Path) -> BuildManifest:
+        manifest = cls(output_path)
+        try:
+            raw = json.loads(read_text(manifest.path))
+        except (OSError, ValueError):
+            return manifest
+        if raw.get("version") == BUILD_MANIFEST_VERSION:
+            manifest.inputs = raw.get("inputs", "")
+            manifest.artifacts = dict(raw.get("artifacts") or {})
+        return manifest
+
+    def is_current(self, inputs: str) -> bool:
+        """True when `inputs` match the last build and every recorded artifact is still on disk unmodified."""
+        if not self.artifacts or inputs != self.inputs:
+            return False
+        return all(_file_digest(self.output_path / relpath) == digest for relpath, digest in self.artifacts.items())
+
+    def write(self, relpath: str, data: bytes) -> bool:
+        """Write an artifact unless identical bytes are already on disk. Returns True if it was written."""
+        digest = sha256_hex(data)
+        self._seen[relpath] = digest
+        target = self.output_path / relpath
+        if _file_digest(target) == digest:
+            return False
+        atomic_write_bytes(target, data)
+        self.written.append(target)
+        return True
+
+    def write_chunks(self, relpath: str, chunks: Iterable[bytes]) -> bool:
+        """
+        Stream an artifact to a temp file while hashing it, then keep it only if it differs from the
+        file on disk. Returns True if it was written.
+        """
+        target = self.output_path / relpath
+        digest = hashlib.sha256()
+        with AtomicFile(target) as pending:
+            for chunk in chunks:
+                digest.update(chunk)
+                pending.write(chunk)
+            self._seen[relpath] = digest.hexdigest()
+            if _file_digest(target) == self._seen[relpath]:
+                pending.discard()
+                return False
+            pending.commit()
+        self.written.append(target)
+        return True
+
+    def remove(self, relpath: str) -> bool:
+        """Delete an artifact that this build no longer produces. Returns True if it existed."""
+        target = self.output_path / relpath
+        try:
+            target.unlink()
+        except FileNotFoundError:
+            return False
+        self.removed.append(target)
+        return True
+
+    def commit(self, inputs: str) -> None:
+        """Persist the artifacts written (or confirmed unchanged) in this build under `inputs`."""
+        self.inputs = inputs
+        self.artifacts = dict(sorted(self._seen.items()))
+        payload: Dict[str, Any] = {"version": BUILD_MANIFEST_VERSION, "inputs": inputs, "artifacts": self.artifacts}
+        atomic_write_bytes(self.path, json.dumps(payload, indent=1).encode("utf-8"))
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.fileio import read_text
+
+COLOR_STATE_FILENAME = "color_state.json"
+COLOR_STATE_VERSION = 1
+
+
+class ColorAllocator:
+    """
+    Hands out palette colors so an artist keeps its color while it stays in the chart.
+
+    Colors of artists that drop out go to a FIFO free pool and are reused before fresh palette
+    colors. Both the free pool and the remaining palette are insertion-ordered dicts used as
+    ordered sets, so claiming, releasing and popping a color are O(1), and the choice never
+    depends on Python's per-process `hash()` salt.
+    """
+
+    __slots__ = ("base_palette", "ledger", "active", "in_use", "free_pool", "palette")
+
+    def __init__(self, palette: List[str], seed_colors: Optional[Dict[str, str]] = None) -> None:
+        self.base_palette = list(palette)
+        self.ledger: Dict[str, str] = {}
+        self.active: Dict[str, str] = {}
+        self.in_use: Set[str] = set()
+        self.free_pool: Dict[str, None] = {}
+        self.palette: Dict[str, None] = dict.fromkeys(self.base_palette)
+        if seed_colors:
+            self.seed(seed_colors)
+
+    def seed(self, colors: Dict[str, str]) -> None:
+        """Remember preferred colors (e.g. from a previous run) and keep them out of the fresh palette."""
+        for name, color in colors.items():
+            if color and name not in self.active:
+                self.ledger[name] = color
+                self.palette.pop(color, None)
+
+    def release_missing(self, current_names: Iterable[str]) -> None:
+        """Free the colors of active artists that are not in `current_names`."""
+        current = current_names if isinstance(current_names, (set, frozenset, dict)) else set(current_names)
+        for name in [name for name in self.active if name not in current]:
+            color = self.active.pop(name)
+            self.in_use.discard(color)
+            self.free_pool[color] = None
+            self.ledger.pop(name, None)
+
+    def assign_month(self, names: List[str]) -> Dict[str, str]:
+        """Colors for one month's artists, freeing the colors of artists that dropped out."""
+        self.release_missing(set(names))
+        # Artists with a remembered color claim it before newcomers can take it from the free pool.
+        for name in names:
+            if name in self.ledger:
+                self.color_for(name)
+        return {name: self.color_for(name) for name in names}
+
+    def color_for(self, name: str) -> str:
+        color = self.active.get(name)
+        if color is None:
+            color = self._assign(name)
+            self.active[name] = color
+            self.ledger[name] = color
+            self.in_use.add(color)
+        return color
+
+    def _assign(self, name: str) -> str:
+        preferred = self.ledger.get(name)
+        if preferred and preferred not in self.in_use:
+            self.free_pool.pop(preferred, None)
+            self.palette.pop(preferred, None)
+            return preferred
+
+        if self.free_pool:
+            color = next(iter(self.free_pool))
+            del self.free_pool[color]
+            return color
+
+        if not self.palette:
+            self.palette = dict.fromkeys(color for color in self.base_palette if color not in self.in_use)
+            if not self.palette:
+                self.palette = dict.fromkeys(self.base_palette)
+
+        color = next(iter(self.palette))
+        del self.palette[color]
+        return color
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "ledger": dict(self.ledger),
+            "active": list(self.active.items()),
+            "free_pool": list(self.free_pool),
+            "palette": list(self.palette),
+        }
+
+    @classmethod
+    def from_state(cls, palette: List[str], state: Dict[str, Any]) -> ColorAllocator:
+        allocator = cls(palette)
+        allocator.ledger = dict(state["ledger"])
+        allocator.active = dict(state["active"])
+        allocator.in_use = set(allocator.active.values())
+        allocator.free_pool = dict.fromkeys(state["free_pool"])
+        allocator.palette = dict.fromkeys(state["palette"])
+        return allocator
+
+
+def palette_fingerprint(palette: List[str]) -> str:
+    return hashlib.sha1("\n".join(palette).encode("utf-8")).hexdigest()
+
+
+def month_fingerprint(previous: str, month_key: str, names: Iterable[str]) -> str:
+    """Chained fingerprint: changes whenever this month or any earlier month's artist line-up changes."""
+    digest = hashlib.sha1(previous.encode("utf-8"))
+    digest.update(month_key.encode("utf-8"))
+    for name in names:
+        digest.update(b"\0")
+        digest.update(name.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ColorState:
+    """
+    Persisted allocator checkpoint plus the colors already assigned to every month.
+
+    The checkpoint is taken after the second-newest month, so re-running the current (still
+    changing) month restores it and only replays that month.
+    """
+
+    __slots__ = ("palette_key", "through", "fingerprint", "allocator", "month_colors")
+
+    def __init__(
+        self,
+        palette_key: str = "",
+        through: Optional[str] = None,
+        fingerprint: str = "",
+        allocator: Optional[Dict[str, Any]] = None,
+        month_colors: Optional[Dict[str, Dict[str, str]]] = None,
+    ) -> None:
+        self.palette_key = palette_key
+        self.through = through
+        self.fingerprint = fingerprint
+        self.allocator = allocator
+        self.month_colors: Dict[str, Dict[str, str]] = month_colors or {}
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[ColorState]:
+        try:
+            raw = json.loads(read_text(path))
+        except (OSError, ValueError):
+            return None
+        if raw.get("version") != COLOR_STATE_VERSION:
+            return None
+        return cls(
+            palette_key=raw.get("palette_key", ""),
+            through=raw.get("through"),
+            fingerprint=raw.get("fingerprint", ""),
+            allocator=raw.get("allocator"),
+            month_colors=raw.get("month_colors") or {},
+        )
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            "version": COLOR_STATE_VERSION,
+            "palette_key": self.palette_key,
+            "through": self.through,
+            "fingerprint": self.fingerprint,
+            "allocator": self.allocator,
+            "month_colors": self.month_colors,
+        }
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
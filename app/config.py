@@ -0,0 +1,17 @@
+"""
+CLI defaults shared by the entry point and the subsystems.
+
+Kept free of imports so `app.main` can build its argument parser without loading requests or the
+storage/UI modules.
+"""
+
+DEFAULT_PERIOD = "1month"
+DEFAULT_BATCH_WORKERS = 8
+DEFAULT_BACKFILL_WORKERS = 8
+# Sites handed to (and results returned from) a build worker per round trip.
+DEFAULT_SITE_CHUNKSIZE = 8
+DEFAULT_SERVE_PORT = 8000
+# User refreshes the `schedule` daemon may start per minute, across all users.
+DEFAULT_SCHEDULE_BUDGET = 30.0
+# Upper bound on the rendered pages and snapshot JSON the `serve` command keeps in memory.
+DEFAULT_SERVE_CACHE_BYTES = 64 * 1024 * 1024
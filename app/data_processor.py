@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import codecs
+import heapq
+import io
+import itertools
+import json
+import re
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Union
 
 MAX_ARTISTS = 15
+READ_SIZE = 64 * 1024
 
+# What `process_data` accepts: a parsed response, its raw body, or an iterable of artist entries.
+Payload = Union[Mapping[str, Any], bytes, str, BinaryIO, TextIO, Iterable[Mapping[str, Any]], None]
 
-@dataclass
+# The `artist` member is an array, or a bare object when the chart holds a single artist.
+_ARTIST_MEMBER = re.compile(r'"artist"\s*:\s*([\[{])')
+_MARKER_TAIL = 64
+_SEPARATORS = re.compile(r"[\s,]*")
+_DECODER = json.JSONDecoder()
+
+
+@dataclass(slots=True)
 class ArtistStat:
     name: str
     playcount: int
@@ -16,7 +32,7 @@ class ArtistStat:
     rank: int
 
 
-@dataclass
+@dataclass(slots=True)
 class MonthlySnapshot:
     month_key: str
     month_label: str
@@ -24,13 +40,25 @@ class MonthlySnapshot:
     artists: List[ArtistStat]
 
 
-def process_data(raw_data: Dict[str, Any], run_timestamp: Optional[datetime] = None) -> MonthlySnapshot:
+def process_data(
+    raw_data: Payload,
+    run_timestamp: Optional[datetime] = None,
+    top_n: int = MAX_ARTISTS,
+    ranked: Optional[bool] = None,
+) -> MonthlySnapshot:
     """
-    Turn the Last.fm payload into a normalized monthly snapshot.
+    Turn the Last.fm payload into a normalized monthly snapshot of the `top_n` artists by playcount.
 
     Args:
-        raw_data: Response returned by `fetch_top_artists`.
+        raw_data: Response returned by `fetch_top_artists`; or the raw response body (bytes or a
+            binary/text stream), parsed one artist entry at a time; or an iterable of artist entries
+            (e.g. `iter_top_artists`).
         run_timestamp: Optional timestamp that should be used to label the month.
+        top_n: Number of artists to keep; ties keep payload order.
+        ranked: Whether the entries arrive best first, as Last.fm charts do. Then only the first
+            `top_n` are decoded and the rest of a raw body is never read; otherwise a heap bounded
+            to `top_n` entries selects them. Defaults to True for a response or response body and
+            False for a plain iterable of entries.
 
     Returns:
         MonthlySnapshot: structured data ready for persistence + UI updates.
@@ -38,37 +66,164 @@ def process_data(raw_data: Dict[str, Any], run_timestamp: Optional[datetime] = N
     if run_timestamp is None:
         run_timestamp = datetime.now(tz=timezone.utc)
 
-    month_key = run_timestamp.strftime("%Y-%m")
-    month_label = run_timestamp.strftime("%B %Y")
-    generated_at = run_timestamp.isoformat()
+    if ranked is None:
+        ranked = (
+            raw_data is None
+            or isinstance(raw_data, (Mapping, bytes, bytearray, memoryview, str))
+            or hasattr(raw_data, "read")
+        )
+    entries = _artist_entries(raw_data)
+    if ranked:
+        top_entries = list(itertools.islice(entries, top_n))
+    else:
+        # nlargest returns the entries best first, so the list is already in rank order.
+        top_entries = heapq.nlargest(top_n, entries, key=_playcount)
+    artists = [
+        ArtistStat(
+            name=str(entry.get("name") or f"Artist {rank}"),
+            playcount=_playcount(entry),
+            image_url=None,
+            url=entry.get("url"),
+            rank=rank,
+        )
+        for rank, entry in enumerate(top_entries, start=1)
+    ]
 
-    artist_entries = (raw_data or {}).get("topartists", {}).get("artist", [])
-    artist_entries = artist_entries[:MAX_ARTISTS]
+    return MonthlySnapshot(
+        month_key=run_timestamp.strftime("%Y-%m"),
+        month_label=run_timestamp.strftime("%B %Y"),
+        generated_at=run_timestamp.isoformat(),
+        artists=artists,
+    )
+
+
+def _playcount(entry: Mapping[str, Any]) -> int:
+    try:
+        return int(entry.get("playcount") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _artist_entries(raw_data: Payload) -> Iterable[Mapping[str, Any]]:
+    if raw_data is None:
+        return []
+    if isinstance(raw_data, Mapping):
+        return _mapping_entries(raw_data)
+    if isinstance(raw_data, (bytes, bytearray, memoryview)):
+        return iter_artist_entries(io.BytesIO(raw_data))
+    if isinstance(raw_data, str):
+        return iter_artist_entries(io.StringIO(raw_data))
+    if hasattr(raw_data, "read"):
+        return iter_artist_entries(raw_data)
+    return raw_data
 
-    artists: List[ArtistStat] = []
-    for rank, artist_payload in enumerate(artist_entries, start=1):
-        name = str(artist_payload.get("name") or f"Artist {rank}")
-        try:
-            playcount = int(artist_payload.get("playcount") or 0)
-        except (TypeError, ValueError):
-            playcount = 0
-
-        artists.append(
-            ArtistStat(
-                name=name,
-                playcount=playcount,
-                image_url=None,
-                url=artist_payload.get("url"),
-                rank=rank,
-            )
-        )
 
-    # Keep deterministic ordering for downstream processing
-    artists.sort(key=lambda a: (a.rank, -a.playcount, a.name.lower()))
+def _mapping_entries(response: Mapping[str, Any]) -> List[Mapping[str, Any]]:
+    _raise_for_error(response)
+    artists = (response.get("topartists") or {}).get("artist") or []
+    return [artists] if isinstance(artists, Mapping) else artists
 
+
+def _raise_for_error(response: Any) -> None:
+    if isinstance(response, Mapping) and "error" in response:
+        raise ValueError(f"Last.fm error {response['error']}: {response.get('message', '')}")
+
+
+def iter_artist_entries(stream: Union[BinaryIO, TextIO], read_size: int = READ_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the entries of a `user.gettopartists` response's `artist` array straight from the response body.
+
+    The stream is read `read_size` at a time and each entry is decoded on its own with
+    `JSONDecoder.raw_decode`, so only the current entry (plus one read buffer) is ever held in
+    memory, however large the page. A single-artist chart, where Last.fm sends the entry as a bare
+    object instead of an array, yields that one entry.
+
+    A body without an `artist` member yields nothing, like an empty chart.
+
+    Raises:
+        ValueError: The body is a Last.fm error response, is not JSON, or is truncated.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read() -> str:
+        chunk = stream.read(read_size)
+        return decoder.decode(chunk, final=not chunk) if isinstance(chunk, bytes) else chunk
+
+    # Everything before the `artist` member is kept: in a chart that is a few bytes, and in an error
+    # body (which has no such member) it is the whole, small, response, needed for the message.
+    buffer = ""
+    scanned = 0
+    while True:
+        match = _ARTIST_MEMBER.search(buffer, scanned)
+        if match is not None:
+            break
+        chunk = read()
+        if not chunk:
+            # No artist member: an empty chart, unless the body is an error response (or not JSON).
+            try:
+                response = json.loads(buffer) if buffer.strip() else {}
+            except ValueError:
+                raise ValueError("Malformed Last.fm response: not a JSON document.") from None
+            _raise_for_error(response)
+            return
+        # Rescan a tail in case the `"artist": [` marker straddles two reads.
+        scanned = max(0, len(buffer) - _MARKER_TAIL)
+        buffer += chunk
+
+    buffer = buffer[match.start(1) :]
+    if match.group(1) == "{":
+        while True:
+            try:
+                entry, _ = _DECODER.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = read()
+                if not chunk:
+                    raise ValueError("Malformed or truncated Last.fm response: the artist entry never ends.") from None
+                buffer += chunk
+                continue
+            yield entry
+            return
+
+    pos = 1  # just past the `[`
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            entry, pos = _DECODER.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = read()
+            if not chunk:
+                raise ValueError("Malformed or truncated Last.fm response: the artist array never ends.") from None
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield entry
+        if pos >= read_size:
+            buffer, pos = buffer[pos:], 0
+
+
+def snapshot_from_counts(
+    month_start: datetime,
+    playcounts: Mapping[str, int],
+    urls: Optional[Mapping[str, Optional[str]]] = None,
+    generated_at: Optional[datetime] = None,
+    top_n: int = MAX_ARTISTS,
+) -> MonthlySnapshot:
+    """
+    Build a monthly snapshot from per-artist playcounts (e.g. aggregated scrobbles).
+
+    Artists are ranked by playcount (ties by name) and cut to `top_n`, matching `process_data`'s output.
+    """
+    if generated_at is None:
+        generated_at = datetime.now(tz=timezone.utc)
+    urls = urls or {}
+    ranked = sorted(playcounts.items(), key=lambda item: (-item[1], item[0].lower()))[:top_n]
     return MonthlySnapshot(
-        month_key=month_key,
-        month_label=month_label,
-        generated_at=generated_at,
-        artists=artists,
+        month_key=month_start.strftime("%Y-%m"),
+        month_label=month_start.strftime("%B %Y"),
+        generated_at=generated_at.isoformat(),
+        artists=[
+            ArtistStat(name=name, playcount=playcount, image_url=None, url=urls.get(name), rank=rank)
+            for rank, (name, playcount) in enumerate(ranked, start=1)
+        ],
     )
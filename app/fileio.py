@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, TextIO
+
+from app import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; locking degrades to a no-op
+    fcntl = None
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Mode of a freshly created file (`open(..., "w")` semantics); mkstemp's temp files are always 0600.
+DEFAULT_FILE_MODE = 0o666 & ~_umask()
+
+
+class AtomicFile:
+    """
+    A temp file next to `path` that replaces `path` on `commit()` or disappears on `discard()`.
+
+    Lets large outputs be streamed to disk chunk by chunk while readers of `path` only ever see the
+    old or the complete new file. Used as a context manager it discards unless committed. The new
+    file keeps the mode of the file it replaces, or gets the usual umask-based mode. With
+    `fsync`, the data (and then the rename) are flushed to disk on commit, so after a crash `path`
+    holds either the old or the new content, never a truncated file.
+    """
+
+    def __init__(self, path: Path, fsync: bool = False) -> None:
+        self.path = path
+        self.fsync = fsync
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        self._file: BinaryIO = os.fdopen(fd, "wb")
+        self.size = 0
+        self._done = False
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self) -> None:
+        if self.fsync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        try:
+            mode = self.path.stat().st_mode & 0o7777
+        except OSError:
+            mode = DEFAULT_FILE_MODE
+        os.fchmod(self._file.fileno(), mode)
+        self._file.close()
+        os.replace(self.tmp_name, self.path)
+        if self.fsync:
+            _fsync_directory(self.path.parent)
+        self._done = True
+        metrics.count("bytes_written", self.size)
+
+    def discard(self) -> None:
+        self._file.close()
+        try:
+            os.unlink(self.tmp_name)
+        except FileNotFoundError:
+            pass
+        self._done = True
+
+    def __enter__(self) -> AtomicFile:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if not self._done:
+            self.discard()
+
+
+def _fsync_directory(directory: Path) -> None:
+    """Persist a rename in `directory` (best effort: not every platform can open a directory)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Write `data` to a temp file next to `path` and rename it into place, so readers never see partial files."""
+    with AtomicFile(path, fsync=fsync) as target:
+        target.write(data)
+        target.commit()
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = "utf-8", fsync: bool = False) -> None:
+    atomic_write_bytes(path, text.encode(encoding), fsync=fsync)
+
+
+@contextlib.contextmanager
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory `flock` on `path` (created if missing) for the duration of the block.
+
+    Cooperating writers in other processes (or threads, each with its own lock file handle) wait
+    for each other; readers that don't take the lock are unaffected.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a+b") as handle:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def read_bytes(path: Path) -> bytes:
+    """`path.read_bytes()`, counted towards the `bytes_read` metric."""
+    data = path.read_bytes()
+    metrics.count("bytes_read", len(data))
+    return data
+
+
+def read_text(path: Path, encoding: str = "utf-8") -> str:
+    return read_bytes(path).decode(encoding)
+
+
+def open_csv(path: Path) -> TextIO:
+    """Open a CSV file for reading, counting its size towards the `bytes_read` metric."""
+    csv_file = path.open("r", newline="", encoding="utf-8")
+    metrics.count("bytes_read", os.fstat(csv_file.fileno()).st_size)
+    return csv_file
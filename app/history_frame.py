@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import hashlib
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from app.data_processor import ArtistStat, MonthlySnapshot
+
+# (name, playcount, image_url, url, rank)
+ArtistRow = Tuple[str, int, Optional[str], Optional[str], int]
+
+
+class HistoryFrame:
+    """
+    Columnar listening history.
+
+    Artist names are interned to integer ids (with url/image_url stored once per artist) and every
+    chart entry is one slot in three typed arrays: `artist_ids`, `ranks` and `playcounts`. Month `i`
+    owns the entries `offsets[i]:offsets[i + 1]`. Months are kept sorted by `month_key`.
+    `ArtistStat`/`MonthlySnapshot` objects are only built on demand by `snapshot()`.
+    """
+
+    __slots__ = (
+        "artist_names",
+        "artist_urls",
+        "artist_image_urls",
+        "_artist_index",
+        "month_keys",
+        "month_labels",
+        "generated_at",
+        "offsets",
+        "artist_ids",
+        "ranks",
+        "playcounts",
+    )
+
+    def __init__(self) -> None:
+        self.artist_names: List[str] = []
+        self.artist_urls: List[Optional[str]] = []
+        self.artist_image_urls: List[Optional[str]] = []
+        self._artist_index: Dict[str, int] = {}
+        self.month_keys: List[str] = []
+        self.month_labels: List[str] = []
+        self.generated_at: List[str] = []
+        self.offsets = array("q", [0])
+        self.artist_ids = array("l")
+        self.ranks = array("l")
+        self.playcounts = array("q")
+
+    @classmethod
+    def from_history(cls, history: Mapping[str, Dict[str, Any]]) -> HistoryFrame:
+        """Build a frame from the `month_key -> snapshot payload` dicts used by `load_history`."""
+        frame = cls()
+        for month_key in sorted(history):
+            payload = history[month_key]
+            frame.append_month(
+                month_key,
+                payload["month_label"],
+                payload["generated_at"],
+                (
+                    (
+                        artist["name"],
+                        int(artist["playcount"]),
+                        artist.get("image_url"),
+                        artist.get("url"),
+                        int(artist.get("rank") or 0),
+                    )
+                    for artist in payload["artists"]
+                ),
+            )
+        return frame
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Iterable[MonthlySnapshot]) -> HistoryFrame:
+        frame = cls()
+        for snapshot in sorted(snapshots, key=lambda snap: snap.month_key):
+            frame.upsert_snapshot(snapshot)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.month_keys)
+
+    def __contains__(self, month_key: object) -> bool:
+        return self.month_index(month_key) is not None
+
+    def month_index(self, month_key: object) -> Optional[int]:
+        idx = bisect_left(self.month_keys, month_key)
+        if idx < len(self.month_keys) and self.month_keys[idx] == month_key:
+            return idx
+        return None
+
+    def artist_id(self, name: str) -> Optional[int]:
+        return self._artist_index.get(name)
+
+    def intern(self, name: str, url: Optional[str] = None, image_url: Optional[str] = None) -> int:
+        """Return the id for `name`, registering it on first sight. Newer non-empty urls win."""
+        artist_id = self._artist_index.get(name)
+        if artist_id is None:
+            artist_id = self._artist_index[name] = len(self.artist_names)
+            self.artist_names.append(name)
+            self.artist_urls.append(url or None)
+            self.artist_image_urls.append(image_url or None)
+            return artist_id
+        if url:
+            self.artist_urls[artist_id] = url
+        if image_url:
+            self.artist_image_urls[artist_id] = image_url
+        return artist_id
+
+    def append_month(
+        self,
+        month_key: str,
+        month_label: str,
+        generated_at: str,
+        rows: Iterable[ArtistRow],
+    ) -> None:
+        """Add a month newer than every stored month."""
+        if self.month_keys and month_key <= self.month_keys[-1]:
+            raise ValueError(f"Month {month_key} is not newer than {self.month_keys[-1]}; use upsert_month.")
+        for name, playcount, image_url, url, rank in rows:
+            self.artist_ids.append(self.intern(name, url, image_url))
+            self.ranks.append(rank)
+            self.playcounts.append(playcount)
+        self.month_keys.append(month_key)
+        self.month_labels.append(month_label)
+        self.generated_at.append(generated_at)
+        self.offsets.append(len(self.artist_ids))
+
+    def upsert_month(
+        self,
+        month_key: str,
+        month_label: str,
+        generated_at: str,
+        rows: Iterable[ArtistRow],
+    ) -> None:
+        """Insert or replace a month. Appending/replacing the newest month only touches the array tails."""
+        idx = bisect_left(self.month_keys, month_key)
+        if idx == len(self.month_keys):
+            self.append_month(month_key, month_label, generated_at, rows)
+            return
+
+        replace = self.month_keys[idx] == month_key
+        start = self.offsets[idx]
+        end = self.offsets[idx + 1] if replace else start
+        ids, ranks, playcounts = array("l"), array("l"), array("q")
+        for name, playcount, image_url, url, rank in rows:
+            ids.append(self.intern(name, url, image_url))
+            ranks.append(rank)
+            playcounts.append(playcount)
+
+        self.artist_ids[start:end] = ids
+        self.ranks[start:end] = ranks
+        self.playcounts[start:end] = playcounts
+        shift = len(ids) - (end - start)
+        if replace:
+            self.month_labels[idx] = month_label
+            self.generated_at[idx] = generated_at
+            tail = idx + 1
+        else:
+            self.month_keys.insert(idx, month_key)
+            self.month_labels.insert(idx, month_label)
+            self.generated_at.insert(idx, generated_at)
+            self.offsets.insert(idx + 1, start + len(ids))
+            tail = idx + 2
+        if shift:
+            for pos in range(tail, len(self.offsets)):
+                self.offsets[pos] += shift
+
+    def upsert_snapshot(self, snapshot: MonthlySnapshot) -> None:
+        self.upsert_month(
+            snapshot.month_key,
+            snapshot.month_label,
+            snapshot.generated_at,
+            ((a.name, a.playcount, a.image_url, a.url, a.rank) for a in snapshot.artists),
+        )
+
+    def month_range(self, idx: int) -> range:
+        return range(self.offsets[idx], self.offsets[idx + 1])
+
+    def snapshot(self, month_key: str) -> MonthlySnapshot:
+        idx = self.month_index(month_key)
+        if idx is None:
+            raise KeyError(month_key)
+        return self._snapshot_at(idx)
+
+    def iter_snapshots(self) -> Iterator[MonthlySnapshot]:
+        for idx in range(len(self.month_keys)):
+            yield self._snapshot_at(idx)
+
+    def _snapshot_at(self, idx: int) -> MonthlySnapshot:
+        artists = []
+        for pos in self.month_range(idx):
+            artist_id = self.artist_ids[pos]
+            artists.append(
+                ArtistStat(
+                    name=self.artist_names[artist_id],
+                    playcount=self.playcounts[pos],
+                    image_url=self.artist_image_urls[artist_id],
+                    url=self.artist_urls[artist_id],
+                    rank=self.ranks[pos],
+                )
+            )
+        return MonthlySnapshot(
+            month_key=self.month_keys[idx],
+            month_label=self.month_labels[idx],
+            generated_at=self.generated_at[idx],
+            artists=artists,
+        )
+
+    def fingerprint(self) -> str:
+        """Content hash of every month (keys, labels, timestamps, artists, ranks and playcounts)."""
+        digest = hashlib.sha256()
+        for column in (self.month_keys, self.month_labels, self.generated_at):
+            digest.update("\0".join(column).encode("utf-8"))
+            digest.update(b"\1")
+        for idx, name in enumerate(self.artist_names):
+            digest.update(
+                f"{name}\0{self.artist_urls[idx] or ''}\0{self.artist_image_urls[idx] or ''}\1".encode("utf-8")
+            )
+        for column in (self.offsets, self.artist_ids, self.ranks, self.playcounts):
+            digest.update(column.tobytes())
+        return digest.hexdigest()
+
+    def to_history(self) -> Dict[str, Dict[str, Any]]:
+        """Expand back into `month_key -> snapshot payload` dicts (for callers that still expect them)."""
+        history: Dict[str, Dict[str, Any]] = {}
+        for idx, month_key in enumerate(self.month_keys):
+            history[month_key] = {
+                "month_key": month_key,
+                "month_label": self.month_labels[idx],
+                "generated_at": self.generated_at[idx],
+                "artists": [
+                    {
+                        "name": self.artist_names[self.artist_ids[pos]],
+                        "playcount": self.playcounts[pos],
+                        "image_url": self.artist_image_urls[self.artist_ids[pos]],
+                        "url": self.artist_urls[self.artist_ids[pos]],
+                        "rank": self.ranks[pos],
+                    }
+                    for pos in self.month_range(idx)
+                ],
+            }
+        return history
@@ -1,45 +1,436 @@
 from __future__ import annotations
 
+import argparse
+import cProfile
 import os
+import sys
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional
 
-from dotenv import load_dotenv
+from app import metrics
+from app.config import (
+    DEFAULT_BACKFILL_WORKERS,
+    DEFAULT_BATCH_WORKERS,
+    DEFAULT_PERIOD,
+    DEFAULT_SCHEDULE_BUDGET,
+    DEFAULT_SERVE_CACHE_BYTES,
+    DEFAULT_SERVE_PORT,
+    DEFAULT_SITE_CHUNKSIZE,
+)
+from app.response_cache import DEFAULT_CACHE_DIR, DEFAULT_TTL_SECONDS
+from app.storage import DEFAULT_HISTORY_PATH, get_backend
 
-from app.api_client import fetch_top_artists
-from app.data_processor import MAX_ARTISTS, process_data
-from app.storage import save_data
-from app.ui_updater import update_ui
+if TYPE_CHECKING:
+    from app.history_frame import HistoryFrame
 
-DEFAULT_PERIOD = "1month"
+# Subsystems (requests, the UI builder, ...) are imported inside the command that needs them, so e.g.
+# `render` never loads the HTTP stack and `fetch` never loads the UI code.
 
+# Exit status for `--exit-code-if-unchanged` when the generated site is identical to the previous build.
+EXIT_UNCHANGED = 78
 
-def main() -> None:
+
+def _add_common_options(parser: argparse.ArgumentParser, defaults: bool = True) -> None:
+    # Subcommands repeat the options with suppressed defaults so they don't clobber top-level values.
+    def default(value: object) -> object:
+        return value if defaults else argparse.SUPPRESS
+
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=default(False),
+        help="Ignore cached Last.fm responses.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        default=default(True),
+        help="Disable the on-disk response cache.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default(str(DEFAULT_CACHE_DIR)),
+        help="Directory for cached Last.fm responses.",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=default(DEFAULT_TTL_SECONDS),
+        help="Seconds before a cached response expires.",
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        default=default(False),
+        help="Write one JSON shard per month and load months lazily in the page.",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        default=default(None),
+        help="Record per-stage timings, memory, I/O and HTTP counts as JSON ('-' for stdout).",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=default(None),
+        help="Dump cProfile stats for the whole run to PATH (read them with `python -m pstats`).",
+    )
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.main", description="Build the MusicHabits site.")
+    _add_common_options(parser)
+    parser.add_argument(
+        "--exit-code-if-unchanged",
+        action="store_true",
+        help=f"Exit with status {EXIT_UNCHANGED} when the site did not change (lets CI skip the deploy).",
+    )
+    subcommands = parser.add_subparsers(dest="command")
+
+    fetch = subcommands.add_parser("fetch", help="Fetch and store the current month without rendering the site.")
+    _add_common_options(fetch, defaults=False)
+    render = subcommands.add_parser("render", help="Render the site from stored history without calling Last.fm.")
+    _add_common_options(render, defaults=False)
+
+    batch = subcommands.add_parser("batch", help="Refresh many Last.fm users in one process.")
+    _add_common_options(batch, defaults=False)
+    batch.add_argument("users_file", nargs="?", default="-", help="File with one username per line ('-' for stdin).")
+    batch.add_argument("--output-root", default="site/users", help="Parent directory for per-user output.")
+    batch.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS, help="Concurrent Last.fm requests.")
+
+    sites = subcommands.add_parser(
+        "build-sites", help="Render every user site under --output-root on a process pool, plus an index page."
+    )
+    _add_common_options(sites, defaults=False)
+    sites.add_argument(
+        "users_file",
+        nargs="?",
+        help="File with one username per line ('-' for stdin). Defaults to every user directory with a history.",
+    )
+    sites.add_argument("--output-root", default="site/users", help="Parent directory of the per-user sites.")
+    sites.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count).")
+    sites.add_argument("--chunksize", type=int, default=DEFAULT_SITE_CHUNKSIZE, help="Sites per worker round trip.")
+
+    serve = subcommands.add_parser(
+        "serve", help="Serve every user's page and snapshot JSON from stored history over HTTP, rendered on demand."
+    )
+    serve.add_argument("--output-root", default="site/users", help="Parent directory of the per-user histories.")
+    serve.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    serve.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT, help="Port to listen on.")
+    serve.add_argument(
+        "--cache-bytes",
+        type=int,
+        default=DEFAULT_SERVE_CACHE_BYTES,
+        help="Memory budget for rendered pages and snapshot JSON (least recently used users are evicted).",
+    )
+
+    schedule = subcommands.add_parser(
+        "schedule", help="Keep many users fresh: refresh each when due, more often the more their chart changes."
+    )
+    _add_common_options(schedule, defaults=False)
+    schedule.add_argument("users_file", help="File with one Last.fm username per line ('-' for stdin).")
+    schedule.add_argument("--output-root", default="site/users", help="Parent directory of the per-user sites.")
+    schedule.add_argument(
+        "--budget", type=float, default=DEFAULT_SCHEDULE_BUDGET, help="User refreshes started per minute, overall."
+    )
+    schedule.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS, help="Concurrent refreshes.")
+    schedule.add_argument("--once", action="store_true", help="Refresh the users that are due now, then exit.")
+
+    ingest = subcommands.add_parser(
+        "ingest", help="Build calendar-month charts from raw scrobbles, resuming from the last checkpoint."
+    )
+    _add_common_options(ingest, defaults=False)
+    ingest.add_argument(
+        "--since",
+        type=_parse_date,
+        help="First day (YYYY-MM-DD, UTC) to ingest when there is no checkpoint yet. Defaults to all scrobbles.",
+    )
+
+    backfill = subcommands.add_parser("backfill", help="Rebuild past months from Last.fm's weekly charts.")
+    _add_common_options(backfill, defaults=False)
+    backfill.add_argument("--workers", type=int, default=DEFAULT_BACKFILL_WORKERS, help="Concurrent Last.fm requests.")
+    backfill.add_argument("--overwrite", action="store_true", help="Replace months that are already stored.")
+    return parser
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def _require_env(*names: str) -> List[str]:
+    values = [os.environ.get(name) for name in names]
+    if not all(values):
+        raise RuntimeError(f"{' and '.join(names)} environment variables are required.")
+    return values
+
+
+def _configure_fetching(args: argparse.Namespace, api_key: str) -> None:
+    from app.api_client import configure_client
+    from app.response_cache import ResponseCache
+
+    cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl) if args.use_cache else None
+    configure_client(api_key, cache=cache)
+
+
+def run_single(args: argparse.Namespace) -> bool:
+    """Fetch, process, save and render the site for the `LASTFM_USER` account. Returns whether the site changed."""
+    return _render(args, run_fetch(args))
+
+
+def run_fetch(args: argparse.Namespace) -> HistoryFrame:
+    """Fetch, process and save the current month for `LASTFM_USER`; returns the stored history."""
+    from app.api_client import fetch_top_artists
+    from app.data_processor import MAX_ARTISTS, process_data
+    from app.storage import save_data_frame
+
+    api_key, user = _require_env("LASTFM_API_KEY", "LASTFM_USER")
+    _configure_fetching(args, api_key)
+
+    with metrics.span("fetch_top_artists"):
+        lastfm_payload = fetch_top_artists(
+            api_key=api_key,
+            user=user,
+            period=DEFAULT_PERIOD,
+            limit=MAX_ARTISTS,
+            page=1,
+            refresh=args.refresh,
+        )
+
+    with metrics.span("process_data"):
+        snapshot = process_data(lastfm_payload, run_timestamp=datetime.now(tz=timezone.utc))
+    with metrics.span("save_data"):
+        backend = get_backend(DEFAULT_HISTORY_PATH, user=user)
+        try:
+            history = save_data_frame(snapshot, backend=backend)
+        finally:
+            backend.close()
+    return history
+
+
+def run_render(args: argparse.Namespace) -> bool:
+    """Render the site from the stored history of `LASTFM_USER` (no network). Returns whether the site changed."""
+    user = os.environ.get("LASTFM_USER", "")
+    with metrics.span("load_history"):
+        backend = get_backend(DEFAULT_HISTORY_PATH, user=user)
+        try:
+            history = backend.load_frame()
+        finally:
+            backend.close()
+    return _render(args, history)
+
+
+def _render(args: argparse.Namespace, history: HistoryFrame) -> bool:
+    from app.ui_updater import build_site
+
+    with metrics.span("update_ui"):
+        result = build_site(history, sharded=args.sharded)
+    if not result.changed:
+        print("Nothing changed; site is up to date.")
+        return False
+    print("UI updated successfully.")
+    return True
+
+
+def run_ingest(args: argparse.Namespace) -> bool:
+    """Run the `ingest` subcommand for `LASTFM_USER` and render the site. Returns whether the site changed."""
+    from app.api_client import get_client
+    from app.scrobbles import ingest_scrobbles
+
+    api_key, user = _require_env("LASTFM_API_KEY", "LASTFM_USER")
+    _configure_fetching(args, api_key)
+    since = int(args.since.timestamp()) if getattr(args, "since", None) else None
+
+    backend = get_backend(DEFAULT_HISTORY_PATH, user=user)
+    try:
+        months = ingest_scrobbles(get_client(api_key), user, backend=backend, from_ts=since)
+        history = backend.load_frame()
+    finally:
+        backend.close()
+    print(f"Ingested scrobbles into {months} month(s).")
+    return _render(args, history)
+
+
+def run_backfill(args: argparse.Namespace) -> bool:
+    """Run the `backfill` subcommand for `LASTFM_USER` and render the site. Returns whether the site changed."""
+    from app.api_client import get_client
+    from app.backfill import backfill_history
+
+    api_key, user = _require_env("LASTFM_API_KEY", "LASTFM_USER")
+    _configure_fetching(args, api_key)
+
+    backend = get_backend(DEFAULT_HISTORY_PATH, user=user)
+    try:
+        snapshots = backfill_history(
+            get_client(api_key),
+            user,
+            backend=backend,
+            max_workers=args.workers,
+            overwrite=args.overwrite,
+            refresh=args.refresh,
+        )
+        history = backend.load_frame()
+    finally:
+        backend.close()
+    print(f"Backfilled {len(snapshots)} month(s).")
+    return _render(args, history)
+
+
+def run_batch_command(args: argparse.Namespace) -> int:
+    """Run the `batch` subcommand and print a success/failure summary."""
+    from app.batch import format_summary, read_users, run_batch
+
+    (api_key,) = _require_env("LASTFM_API_KEY")
+    _configure_fetching(args, api_key)
+    if args.users_file == "-":
+        users = read_users(sys.stdin)
+    else:
+        with open(args.users_file, encoding="utf-8") as users_file:
+            users = read_users(users_file)
+
+    results = run_batch(
+        api_key=api_key,
+        users=users,
+        output_root=args.output_root,
+        period=DEFAULT_PERIOD,
+        max_workers=args.workers,
+        refresh=args.refresh,
+        sharded=args.sharded,
+    )
+    print(format_summary(results))
+    return 0 if all(result.ok for result in results) else 1
+
+
+def run_build_sites(args: argparse.Namespace) -> int:
+    """Run the `build-sites` subcommand and print a success/failure summary."""
+    from app.batch import read_users
+    from app.multisite import build_sites, format_site_summary
+
+    users = None
+    if args.users_file == "-":
+        users = read_users(sys.stdin)
+    elif args.users_file:
+        with open(args.users_file, encoding="utf-8") as users_file:
+            users = read_users(users_file)
+
+    results = build_sites(
+        users,
+        output_root=args.output_root,
+        max_workers=args.workers,
+        chunksize=args.chunksize,
+        sharded=args.sharded,
+    )
+    print(format_site_summary(results))
+    return 0 if all(result.ok for result in results) else 1
+
+
+def run_schedule(args: argparse.Namespace) -> int:
+    """Run the `schedule` subcommand: a refresh daemon (or a single pass with --once)."""
+    from app.batch import read_users
+    from app.scheduler import format_schedule_summary, run_scheduler
+
+    (api_key,) = _require_env("LASTFM_API_KEY")
+    _configure_fetching(args, api_key)
+    if args.users_file == "-":
+        users = read_users(sys.stdin)
+    else:
+        with open(args.users_file, encoding="utf-8") as users_file:
+            users = read_users(users_file)
+
+    try:
+        outcomes = run_scheduler(
+            api_key,
+            users,
+            output_root=args.output_root,
+            budget_per_minute=args.budget,
+            max_workers=args.workers,
+            sharded=args.sharded,
+            once=args.once,
+        )
+    except KeyboardInterrupt:
+        return 0
+    print(format_schedule_summary(outcomes))
+    return 0 if all(outcome.ok for outcome in outcomes) else 1
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """Run the `serve` subcommand until interrupted."""
+    import asyncio
+
+    from app.server import serve
+
+    try:
+        asyncio.run(serve(args.output_root, host=args.host, port=args.port, cache_bytes=args.cache_bytes))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
     """
     Main entry point for the application.
-    It fetches the top artists from Last.fm, processes the data,
+    Without a subcommand it fetches the top artists from Last.fm, processes the data,
     saves it in the CSV file, and updates the UI by comparing to the current month's data
     (if available in json file), it then updates the UI.
+    The `batch` subcommand does the same for a list of users, fetching concurrently.
+    The `ingest` subcommand builds true calendar months from raw scrobbles instead of the rolling
+    30-day `1month` chart, resuming from a checkpoint so missed runs are caught up.
+    The `backfill` subcommand rebuilds every past month from the weekly charts in one bulk write.
+    `fetch` only fetches and stores the current month; `render` only rebuilds the site from storage.
+    `build-sites` renders many stored user sites on a process pool and links them from an index page.
+    `serve` renders those sites on demand from a long-running HTTP server instead.
+    `schedule` keeps many users fresh, refreshing each one when it is due.
+    Last.fm responses are cached on disk unless `--no-cache` is given; `--refresh` bypasses the cache.
+    `--metrics` records per-stage timings and I/O counters, `--profile` dumps cProfile stats for the run.
     """
+    from dotenv import load_dotenv
+
+    args = _build_parser().parse_args(argv)
     load_dotenv()
 
-    api_key = os.environ.get("LASTFM_API_KEY")
-    user = os.environ.get("LASTFM_USER")
-    if not api_key or not user:
-        raise RuntimeError("LASTFM_API_KEY and LASTFM_USER environment variables are required.")
+    collector = metrics.enable() if args.metrics else None
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with metrics.span("run"):
+            return _run_command(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if collector is not None:
+            metrics.disable()
+            collector.write(args.metrics)
 
-    lastfm_payload = fetch_top_artists(
-        api_key=api_key,
-        user=user,
-        period=DEFAULT_PERIOD,
-        limit=MAX_ARTISTS,
-        page=1,
-    )
 
-    snapshot = process_data(lastfm_payload, run_timestamp=datetime.now(tz=timezone.utc))
-    history = save_data(snapshot)
-    update_ui(history)
-    print("UI updated successfully.")
+def _run_command(args: argparse.Namespace) -> int:
+    if args.command == "batch":
+        return run_batch_command(args)
+    if args.command == "build-sites":
+        return run_build_sites(args)
+    if args.command == "serve":
+        return run_serve(args)
+    if args.command == "schedule":
+        return run_schedule(args)
+
+    if args.command == "fetch":
+        run_fetch(args)
+        return 0
+
+    if args.command == "render":
+        changed = run_render(args)
+    elif args.command == "ingest":
+        changed = run_ingest(args)
+    elif args.command == "backfill":
+        changed = run_backfill(args)
+    else:
+        changed = run_single(args)
+    if not changed and args.exit_code_if_unchanged:
+        return EXIT_UNCHANGED
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
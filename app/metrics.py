@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+METRICS_VERSION = 1
+
+
+class MetricsCollector:
+    """
+    Spans and counters for one run.
+
+    A span records wall time, CPU time (process-wide), the `tracemalloc` peak reached while it was
+    open (when memory tracing is on) and how much each counter grew, e.g. `bytes_read`,
+    `bytes_written` or `http_requests`. Spans nest per thread; `parent` is the enclosing span's name.
+
+    Like CPU time, the memory peak is process-wide: tracemalloc keeps a single peak for all threads, so
+    while worker threads run (backfill, batch, the scheduler) a span's `peak_bytes` includes their
+    allocations, and a span opened on another thread resets it. Only single-threaded runs give a
+    per-stage figure.
+    """
+
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.trace_memory = trace_memory
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _stack(self) -> List[List[Any]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        stack = self._stack()
+        # Each open span keeps its running peak in `frame[1]`; tracemalloc only has one global peak,
+        # so it is folded into the parent and reset when a child opens, then propagated on close.
+        if self.trace_memory and stack:
+            stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        with self._lock:
+            counters_before = dict(self.counters)
+        frame: List[Any] = [name, 0]
+        stack.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            stack.pop()
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1]) if self.trace_memory else None
+            if stack and peak is not None:
+                stack[-1][1] = max(stack[-1][1], peak)
+            with self._lock:
+                deltas = {
+                    key: value - counters_before.get(key, 0)
+                    for key, value in self.counters.items()
+                    if value != counters_before.get(key, 0)
+                }
+                self.spans.append(
+                    {
+                        "name": name,
+                        "parent": stack[-1][0] if stack else None,
+                        "wall_seconds": round(wall, 6),
+                        "cpu_seconds": round(cpu, 6),
+                        "peak_bytes": peak,
+                        "counters": deltas,
+                    }
+                )
+
+    def close(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": METRICS_VERSION, "spans": list(self.spans), "counters": dict(self.counters)}
+
+    def write(self, destination: str) -> None:
+        """Write the metrics as JSON to `destination`, or to stdout for `-`."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if destination == "-":
+            sys.stdout.write(text + "\n")
+        else:
+            Path(destination).write_text(text + "\n", encoding="utf-8")
+
+
+_collector: Optional[MetricsCollector] = None
+
+
+def enable(trace_memory: bool = True) -> MetricsCollector:
+    """Start collecting metrics for this process. Without it, `span` and `count` do nothing."""
+    global _collector
+    _collector = MetricsCollector(trace_memory=trace_memory)
+    return _collector
+
+
+def disable() -> Optional[MetricsCollector]:
+    global _collector
+    collector, _collector = _collector, None
+    if collector is not None:
+        collector.close()
+    return collector
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    collector = _collector
+    if collector is None:
+        yield
+        return
+    with collector.span(name):
+        yield
+
+
+def count(name: str, value: int = 1) -> None:
+    collector = _collector
+    if collector is not None:
+        collector.count(name, value)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import html
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from app import ui_updater
+from app.assets import plotly_asset, prune_asset_versions
+from app.config import DEFAULT_SITE_CHUNKSIZE
+from app.fileio import atomic_write_bytes
+from app.storage import INDEX_FILENAME, get_backend, segment_dir
+from app.template import load_template
+
+HISTORY_FILENAME = "listening_history.csv"
+SITES_INDEX_TEMPLATE = "sites_index_template.html"
+
+_UNSAFE_DIRNAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+@dataclass
+class SiteResult:
+    user: str
+    output_dir: Path
+    ok: bool
+    months: int = 0
+    changed: bool = False
+    error: Optional[str] = None
+
+
+def user_output_dir(output_root: Path | str, user: str) -> Path:
+    """
+    Directory holding one user's history CSV and generated site, always a direct child of `output_root`.
+
+    Raises:
+        ValueError: `user` is made of dots only (`.`, `..`), which would name `output_root` or its parent.
+    """
+    dirname = _UNSAFE_DIRNAME_CHARS.sub("_", user) or "_"
+    if not dirname.strip("."):
+        raise ValueError(f"Invalid user name: {user!r}")
+    return Path(output_root) / dirname
+
+
+def discover_sites(output_root: Path | str) -> List[str]:
+    """Names of the user directories under `output_root` that have a stored history, sorted."""
+    root = Path(output_root)
+    if not root.is_dir():
+        return []
+    users = []
+    for child in sorted(root.iterdir()):
+        history_path = child / HISTORY_FILENAME
+        if child.is_dir() and ((segment_dir(history_path) / INDEX_FILENAME).exists() or history_path.exists()):
+            users.append(child.name)
+    return users
+
+
+def _init_worker() -> None:
+    """Load the page template, palette and Plotly asset once per worker process instead of once per site."""
+    ui_updater._template()
+    ui_updater._default_palette()
+    plotly_asset()
+
+
+def build_user_site(
+    user: str, output_dir: Path, sharded: bool = False, asset_root: Path | str | None = None
+) -> SiteResult:
+    """
+    Render one user's site from its stored history, with the Plotly bundle under `asset_root` (see
+    `ui_updater.update_ui`). Never raises: failures are returned.
+    """
+    try:
+        backend = get_backend(output_dir / HISTORY_FILENAME, user=user)
+        try:
+            frame = backend.load_frame()
+        finally:
+            backend.close()
+        result = ui_updater.build_site(frame, output_dir=output_dir, sharded=sharded, asset_root=asset_root)
+    except Exception as exc:  # one broken history must not abort the other sites
+        return SiteResult(user=user, output_dir=output_dir, ok=False, error=f"{type(exc).__name__}: {exc}")
+    return SiteResult(user=user, output_dir=output_dir, ok=True, months=len(frame), changed=result.changed)
+
+
+def _build_task(task: Tuple[str, Path, bool, Path]) -> SiteResult:
+    user, output_dir, sharded, asset_root = task
+    return build_user_site(user, output_dir, sharded, asset_root)
+
+
+def iter_build_sites(
+    users: Iterable[str],
+    output_root: Path | str = "site/users",
+    max_workers: Optional[int] = None,
+    chunksize: int = DEFAULT_SITE_CHUNKSIZE,
+    sharded: bool = False,
+) -> Iterator[SiteResult]:
+    """
+    Build many user sites on a process pool, yielding results in input order.
+
+    Each worker loads the template and palette once (`_init_worker`); sites are handed out and
+    their small `SiteResult`s returned `chunksize` at a time, so neither the task queue nor the
+    results ever carry page payloads. All sites load the Plotly bundle from one shared copy under
+    `output_root/assets/`.
+    """
+    root = Path(output_root)
+    tasks = ((user, user_output_dir(root, user), sharded, root) for user in users)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        yield from pool.map(_build_task, tasks, chunksize=max(1, chunksize))
+
+
+def build_sites(
+    users: Optional[Iterable[str]] = None,
+    output_root: Path | str = "site/users",
+    max_workers: Optional[int] = None,
+    chunksize: int = DEFAULT_SITE_CHUNKSIZE,
+    sharded: bool = False,
+) -> List[SiteResult]:
+    """
+    Render every user site under `output_root` in parallel, then write an index page linking them.
+
+    Args:
+        users: Users to build (defaults to every directory under `output_root` with a stored history).
+        output_root: Parent directory with one sub-directory per user (as written by `run_batch`).
+        max_workers: Worker processes (defaults to the CPU count).
+        chunksize: Sites sent to a worker (and results returned) per round trip.
+        sharded: Build each site with per-month JSON shards (see `update_ui`).
+
+    Superseded versions of the shared Plotly bundle are removed once every discovered site has been
+    rebuilt against the current one.
+    """
+    user_list = discover_sites(output_root) if users is None else list(users)
+    results = list(iter_build_sites(user_list, output_root, max_workers, chunksize, sharded))
+    if users is None and all(result.ok for result in results):
+        prune_asset_versions(Path(output_root), plotly_asset())  # every page now points at this version
+    write_sites_index(results, output_root)
+    return results
+
+
+def render_sites_index(results: List[SiteResult], output_root: Path | str) -> str:
+    items = []
+    for result in sorted(results, key=lambda result: result.user.lower()):
+        name = html.escape(result.user)
+        href = quote(result.output_dir.relative_to(output_root).as_posix()) + "/index.html"
+        if result.ok:
+            detail = f"{result.months} month{'s' if result.months != 1 else ''}"
+            items.append(f'        <li><a href="{href}">{name}</a><small>{detail}</small></li>')
+        else:
+            error = html.escape(result.error or "build failed")
+            items.append(f'        <li class="failed"><a href="{href}">{name}</a><small>{error}</small></li>')
+    return load_template(SITES_INDEX_TEMPLATE).render(
+        {"__SITE_COUNT__": str(len(results)), "__SITE_ITEMS__": "\n".join(items)}
+    )
+
+
+def write_sites_index(results: List[SiteResult], output_root: Path | str) -> bool:
+    """Write `output_root/index.html` unless it is already identical. Returns True if it was written."""
+    path = Path(output_root) / "index.html"
+    data = render_sites_index(results, output_root).encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    atomic_write_bytes(path, data)
+    return True
+
+
+def format_site_summary(results: List[SiteResult]) -> str:
+    failures = [result for result in results if not result.ok]
+    changed = sum(1 for result in results if result.changed)
+    lines = [f"Built {len(results) - len(failures)} site(s) ({changed} changed), {len(failures)} failed."]
+    for result in failures:
+        lines.append(f"  FAILED {result.user}: {result.error}")
+    return "\n".join(lines)
@@ -0,0 +1,69 @@
+"""
+Artist colors: plotly.colors.qualitative Plotly + Safe + Bold + Pastel + Antique, in that order.
+
+Vendored so building the site never imports plotly (a large share of a short run's startup).
+`tests/test_startup.py` checks it still matches the installed plotly.
+"""
+
+# Generated from plotly 6.4.0, the version pinned in uv.lock (unchanged through 7.1.0).
+PALETTE = [
+    # Plotly
+    "#636EFA",
+    "#EF553B",
+    "#00CC96",
+    "#AB63FA",
+    "#FFA15A",
+    "#19D3F3",
+    "#FF6692",
+    "#B6E880",
+    "#FF97FF",
+    "#FECB52",
+    # Safe
+    "rgb(136, 204, 238)",
+    "rgb(204, 102, 119)",
+    "rgb(221, 204, 119)",
+    "rgb(17, 119, 51)",
+    "rgb(51, 34, 136)",
+    "rgb(170, 68, 153)",
+    "rgb(68, 170, 153)",
+    "rgb(153, 153, 51)",
+    "rgb(136, 34, 85)",
+    "rgb(102, 17, 0)",
+    "rgb(136, 136, 136)",
+    # Bold
+    "rgb(127, 60, 141)",
+    "rgb(17, 165, 121)",
+    "rgb(57, 105, 172)",
+    "rgb(242, 183, 1)",
+    "rgb(231, 63, 116)",
+    "rgb(128, 186, 90)",
+    "rgb(230, 131, 16)",
+    "rgb(0, 134, 149)",
+    "rgb(207, 28, 144)",
+    "rgb(249, 123, 114)",
+    "rgb(165, 170, 153)",
+    # Pastel
+    "rgb(102, 197, 204)",
+    "rgb(246, 207, 113)",
+    "rgb(248, 156, 116)",
+    "rgb(220, 176, 242)",
+    "rgb(135, 197, 95)",
+    "rgb(158, 185, 243)",
+    "rgb(254, 136, 177)",
+    "rgb(201, 219, 116)",
+    "rgb(139, 224, 164)",
+    "rgb(180, 151, 231)",
+    "rgb(179, 179, 179)",
+    # Antique
+    "rgb(133, 92, 117)",
+    "rgb(217, 175, 107)",
+    "rgb(175, 100, 88)",
+    "rgb(115, 111, 76)",
+    "rgb(82, 106, 131)",
+    "rgb(98, 83, 119)",
+    "rgb(104, 133, 92)",
+    "rgb(156, 156, 94)",
+    "rgb(160, 97, 119)",
+    "rgb(140, 120, 93)",
+    "rgb(124, 124, 124)",
+]
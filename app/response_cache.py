@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from app.fileio import atomic_write_bytes, read_bytes
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("LASTFM_CACHE_DIR", ".cache/lastfm"))
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Params that never change the response body and must not end up on disk.
+_IGNORED_PARAMS = {"api_key", "format"}
+
+
+def cache_key(params: Mapping[str, Any]) -> str:
+    """Stable key for a Last.fm request: method + remaining params, with the username case-folded."""
+    normalized = {name: str(value) for name, value in params.items() if name not in _IGNORED_PARAMS}
+    if "user" in normalized:
+        normalized["user"] = normalized["user"].lower()  # Last.fm usernames are case-insensitive
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of decoded Last.fm responses.
+
+    Entries expire `ttl` seconds after they were stored. A hit bumps the entry's mtime, and once the
+    directory grows past `max_bytes` the least recently used entries are deleted. Entries are written
+    atomically, so concurrent runs sharing the directory only ever see complete files.
+
+    The directory is scanned once (on the first write) to learn its size; after that a running total
+    of the entries this process wrote or deleted is kept, and the directory is only scanned again
+    when that total goes over budget.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+        # Entry file name -> size, for the entries known to this process (None until the first scan).
+        self._sizes: Optional[Dict[str, int]] = None
+        self._total = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, params: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        path = self._path(cache_key(params))
+        try:
+            entry = json.loads(read_bytes(path))
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get("stored_at", 0) > self.ttl:
+            path.unlink(missing_ok=True)
+            self._forget(path.name)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return entry.get("payload")
+
+    def put(self, params: Mapping[str, Any], payload: Dict[str, Any]) -> None:
+        entry = {
+            "stored_at": time.time(),
+            "params": {name: value for name, value in params.items() if name not in _IGNORED_PARAMS},
+            "payload": payload,
+        }
+        data = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        path = self._path(cache_key(params))
+        atomic_write_bytes(path, data)
+        with self._evict_lock:
+            if self._sizes is None:
+                self._scan()
+            else:
+                self._total += len(data) - self._sizes.get(path.name, 0)
+                self._sizes[path.name] = len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    @property
+    def entry_count(self) -> int:
+        with self._evict_lock:
+            if self._sizes is None:
+                self._scan()
+            return len(self._sizes)
+
+    @property
+    def size_bytes(self) -> int:
+        with self._evict_lock:
+            if self._sizes is None:
+                self._scan()
+            return self._total
+
+    def _forget(self, name: str) -> None:
+        with self._evict_lock:
+            if self._sizes is not None:
+                self._total -= self._sizes.pop(name, 0)
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """Re-read the directory (other processes may share it); returns entries oldest-used first."""
+        entries = []
+        self._sizes = {}
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            self._sizes[path.name] = stat.st_size
+        self._total = sum(self._sizes.values())
+        entries.sort()
+        return entries
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the directory fits `max_bytes` (caller holds the lock)."""
+        for _, size, path in self._scan():
+            if self._total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            del self._sizes[path.name]
+            self._total -= size
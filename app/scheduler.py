@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app import metrics
+from app.api_client import TokenBucket, fetch_top_artists
+from app.batch import refresh_user_site
+from app.config import DEFAULT_BATCH_WORKERS, DEFAULT_PERIOD, DEFAULT_SCHEDULE_BUDGET
+from app.data_processor import MAX_ARTISTS
+from app.fileio import atomic_write_bytes, read_text
+from app.multisite import user_output_dir
+
+SCHEDULE_FILENAME = "schedule.json"
+SCHEDULE_VERSION = 1
+MIN_INTERVAL_SECONDS = 60 * 60
+MAX_INTERVAL_SECONDS = 7 * 24 * 60 * 60
+# Weight of the latest refresh in a user's change score (an exponentially weighted moving average).
+CHANGE_SMOOTHING = 0.5
+# Longest the daemon sleeps before re-checking the queue.
+MAX_IDLE_SECONDS = 60.0
+
+
+@dataclass
+class UserSchedule:
+    """When a user is next due, and what the scheduler remembers about their recent charts."""
+
+    user: str
+    next_due: float = 0.0
+    interval: float = MIN_INTERVAL_SECONDS
+    change_score: float = 1.0
+    payload_hash: Optional[str] = None
+    playcounts: Dict[str, int] = field(default_factory=dict)
+    last_refresh: Optional[float] = None
+    failures: int = 0
+
+
+@dataclass
+class RefreshOutcome:
+    user: str
+    ok: bool
+    changed: bool = False
+    payload_hash: Optional[str] = None
+    playcounts: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def chart_hash(payload: Dict[str, Any], month_key: str) -> str:
+    """
+    Hash of a `user.gettopartists` payload's artist entries (plus the month they are filed under, so an
+    unchanged chart at a month boundary is still stored as the new month).
+    """
+    artists = (payload.get("topartists") or {}).get("artist") or []
+    encoded = json.dumps([month_key, artists], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def chart_playcounts(payload: Dict[str, Any]) -> Dict[str, int]:
+    artists = (payload.get("topartists") or {}).get("artist") or []
+    if isinstance(artists, dict):  # a single-artist chart
+        artists = [artists]
+    return {artist.get("name", ""): int(artist.get("playcount") or 0) for artist in artists}
+
+
+def chart_change(previous: Dict[str, int], current: Dict[str, int]) -> float:
+    """How much a chart moved between refreshes: 0.0 (identical) to 1.0 (completely different)."""
+    if not previous:
+        return 1.0
+    names = previous.keys() | current.keys()
+    moved = sum(abs(current.get(name, 0) - previous.get(name, 0)) for name in names)
+    total = max(1, sum(previous.values()), sum(current.values()))
+    return min(1.0, moved / total)
+
+
+def next_interval(change_score: float) -> float:
+    """Busy charts are refreshed hourly, still ones weekly; in between the interval falls quadratically."""
+    return MIN_INTERVAL_SECONDS + (MAX_INTERVAL_SECONDS - MIN_INTERVAL_SECONDS) * (1.0 - change_score) ** 2
+
+
+class Schedule:
+    """Per-user schedule entries plus a heap ordered by next-due time, persisted as JSON."""
+
+    def __init__(self, entries: Optional[Dict[str, UserSchedule]] = None) -> None:
+        self.entries: Dict[str, UserSchedule] = entries or {}
+        self._heap: List[Tuple[float, str]] = [(entry.next_due, user) for user, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    @classmethod
+    def load(cls, path: Path) -> Schedule:
+        try:
+            raw = json.loads(read_text(path))
+        except (OSError, ValueError):
+            return cls()
+        if raw.get("version") != SCHEDULE_VERSION:
+            return cls()
+        return cls({user: UserSchedule(**entry) for user, entry in raw.get("users", {}).items()})
+
+    def save(self, path: Path) -> None:
+        users = {user: asdict(entry) for user, entry in sorted(self.entries.items())}
+        payload = {"version": SCHEDULE_VERSION, "users": users}
+        atomic_write_bytes(path, json.dumps(payload, ensure_ascii=False, indent=1).encode("utf-8"))
+
+    def sync_users(self, users: Iterable[str], now: float) -> None:
+        """Track exactly `users`: new ones are due immediately, removed ones are forgotten."""
+        wanted = list(users)
+        for user in set(self.entries) - set(wanted):
+            del self.entries[user]
+        for user in wanted:
+            if user not in self.entries:
+                self.entries[user] = UserSchedule(user=user, next_due=now)
+        self._heap = [(entry.next_due, user) for user, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    def peek_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> Optional[UserSchedule]:
+        """Remove and return the most overdue user, or None if nobody is due yet."""
+        if not self._heap or self._heap[0][0] > now:
+            return None
+        _, user = heapq.heappop(self._heap)
+        return self.entries[user]
+
+    def record(self, outcome: RefreshOutcome, now: float) -> UserSchedule:
+        """Fold a refresh result into the user's entry and queue them again."""
+        entry = self.entries[outcome.user]
+        if outcome.ok:
+            change = chart_change(entry.playcounts, outcome.playcounts) if outcome.changed else 0.0
+            entry.change_score = CHANGE_SMOOTHING * change + (1 - CHANGE_SMOOTHING) * entry.change_score
+            entry.interval = next_interval(entry.change_score)
+            entry.payload_hash = outcome.payload_hash
+            entry.playcounts = outcome.playcounts
+            entry.last_refresh = now
+            entry.failures = 0
+        else:
+            # Failed refreshes back off exponentially without touching the change history.
+            entry.failures += 1
+            entry.interval = min(MAX_INTERVAL_SECONDS, MIN_INTERVAL_SECONDS * 2 ** (entry.failures - 1))
+        entry.next_due = now + entry.interval
+        heapq.heappush(self._heap, (entry.next_due, entry.user))
+        return entry
+
+
+def refresh_user(
+    api_key: str,
+    entry: UserSchedule,
+    output_root: Path | str = "site/users",
+    period: str = DEFAULT_PERIOD,
+    sharded: bool = False,
+    run_timestamp: Optional[datetime] = None,
+) -> RefreshOutcome:
+    """
+    Fetch one user's chart and, only if it differs from the last refresh, store it and rebuild their site.
+
+    Never raises: failures are returned so one user can't stop the daemon.
+    """
+    run_timestamp = run_timestamp or datetime.now(tz=timezone.utc)
+    try:
+        payload = fetch_top_artists(api_key=api_key, user=entry.user, period=period, limit=MAX_ARTISTS, refresh=True)
+        payload_hash = chart_hash(payload, run_timestamp.strftime("%Y-%m"))
+        playcounts = chart_playcounts(payload)
+        if payload_hash == entry.payload_hash:
+            metrics.count("schedule_unchanged")
+            return RefreshOutcome(entry.user, ok=True, payload_hash=payload_hash, playcounts=playcounts)
+        output_dir = user_output_dir(output_root, entry.user)
+        refresh_user_site(payload, output_dir, run_timestamp, sharded=sharded, asset_root=output_root)
+    except Exception as exc:  # one bad user must not stop the daemon
+        return RefreshOutcome(entry.user, ok=False, error=f"{exc}")
+    return RefreshOutcome(entry.user, ok=True, changed=True, payload_hash=payload_hash, playcounts=playcounts)
+
+
+class RefreshScheduler:
+    """
+    Refresh users as they fall due, most overdue first, within a global rate budget.
+
+    `budget_per_minute` caps how many refreshes are dispatched per minute across all users (a token
+    bucket with a burst of `max_workers`), on top of the API client's own per-request limit; at most
+    `max_workers` refreshes run at once. The schedule is saved after every completed refresh, so a
+    restarted daemon picks up where it stopped.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[UserSchedule], RefreshOutcome],
+        schedule: Schedule,
+        schedule_path: Optional[Path] = None,
+        budget_per_minute: float = DEFAULT_SCHEDULE_BUDGET,
+        max_workers: int = DEFAULT_BATCH_WORKERS,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.refresh = refresh
+        self.schedule = schedule
+        self.schedule_path = schedule_path
+        self.max_workers = max(1, max_workers)
+        self.bucket = TokenBucket(rate=budget_per_minute / 60.0, capacity=self.max_workers)
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self, once: bool = False, max_refreshes: Optional[int] = None) -> List[RefreshOutcome]:
+        """
+        Run until interrupted, or with `once` until nobody is due any more (`max_refreshes` also stops
+        the loop). Returns the outcomes of the refreshes performed.
+        """
+        outcomes: List[RefreshOutcome] = []
+        dispatched = 0
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                limit_reached = max_refreshes is not None and dispatched >= max_refreshes
+                while len(running) < self.max_workers and not limit_reached:
+                    entry = self.schedule.pop_due(self.clock())
+                    if entry is None:
+                        break
+                    self.bucket.acquire()
+                    running[pool.submit(self.refresh, entry)] = entry.user
+                    dispatched += 1
+                    limit_reached = max_refreshes is not None and dispatched >= max_refreshes
+
+                if not running:
+                    next_due = self.schedule.peek_due()
+                    if once or limit_reached or next_due is None:
+                        break
+                    self.sleep(min(MAX_IDLE_SECONDS, max(0.0, next_due - self.clock())))
+                    continue
+
+                done, _ = wait(running, timeout=MAX_IDLE_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    outcome = future.result()
+                    self.schedule.record(outcome, self.clock())
+                    outcomes.append(outcome)
+                    metrics.count("schedule_refreshes")
+                if done and self.schedule_path is not None:
+                    self.schedule.save(self.schedule_path)
+        return outcomes
+
+
+def run_scheduler(
+    api_key: str,
+    users: Iterable[str],
+    output_root: Path | str = "site/users",
+    period: str = DEFAULT_PERIOD,
+    budget_per_minute: float = DEFAULT_SCHEDULE_BUDGET,
+    max_workers: int = DEFAULT_BATCH_WORKERS,
+    sharded: bool = False,
+    once: bool = False,
+) -> List[RefreshOutcome]:
+    """Load the schedule under `output_root`, refresh `users` as they fall due and persist the schedule."""
+    schedule_path = Path(output_root) / SCHEDULE_FILENAME
+    schedule = Schedule.load(schedule_path)
+    schedule.sync_users(users, time.time())
+
+    def refresh(entry: UserSchedule) -> RefreshOutcome:
+        return refresh_user(api_key, entry, output_root=output_root, period=period, sharded=sharded)
+
+    scheduler = RefreshScheduler(refresh, schedule, schedule_path, budget_per_minute, max_workers)
+    outcomes = scheduler.run(once=once)
+    schedule.save(schedule_path)
+    return outcomes
+
+
+def format_schedule_summary(outcomes: List[RefreshOutcome]) -> str:
+    failures = [outcome for outcome in outcomes if not outcome.ok]
+    changed = sum(1 for outcome in outcomes if outcome.changed)
+    unchanged = len(outcomes) - changed - len(failures)
+    lines = [f"Refreshed {len(outcomes)} user(s): {changed} changed, {unchanged} unchanged, {len(failures)} failed."]
+    for outcome in failures:
+        lines.append(f"  FAILED {outcome.user}: {outcome.error}")
+    return "\n".join(lines)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from app.data_processor import MAX_ARTISTS, MonthlySnapshot, snapshot_from_counts
+from app.fileio import atomic_write_bytes, read_text
+from app.storage import DEFAULT_HISTORY_PATH, HistoryBackend, _upsert_snapshot, get_backend, save_snapshots
+
+if TYPE_CHECKING:
+    from app.api_client import LastFmClient
+
+CHECKPOINT_FILENAME = "scrobble_checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+
+def default_checkpoint_path(history_path: Path = DEFAULT_HISTORY_PATH) -> Path:
+    return history_path.with_name(CHECKPOINT_FILENAME)
+
+
+def _month_start(timestamp: int) -> datetime:
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_scrobble(track: Dict[str, Any]) -> Optional[Tuple[int, str, Optional[str], str]]:
+    """
+    (timestamp, artist name, artist url, track name) for a `user.getrecenttracks` track, or None if
+    it has no date.
+    """
+    date = track.get("date")
+    if not isinstance(date, dict) or not date.get("uts"):
+        return None
+    artist = track.get("artist") or {}
+    # `extended=1` responses carry `name`/`url`; plain ones only `#text`.
+    name = artist.get("name") or artist.get("#text")
+    if not name:
+        return None
+    return int(date["uts"]), name, artist.get("url") or None, track.get("name") or ""
+
+
+class MonthlyAggregator:
+    """
+    Folds a chronological scrobble stream into per-calendar-month (UTC) artist playcounts.
+
+    Only the month currently being read is held in memory: when a scrobble from a later month
+    arrives, the open month is turned into a `MonthlySnapshot` and returned by `add`. The open
+    month's counts, the last timestamp seen and the (artist, track) pairs already counted at that
+    second make up the checkpoint, so an interrupted or scheduled run resumes exactly where the
+    previous one stopped: timestamps only have one-second resolution, so distinct scrobbles can
+    share one, and a resumed run re-reads that second.
+    """
+
+    __slots__ = ("top_n", "last_uts", "seen_at_last", "month_start", "counts", "urls")
+
+    def __init__(self, top_n: int = MAX_ARTISTS) -> None:
+        self.top_n = top_n
+        self.last_uts = 0
+        self.seen_at_last: Set[Tuple[str, str]] = set()
+        self.month_start: Optional[datetime] = None
+        self.counts: Counter[str] = Counter()
+        self.urls: Dict[str, Optional[str]] = {}
+
+    def add(self, timestamp: int, artist: str, url: Optional[str] = None, track: str = "") -> Optional[MonthlySnapshot]:
+        """Count one scrobble. Returns the previous month's snapshot if this scrobble closed it."""
+        key = (artist, track)
+        if timestamp < self.last_uts or (timestamp == self.last_uts and key in self.seen_at_last):
+            # Already counted before the checkpoint (or a duplicate at a page boundary).
+            return None
+        if timestamp > self.last_uts:
+            self.seen_at_last.clear()
+        self.seen_at_last.add(key)
+        completed = None
+        month_start = _month_start(timestamp)
+        if self.month_start is not None and month_start != self.month_start:
+            completed = self.snapshot()
+            self.counts.clear()
+            self.urls.clear()
+        self.month_start = month_start
+        self.last_uts = timestamp
+        self.counts[artist] += 1
+        if url:
+            self.urls[artist] = url
+        return completed
+
+    def snapshot(self, generated_at: Optional[datetime] = None) -> Optional[MonthlySnapshot]:
+        """Snapshot of the open month so far (None before the first scrobble)."""
+        if self.month_start is None:
+            return None
+        return snapshot_from_counts(self.month_start, self.counts, self.urls, generated_at, self.top_n)
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "version": CHECKPOINT_VERSION,
+            "last_uts": self.last_uts,
+            "seen_at_last": sorted([artist, track] for artist, track in self.seen_at_last),
+            "month_key": self.month_start.strftime("%Y-%m") if self.month_start else None,
+            "counts": dict(self.counts),
+            "urls": {name: url for name, url in self.urls.items() if url},
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], top_n: int = MAX_ARTISTS) -> MonthlyAggregator:
+        aggregator = cls(top_n)
+        aggregator.last_uts = int(state.get("last_uts") or 0)
+        aggregator.seen_at_last.update((artist, track) for artist, track in state.get("seen_at_last") or [])
+        month_key = state.get("month_key")
+        if month_key:
+            aggregator.month_start = datetime.strptime(month_key, "%Y-%m").replace(tzinfo=timezone.utc)
+            aggregator.counts.update(state.get("counts") or {})
+            aggregator.urls.update(state.get("urls") or {})
+        return aggregator
+
+    @classmethod
+    def load(cls, path: Path, top_n: int = MAX_ARTISTS) -> MonthlyAggregator:
+        try:
+            state = json.loads(read_text(path))
+        except (OSError, ValueError):
+            return cls(top_n)
+        if state.get("version") != CHECKPOINT_VERSION:
+            return cls(top_n)
+        return cls.from_state(state, top_n)
+
+    def save(self, path: Path) -> None:
+        atomic_write_bytes(path, json.dumps(self.to_state(), ensure_ascii=False).encode("utf-8"))
+
+
+def aggregate_scrobbles(
+    tracks: Iterable[Dict[str, Any]],
+    aggregator: MonthlyAggregator,
+) -> Iterator[MonthlySnapshot]:
+    """Feed oldest-first tracks into `aggregator`, yielding each month as soon as it is complete."""
+    for track in tracks:
+        scrobble = parse_scrobble(track)
+        if scrobble is None:
+            continue
+        completed = aggregator.add(*scrobble)
+        if completed is not None:
+            yield completed
+
+
+def ingest_scrobbles(
+    client: LastFmClient,
+    user: str,
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+    checkpoint_path: Optional[Path] = None,
+    from_ts: Optional[int] = None,
+) -> int:
+    """
+    Stream `user`'s scrobbles since the last checkpoint into calendar-month snapshots.
+
+    Each completed month is stored as soon as it closes, followed by the checkpoint (storage first,
+    so a crash in between only means that month is recomputed identically on the next run). The
+    open month is stored as a partial snapshot at the end, only if its chart changed, so an ingest
+    without new scrobbles leaves the history (and site) untouched. `from_ts` only applies when there
+    is no checkpoint yet. Returns the number of months written.
+    """
+    checkpoint_path = checkpoint_path or default_checkpoint_path(history_path)
+    aggregator = MonthlyAggregator.load(checkpoint_path)
+    # Inclusive: scrobbles at the checkpoint's second that were not counted yet are picked up.
+    start = aggregator.last_uts if aggregator.last_uts else from_ts
+
+    owns_backend = backend is None
+    if backend is None:
+        backend = get_backend(history_path, user=user)
+    written = 0
+    try:
+        for snapshot in aggregate_scrobbles(client.iter_recent_tracks(user, from_ts=start), aggregator):
+            save_snapshots([snapshot], backend=backend)
+            aggregator.save(checkpoint_path)
+            written += 1
+        current = aggregator.snapshot()
+        if current is not None and _upsert_snapshot(backend, current):
+            written += 1
+        aggregator.save(checkpoint_path)
+    finally:
+        if owns_backend:
+            backend.close()
+    return written
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from app import metrics
+from app.analytics import compute_analytics
+from app.assets import plotly_asset
+from app.config import DEFAULT_SERVE_CACHE_BYTES, DEFAULT_SERVE_PORT
+from app.multisite import HISTORY_FILENAME, user_output_dir
+from app.storage import INDEX_FILENAME, get_backend, segment_dir
+from app.ui_updater import _attach_movement, _prepare_snapshots, _render_html_chunks, encode_payload
+
+MAX_HEADER_BYTES = 16 * 1024
+
+logger = logging.getLogger(__name__)
+
+# (status, headers, body)
+Response = Tuple[HTTPStatus, Dict[str, str], bytes]
+
+
+@dataclass
+class CachedSite:
+    """One user's rendered page and snapshot JSON, valid while their stored history is unchanged."""
+
+    version: Tuple[int, ...]
+    payload: bytes
+    payload_etag: str
+    page: bytes
+    page_etag: str
+
+    @property
+    def size(self) -> int:
+        return len(self.payload) + len(self.page)
+
+
+class SiteCache:
+    """LRU of `CachedSite`s bounded by the total size of their bodies rather than by entry count."""
+
+    def __init__(self, max_bytes: int = DEFAULT_SERVE_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, CachedSite] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user: str) -> Optional[CachedSite]:
+        site = self._entries.get(user)
+        if site is not None:
+            self._entries.move_to_end(user)
+        return site
+
+    def put(self, user: str, site: CachedSite) -> None:
+        self.discard(user)
+        if site.size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        self._entries[user] = site
+        self.size += site.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            metrics.count("site_cache_evictions")
+
+    def discard(self, user: str) -> None:
+        site = self._entries.pop(user, None)
+        if site is not None:
+            self.size -= site.size
+
+
+def storage_version(history_path: Path) -> Optional[Tuple[int, ...]]:
+    """
+    Cheap token that changes whenever the CSV history at `history_path` is written: the stat of the
+    segment index (which every save replaces), or of a legacy single-file CSV not yet split into
+    segments. None when nothing is stored. (The server only reads CSV histories; a SQLite database in
+    WAL mode would not reliably change its own stat on commit.)
+    """
+    for path in (segment_dir(history_path) / INDEX_FILENAME, history_path):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    return None
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+
+
+def render_site(user: str, history_path: Path, version: Tuple[int, ...]) -> CachedSite:
+    """Load `user`'s stored history and render its page and snapshot JSON (blocking; runs off the event loop)."""
+    backend = get_backend(history_path, user=user)
+    try:
+        frame = backend.load_frame()
+    finally:
+        backend.close()
+    snapshots = _prepare_snapshots(frame)
+    _attach_movement(snapshots, compute_analytics(frame))
+    payload = encode_payload(snapshots)
+    payload_bytes = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    page = b"".join(_render_html_chunks(payload, plotly_src="/" + plotly_asset().relpath))
+    return CachedSite(
+        version=version,
+        payload=payload_bytes,
+        payload_etag=_etag(payload_bytes),
+        page=page,
+        page_etag=_etag(page),
+    )
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class HistoryServer:
+    """
+    Serves `/<user>/` (the page) and `/<user>/history.json` (the snapshot payload) from the
+    histories under `output_root`, plus the self-hosted Plotly bundle under `/assets/`.
+
+    Rendered sites are kept in a byte-bounded `SiteCache` and reused until the user's stored history
+    changes. Concurrent requests for a user whose entry is missing or stale share one refresh, which
+    runs in a worker thread so the event loop keeps answering other users.
+    """
+
+    def __init__(self, output_root: Path | str = "site/users", cache_bytes: int = DEFAULT_SERVE_CACHE_BYTES) -> None:
+        self.output_root = Path(output_root)
+        self.cache = SiteCache(cache_bytes)
+        self._refreshes: Dict[Tuple[str, Tuple[int, ...]], asyncio.Future] = {}
+
+    async def site(self, user: str) -> Optional[CachedSite]:
+        """The user's current site, refreshed if their history changed; None if they have no history."""
+        history_path = user_output_dir(self.output_root, user) / HISTORY_FILENAME
+        version = storage_version(history_path)
+        if version is None:
+            return None
+        cached = self.cache.get(user)
+        if cached is not None and cached.version == version:
+            metrics.count("site_cache_hits")
+            return cached
+
+        key = (user, version)
+        refresh = self._refreshes.get(key)
+        if refresh is None:
+            metrics.count("site_cache_misses")
+            refresh = asyncio.ensure_future(self._refresh(user, history_path, version))
+            self._refreshes[key] = refresh
+            refresh.add_done_callback(lambda done: self._refreshes.pop(key, None))
+        else:
+            metrics.count("site_refreshes_coalesced")
+        # Shielded: a client that disconnects must not cancel the refresh other requests are waiting on.
+        return await asyncio.shield(refresh)
+
+    async def _refresh(self, user: str, history_path: Path, version: Tuple[int, ...]) -> CachedSite:
+        site = await asyncio.get_running_loop().run_in_executor(None, render_site, user, history_path, version)
+        self.cache.put(user, site)
+        return site
+
+    async def respond(self, method: str, target: str, headers: Dict[str, str]) -> Response:
+        """Answer one request; a failure while loading or rendering a site becomes a 500, not a dropped connection."""
+        try:
+            return await self._route(method, target, headers)
+        except Exception:
+            logger.exception("Failed to serve %s %s", method, target)
+            metrics.count("http_errors")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {}, b""
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str]) -> Response:
+        if method not in ("GET", "HEAD"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "GET, HEAD"}, b""
+        path = unquote(urlsplit(target).path)
+
+        asset = plotly_asset()
+        if path == "/" + asset.relpath:
+            response_headers = {
+                "Content-Type": "text/javascript; charset=utf-8",
+                "Cache-Control": "public, max-age=31536000, immutable",
+                "Vary": "Accept-Encoding",
+            }
+            if "gzip" in headers.get("accept-encoding", ""):
+                response_headers["Content-Encoding"] = "gzip"
+                return HTTPStatus.OK, response_headers, asset.variants[".gz"]
+            return HTTPStatus.OK, response_headers, asset.data
+
+        parts = path.strip("/").split("/")
+        user, resource = parts[0], "/".join(parts[1:]) or "index.html"
+        if not user.strip(".") or resource not in ("index.html", "history.json"):
+            return HTTPStatus.NOT_FOUND, {}, b""
+        site = await self.site(user)
+        if site is None:
+            return HTTPStatus.NOT_FOUND, {}, b""
+
+        if resource == "history.json":
+            body, etag, content_type = site.payload, site.payload_etag, "application/json"
+        else:
+            body, etag, content_type = site.page, site.page_etag, "text/html; charset=utf-8"
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(headers.get("if-none-match"), etag):
+            metrics.count("http_not_modified")
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+        response_headers["Content-Type"] = content_type
+        return HTTPStatus.OK, response_headers, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection, keeping it open between requests unless the client asks otherwise."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                try:
+                    method, target, version, headers = _parse_head(head)
+                except ValueError:
+                    writer.write(_format_head(HTTPStatus.BAD_REQUEST, {"Content-Length": "0", "Connection": "close"}))
+                    break
+                status, response_headers, body = await self.respond(method, target, headers)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                writer.write(_format_head(status, response_headers))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def _parse_head(head: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ")
+    if not version.startswith("HTTP/1."):
+        raise ValueError(f"Unsupported protocol: {version}")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def _format_head(status: HTTPStatus, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def start_server(
+    output_root: Path | str = "site/users",
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_SERVE_PORT,
+    cache_bytes: int = DEFAULT_SERVE_CACHE_BYTES,
+) -> asyncio.AbstractServer:
+    history_server = HistoryServer(output_root, cache_bytes)
+    return await asyncio.start_server(history_server.handle, host, port, limit=MAX_HEADER_BYTES)
+
+
+async def serve(
+    output_root: Path | str = "site/users",
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_SERVE_PORT,
+    cache_bytes: int = DEFAULT_SERVE_CACHE_BYTES,
+) -> None:
+    """Serve every user under `output_root` until cancelled."""
+    server = await start_server(output_root, host, port, cache_bytes)
+    print(f"Serving {output_root} on http://{host}:{port}/<user>/")
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.history_frame import HistoryFrame
+from app.storage import HistoryBackend
+
+# How long a writer waits for another connection's write transaction before giving up.
+BUSY_TIMEOUT_SECONDS = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    user TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    month_label TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    PRIMARY KEY (user, month_key)
+);
+CREATE TABLE IF NOT EXISTS artist_stats (
+    user TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    playcount INTEGER NOT NULL,
+    image_url TEXT,
+    url TEXT,
+    rank INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artist_stats_user_month ON artist_stats (user, month_key);
+CREATE INDEX IF NOT EXISTS idx_artist_stats_artist ON artist_stats (artist_name);
+"""
+
+
+class SqliteBackend(HistoryBackend):
+    """
+    History stored in a SQLite database (WAL mode), shared by many users.
+
+    Every query is scoped to `user`. Whole snapshots are written with `executemany` inside one
+    transaction, and the per-artist / date-range queries run in SQL against the indexes instead of
+    loading the history into Python.
+    """
+
+    def __init__(self, db_path: Path | str, user: str = "") -> None:
+        self.db_path = Path(db_path)
+        self.user = user
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> SqliteBackend:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def load_history(self) -> Dict[str, Dict[str, Any]]:
+        history: Dict[str, Dict[str, Any]] = {}
+        months = self.connection.execute(
+            "SELECT month_key, month_label, generated_at FROM months WHERE user = ? ORDER BY month_key",
+            (self.user,),
+        )
+        for month_key, month_label, generated_at in months:
+            history[month_key] = {
+                "month_key": month_key,
+                "month_label": month_label,
+                "generated_at": generated_at,
+                "artists": [],
+            }
+
+        rows = self.connection.execute(
+            "SELECT month_key, artist_name, playcount, image_url, url, rank FROM artist_stats "
+            "WHERE user = ? ORDER BY month_key, rank, playcount DESC",
+            (self.user,),
+        )
+        for month_key, name, playcount, image_url, url, rank in rows:
+            history[month_key]["artists"].append(
+                {"name": name, "playcount": playcount, "image_url": image_url, "url": url, "rank": rank}
+            )
+        return history
+
+    def load_frame(self) -> HistoryFrame:
+        months = self.connection.execute(
+            "SELECT month_key, month_label, generated_at FROM months WHERE user = ? ORDER BY month_key",
+            (self.user,),
+        ).fetchall()
+        frame = HistoryFrame()
+        for month_key, month_label, generated_at in months:
+            rows = self.connection.execute(
+                "SELECT artist_name, playcount, image_url, url, rank FROM artist_stats "
+                "WHERE user = ? AND month_key = ? ORDER BY rank, playcount DESC",
+                (self.user, month_key),
+            )
+            frame.append_month(month_key, month_label, generated_at, rows)
+        return frame
+
+    def months(self) -> List[str]:
+        rows = self.connection.execute("SELECT month_key FROM months WHERE user = ? ORDER BY month_key", (self.user,))
+        return [month_key for (month_key,) in rows]
+
+    def load_month(self, month_key: str) -> Optional[Dict[str, Any]]:
+        month = self.connection.execute(
+            "SELECT month_label, generated_at FROM months WHERE user = ? AND month_key = ?",
+            (self.user, month_key),
+        ).fetchone()
+        if month is None:
+            return None
+
+        rows = self.connection.execute(
+            "SELECT artist_name, playcount, image_url, url, rank FROM artist_stats "
+            "WHERE user = ? AND month_key = ? ORDER BY rank, playcount DESC",
+            (self.user, month_key),
+        )
+        return {
+            "month_key": month_key,
+            "month_label": month[0],
+            "generated_at": month[1],
+            "artists": [
+                {"name": name, "playcount": playcount, "image_url": image_url, "url": url, "rank": rank}
+                for name, playcount, image_url, url, rank in rows
+            ],
+        }
+
+    def save_snapshots(self, payloads: Iterable[Dict[str, Any]]) -> None:
+        payloads = list(payloads)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM artist_stats WHERE user = ? AND month_key = ?",
+                [(self.user, payload["month_key"]) for payload in payloads],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO months (user, month_key, month_label, generated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (self.user, payload["month_key"], payload["month_label"], payload["generated_at"])
+                    for payload in payloads
+                ],
+            )
+            self.connection.executemany(
+                "INSERT INTO artist_stats (user, month_key, artist_name, playcount, image_url, url, rank) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        self.user,
+                        payload["month_key"],
+                        artist["name"],
+                        int(artist["playcount"]),
+                        artist.get("image_url"),
+                        artist.get("url"),
+                        artist.get("rank", 0),
+                    )
+                    for payload in payloads
+                    for artist in payload["artists"]
+                ),
+            )
+
+    def artist_history(self, artist_name: str) -> List[Dict[str, Any]]:
+        rows = self.connection.execute(
+            "SELECT month_key, playcount, rank FROM artist_stats WHERE artist_name = ? AND user = ? ORDER BY month_key",
+            (artist_name, self.user),
+        )
+        return [{"month_key": month_key, "playcount": playcount, "rank": rank} for month_key, playcount, rank in rows]
+
+    def top_artists(
+        self,
+        start_month: Optional[str] = None,
+        end_month: Optional[str] = None,
+        limit: int = 15,
+    ) -> List[Dict[str, Any]]:
+        clauses = ["user = ?"]
+        params: List[Any] = [self.user]
+        if start_month:
+            clauses.append("month_key >= ?")
+            params.append(start_month)
+        if end_month:
+            clauses.append("month_key <= ?")
+            params.append(end_month)
+        rows = self.connection.execute(
+            "SELECT artist_name, SUM(playcount) AS total FROM artist_stats "
+            f"WHERE {' AND '.join(clauses)} "
+            "GROUP BY artist_name ORDER BY total DESC, artist_name LIMIT ?",
+            (*params, limit),
+        )
+        return [{"name": name, "playcount": total} for name, total in rows]
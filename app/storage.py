@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import abc
+import contextlib
 import csv
+import hashlib
+import io
+import json
 import os
+import tempfile
 from dataclasses import asdict
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Optional, TextIO
 
+from app import metrics
 from app.data_processor import MonthlySnapshot
+from app.fileio import atomic_write_text, file_lock, open_csv, read_text
+from app.history_frame import ArtistRow, HistoryFrame
 
 DEFAULT_HISTORY_PATH = Path(os.environ.get("LISTENING_HISTORY_PATH", "site/listening_history.csv"))
 CSV_HEADERS = [
@@ -19,6 +28,12 @@ CSV_HEADERS = [
     "url",
     "rank",
 ]
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+# Advisory lock files (one per month plus one for the index) of every CSV history. They live outside the
+# history directory, which is part of the published site; every process writing a history must agree on it.
+LOCK_ROOT = Path(os.environ.get("HISTORY_LOCK_DIR") or Path(tempfile.gettempdir()) / "musichabits-locks")
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
 
 
 def _ensure_directory(path: Path) -> None:
@@ -34,75 +49,425 @@ def _snapshot_to_payload(snapshot: MonthlySnapshot) -> Dict[str, Any]:
     }
 
 
-def load_history(history_path: Path = DEFAULT_HISTORY_PATH) -> Dict[str, Dict[str, Any]]:
-    """Load the previously saved top 15 artists from the CSV file."""
-    if not history_path.exists():
-        return {}
+class HistoryBackend(abc.ABC):
+    """
+    Where listening history lives. `load_history`/`save_data` go through one of these.
+
+    Subclasses implement month-level reads and writes; the query helpers have scanning defaults that
+    indexed backends override.
+    """
+
+    @abc.abstractmethod
+    def load_history(self) -> Dict[str, Dict[str, Any]]:
+        """Return every stored month as an ordered dict of month_key -> snapshot payload."""
+
+    def load_frame(self) -> HistoryFrame:
+        """Return every stored month as a columnar HistoryFrame."""
+        return HistoryFrame.from_history(self.load_history())
+
+    def months(self) -> List[str]:
+        """Keys of the stored months, oldest first."""
+        return list(self.load_history())
+
+    @abc.abstractmethod
+    def load_month(self, month_key: str) -> Optional[Dict[str, Any]]:
+        """Return one month's snapshot payload, or None if it was never saved."""
+
+    @abc.abstractmethod
+    def save_snapshots(self, payloads: Iterable[Dict[str, Any]]) -> None:
+        """Insert or replace the given months in a single commit."""
+
+    def save_snapshot(self, payload: Dict[str, Any]) -> None:
+        self.save_snapshots([payload])
+
+    def close(self) -> None:
+        pass
+
+    def artist_history(self, artist_name: str) -> List[Dict[str, Any]]:
+        """One artist's playcount and rank for every month they charted, oldest first."""
+        rows = []
+        for month_key, snapshot in self.load_history().items():
+            for artist in snapshot["artists"]:
+                if artist["name"] == artist_name:
+                    rows.append({"month_key": month_key, "playcount": artist["playcount"], "rank": artist["rank"]})
+        return rows
+
+    def top_artists(
+        self,
+        start_month: Optional[str] = None,
+        end_month: Optional[str] = None,
+        limit: int = 15,
+    ) -> List[Dict[str, Any]]:
+        """Artists with the highest summed playcount over an inclusive month range."""
+        totals: Dict[str, int] = {}
+        for month_key, snapshot in self.load_history().items():
+            if (start_month and month_key < start_month) or (end_month and month_key > end_month):
+                continue
+            for artist in snapshot["artists"]:
+                totals[artist["name"]] = totals.get(artist["name"], 0) + artist["playcount"]
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{"name": name, "playcount": playcount} for name, playcount in ranked]
+
+
+def segment_dir(history_path: Path) -> Path:
+    """
+    Directory holding the per-month segments for `history_path`.
+
+    `site/listening_history.csv` -> `site/listening_history/` with one `<month_key>.csv` per month
+    and an `index.json` listing the months, so a single month can be read or replaced on its own.
+    """
+    return history_path.with_suffix("")
+
+
+def lock_dir(directory: Path) -> Path:
+    """Directory under `LOCK_ROOT` holding the lock files of the segments in `directory`."""
+    key = hashlib.sha256(str(directory.resolve()).encode("utf-8")).hexdigest()[:16]
+    return LOCK_ROOT / f"{directory.name}-{key}"
 
+
+def _read_rows(csv_file: TextIO, history: Dict[str, Dict[str, Any]]) -> None:
+    reader = csv.DictReader(csv_file)
+    for row in reader:
+        month_key = row["month_key"]
+        bucket = history.setdefault(
+            month_key,
+            {
+                "month_key": month_key,
+                "month_label": row["month_label"],
+                "generated_at": row["generated_at"],
+                "artists": [],
+            },
+        )
+
+        bucket["artists"].append(
+            {
+                "name": row["artist_name"],
+                "playcount": int(row["playcount"]),
+                "image_url": row["image_url"] or None,
+                "url": row["url"] or None,
+                "rank": int(row["rank"]),
+            }
+        )
+
+
+def _iter_segment_rows(csv_file: TextIO) -> Iterator[ArtistRow]:
+    """Artist rows of a single-month segment, without building a dict per row."""
+    reader = csv.reader(csv_file)
+    header = next(reader, None)
+    if header is None:
+        return
+    column = {name: idx for idx, name in enumerate(header)}
+    name_col, playcount_col, rank_col = column["artist_name"], column["playcount"], column["rank"]
+    image_col, url_col = column["image_url"], column["url"]
+    for row in reader:
+        yield row[name_col], int(row[playcount_col]), row[image_col] or None, row[url_col] or None, int(row[rank_col])
+
+
+def _load_legacy_history(history_path: Path) -> Dict[str, Dict[str, Any]]:
     history: Dict[str, Dict[str, Any]] = {}
-    with history_path.open("r", newline="", encoding="utf-8") as csv_file:
-        reader = csv.DictReader(csv_file)
-        for row in reader:
-            month_key = row["month_key"]
-            bucket = history.setdefault(
-                month_key,
-                {
-                    "month_key": month_key,
-                    "month_label": row["month_label"],
-                    "generated_at": row["generated_at"],
-                    "artists": [],
-                },
-            )
-
-            bucket["artists"].append(
-                {
-                    "name": row["artist_name"],
-                    "playcount": int(row["playcount"]),
-                    "image_url": row["image_url"] or None,
-                    "url": row["url"] or None,
-                    "rank": int(row["rank"]),
-                }
-            )
-
-    return dict(sorted(history.items(), key=lambda item: item[0]))
-
-
-def save_data(snapshot: MonthlySnapshot, history_path: Path = DEFAULT_HISTORY_PATH) -> Dict[str, Dict[str, Any]]:
+    with open_csv(history_path) as csv_file:
+        _read_rows(csv_file, history)
+    return history
+
+
+class CsvSegmentBackend(HistoryBackend):
+    """
+    CSV history split into one file per month plus a small month index.
+
+    Saving a month rewrites only that month's segment and the index, each atomically (temp file +
+    fsync + rename), so earlier months are never touched and a crash can't truncate them. A legacy
+    single-file CSV at `history_path` is still read, and is split into segments (and removed) on the
+    first save.
+
+    Many processes can write to the same history: each month's segment is written under that
+    month's advisory lock, and the index is updated as a read-modify-write under an exclusive index
+    lock, so a commit always merges into the latest index and never drops another writer's months.
+    The index lock is held only for that merge, after the segments are written, so writers of
+    different months wait for each other only briefly; readers never lock. The lock files live under
+    `LOCK_ROOT`, outside the published history directory. The index's `revision` counts commits.
+    """
+
+    def __init__(self, history_path: Path = DEFAULT_HISTORY_PATH) -> None:
+        self.history_path = Path(history_path)
+        self.directory = segment_dir(self.history_path)
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        index_path = self.directory / INDEX_FILENAME
+        if not index_path.exists():
+            return None
+        return json.loads(read_text(index_path))
+
+    def _write_index(self, months: Dict[str, Dict[str, Any]], revision: int) -> None:
+        index = {"version": INDEX_VERSION, "revision": revision, "months": dict(sorted(months.items()))}
+        atomic_write_text(self.directory / INDEX_FILENAME, json.dumps(index, indent=1, sort_keys=True), fsync=True)
+
+    def _lock(self, name: str) -> ContextManager[None]:
+        return file_lock(lock_dir(self.directory) / f"{name}.lock")
+
+    def _commit_index(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Merge `entries` into the current index and bump its revision, under the index lock."""
+        with self._lock("index"):
+            index = self._load_index() or {"months": {}}
+            index["months"].update(entries)
+            self._write_index(index["months"], index.get("revision", 0) + 1)
+
+    def load_history(self) -> Dict[str, Dict[str, Any]]:
+        index = self._load_index()
+        if index is None:
+            if not self.history_path.exists():
+                return {}
+            return dict(sorted(_load_legacy_history(self.history_path).items(), key=lambda item: item[0]))
+
+        history: Dict[str, Dict[str, Any]] = {}
+        for month_key in sorted(index["months"]):
+            payload = self._read_segment(month_key, index)
+            if payload is not None:
+                history[month_key] = payload
+        return history
+
+    def load_frame(self) -> HistoryFrame:
+        index = self._load_index()
+        if index is None:
+            return HistoryFrame.from_history(self.load_history())
+
+        frame = HistoryFrame()
+        for month_key in sorted(index["months"]):
+            entry = index["months"][month_key]
+            with open_csv(self.directory / entry["file"]) as csv_file:
+                frame.append_month(month_key, entry["month_label"], entry["generated_at"], _iter_segment_rows(csv_file))
+        return frame
+
+    def months(self) -> List[str]:
+        index = self._load_index()
+        if index is None:
+            return super().months()
+        return sorted(index["months"])
+
+    def load_month(self, month_key: str) -> Optional[Dict[str, Any]]:
+        index = self._load_index()
+        if index is None:
+            return self.load_history().get(month_key)
+        return self._read_segment(month_key, index)
+
+    def _read_segment(self, month_key: str, index: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entry = index["months"].get(month_key)
+        if entry is None:
+            return None
+        history: Dict[str, Dict[str, Any]] = {}
+        with open_csv(self.directory / entry["file"]) as csv_file:
+            _read_rows(csv_file, history)
+        return history.get(
+            month_key,
+            {
+                "month_key": month_key,
+                "month_label": entry["month_label"],
+                "generated_at": entry["generated_at"],
+                "artists": [],
+            },
+        )
+
+    def _migrate_legacy_history(self) -> None:
+        """
+        Split the legacy single-file CSV into month segments, then delete it so the site no longer
+        publishes a stale copy next to them.
+        """
+        with self._lock("index"):
+            if self._load_index() is not None:  # another writer created the index first
+                return
+            months: Dict[str, Dict[str, Any]] = {}
+            if self.history_path.exists():
+                for payload in _load_legacy_history(self.history_path).values():
+                    months[payload["month_key"]] = self._write_segment(payload)
+            self._write_index(months, 0)
+            # Only once the index is durable: until then the legacy file is the history.
+            self.history_path.unlink(missing_ok=True)
+
+    def _write_segment(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        filename = f"{payload['month_key']}.csv"
+        buffer = io.StringIO(newline="")
+        writer = csv.DictWriter(buffer, fieldnames=CSV_HEADERS)
+        writer.writeheader()
+        writer.writerows(_artist_rows(payload))
+        atomic_write_text(self.directory / filename, buffer.getvalue(), fsync=True)
+        return {
+            "file": filename,
+            "month_label": payload["month_label"],
+            "generated_at": payload["generated_at"],
+            "rows": len(payload["artists"]),
+        }
+
+    def save_snapshots(self, payloads: Iterable[Dict[str, Any]]) -> None:
+        payloads = list(payloads)
+        index = self._load_index()
+        if index is None:
+            self._migrate_legacy_history()
+
+        with contextlib.ExitStack() as locks:
+            # Sorted, so two writers saving overlapping months can't deadlock.
+            for month_key in sorted({payload["month_key"] for payload in payloads}):
+                locks.enter_context(self._lock(month_key))
+            # Segments first, index last: a crash in between leaves orphan segments, never a dangling index entry.
+            entries = {payload["month_key"]: self._write_segment(payload) for payload in payloads}
+            self._commit_index(entries)
+
+
+def _upsert_snapshot(backend: HistoryBackend, snapshot: MonthlySnapshot) -> bool:
+    """
+    Save the snapshot unless its month is already stored with exactly the same artists.
+
+    Skipping keeps the stored `generated_at`, so re-running against an unchanged chart leaves both the
+    history and the generated site untouched.
+    """
+    payload = _snapshot_to_payload(snapshot)
+    stored = backend.load_month(snapshot.month_key)
+    if stored is not None and stored["artists"] == payload["artists"]:
+        return False
+    backend.save_snapshot(payload)
+    return True
+
+
+def get_backend(history_path: Path = DEFAULT_HISTORY_PATH, user: str = "") -> HistoryBackend:
+    """
+    Pick the storage backend for `history_path` by file suffix.
+
+    `.db`/`.sqlite`/`.sqlite3` selects the SQLite backend (scoped to `user`), anything else the CSV segments.
+    """
+    history_path = Path(history_path)
+    if history_path.suffix in SQLITE_SUFFIXES:
+        from app.sqlite_storage import SqliteBackend
+
+        return SqliteBackend(history_path, user=user)
+    return CsvSegmentBackend(history_path)
+
+
+def load_history(
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Load every saved month (top 15 artists each) from `backend`, or the backend for `history_path`."""
+    if backend is not None:
+        return backend.load_history()
+    backend = get_backend(history_path)
+    try:
+        return backend.load_history()
+    finally:
+        backend.close()
+
+
+def load_history_frame(
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> HistoryFrame:
+    """Like `load_history`, but returns the compact columnar HistoryFrame."""
+    if backend is not None:
+        return backend.load_frame()
+    backend = get_backend(history_path)
+    try:
+        return backend.load_frame()
+    finally:
+        backend.close()
+
+
+def load_month(
+    month_key: str,
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> Optional[Dict[str, Any]]:
+    """Load a single month's snapshot payload without scanning the rest of the history."""
+    if backend is not None:
+        return backend.load_month(month_key)
+    backend = get_backend(history_path)
+    try:
+        return backend.load_month(month_key)
+    finally:
+        backend.close()
+
+
+def save_data(
+    snapshot: MonthlySnapshot,
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> Dict[str, Dict[str, Any]]:
     """
     Persist the snapshot and return the full listening history.
     Args:
         snapshot: MonthlySnapshot to be saved, the current month's artist data.
-        history_path: Path to the CSV file where history is stored from the previous months.
+        history_path: Path to the history where previous months are stored (CSV segments or SQLite).
+        backend: Explicit storage backend; overrides `history_path`.
     Returns:
         Ordered dict of month_key -> snapshot payload.
     """
-    history = load_history(history_path)
-    history[snapshot.month_key] = _snapshot_to_payload(snapshot)
-    ordered_history = dict(sorted(history.items(), key=lambda item: item[0]))
-    _write_history(ordered_history.values(), history_path)
-    return ordered_history
+    owns_backend = backend is None
+    if backend is None:
+        backend = get_backend(history_path)
+    try:
+        with metrics.span("storage.upsert"):
+            _upsert_snapshot(backend, snapshot)
+        with metrics.span("storage.load"):
+            return backend.load_history()
+    finally:
+        if owns_backend:
+            backend.close()
+
+
+def save_data_frame(
+    snapshot: MonthlySnapshot,
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> HistoryFrame:
+    """Like `save_data`, but returns the full history as a HistoryFrame instead of per-artist dicts."""
+    owns_backend = backend is None
+    if backend is None:
+        backend = get_backend(history_path)
+    try:
+        with metrics.span("storage.upsert"):
+            _upsert_snapshot(backend, snapshot)
+        with metrics.span("storage.load"):
+            return backend.load_frame()
+    finally:
+        if owns_backend:
+            backend.close()
+
+
+def save_snapshots(
+    snapshots: Iterable[MonthlySnapshot],
+    history_path: Path = DEFAULT_HISTORY_PATH,
+    backend: Optional[HistoryBackend] = None,
+) -> None:
+    """Insert or replace many months in a single commit (one index update / one transaction)."""
+    owns_backend = backend is None
+    if backend is None:
+        backend = get_backend(history_path)
+    try:
+        backend.save_snapshots([_snapshot_to_payload(snapshot) for snapshot in snapshots])
+    finally:
+        if owns_backend:
+            backend.close()
+
+
+def _artist_rows(snapshot: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    artists: List[Dict[str, Any]] = sorted(
+        snapshot["artists"],
+        key=lambda artist: (artist.get("rank", 0), -artist.get("playcount", 0)),
+    )
+    for artist in artists:
+        yield {
+            "month_key": snapshot["month_key"],
+            "month_label": snapshot["month_label"],
+            "generated_at": snapshot["generated_at"],
+            "artist_name": artist["name"],
+            "playcount": artist["playcount"],
+            "image_url": artist.get("image_url") or "",
+            "url": artist.get("url") or "",
+            "rank": artist.get("rank", 0),
+        }
 
 
 def _write_history(snapshots: Iterable[Dict[str, Any]], history_path: Path) -> None:
-    _ensure_directory(history_path)
-    with history_path.open("w", newline="", encoding="utf-8") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=CSV_HEADERS)
-        writer.writeheader()
-        for snapshot in sorted(snapshots, key=lambda snap: snap["month_key"]):
-            artists: List[Dict[str, Any]] = sorted(
-                snapshot["artists"],
-                key=lambda artist: (artist.get("rank", 0), -artist.get("playcount", 0)),
-            )
-            for artist in artists:
-                writer.writerow(
-                    {
-                        "month_key": snapshot["month_key"],
-                        "month_label": snapshot["month_label"],
-                        "generated_at": snapshot["generated_at"],
-                        "artist_name": artist["name"],
-                        "playcount": artist["playcount"],
-                        "image_url": artist.get("image_url") or "",
-                        "url": artist.get("url") or "",
-                        "rank": artist.get("rank", 0),
-                    }
-                )
+    """Export snapshots as a single CSV in the legacy layout (one row per artist per month)."""
+    buffer = io.StringIO(newline="")
+    writer = csv.DictWriter(buffer, fieldnames=CSV_HEADERS)
+    writer.writeheader()
+    for snapshot in sorted(snapshots, key=lambda snap: snap["month_key"]):
+        writer.writerows(_artist_rows(snapshot))
+    atomic_write_text(history_path, buffer.getvalue(), fsync=True)
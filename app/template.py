@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import re
+from importlib import resources
+from typing import Any, Iterable, Iterator, List, Mapping, Tuple, Union
+
+# `__NAME__` markers in a template; everything else is copied verbatim.
+PLACEHOLDER = re.compile(r"__([A-Z][A-Z0-9_]*)__")
+CHUNK_SIZE = 64 * 1024
+
+# A placeholder value: a ready string, or an iterable of string chunks produced while rendering.
+Value = Union[str, Iterable[str]]
+
+
+class CompiledTemplate:
+    """
+    A template parsed once into alternating literal and placeholder segments.
+
+    `render_chunks` walks the segments and yields the literals and each value's chunks, re-joined
+    into pieces of about `CHUNK_SIZE` characters, so a page can be streamed to disk without ever
+    holding the whole document (or the whole JSON payload) in memory and without rescanning it.
+    """
+
+    __slots__ = ("segments", "placeholders", "digest")
+
+    def __init__(self, text: str) -> None:
+        self.segments: List[Tuple[bool, str]] = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            if match.start() > position:
+                self.segments.append((False, text[position : match.start()]))
+            self.segments.append((True, match.group(0)))
+            position = match.end()
+        if position < len(text):
+            self.segments.append((False, text[position:]))
+        self.placeholders = frozenset(name for is_placeholder, name in self.segments if is_placeholder)
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def render_chunks(self, values: Mapping[str, Value]) -> Iterator[str]:
+        missing = self.placeholders - values.keys()
+        if missing:
+            raise KeyError(f"No value for template placeholder(s): {', '.join(sorted(missing))}")
+        return _coalesce(self._pieces(values))
+
+    def _pieces(self, values: Mapping[str, Value]) -> Iterator[str]:
+        for is_placeholder, text in self.segments:
+            if not is_placeholder:
+                yield text
+                continue
+            value = values[text]
+            if isinstance(value, str):
+                yield value
+            else:
+                yield from value
+
+    def render(self, values: Mapping[str, Value]) -> str:
+        return "".join(self.render_chunks(values))
+
+    def render_bytes(self, values: Mapping[str, Value], encoding: str = "utf-8") -> Iterator[bytes]:
+        for chunk in self.render_chunks(values):
+            yield chunk.encode(encoding)
+
+
+def _coalesce(pieces: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[str]:
+    buffer: List[str] = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def template_text(name: str, package: str = "app") -> str:
+    return resources.files(package).joinpath(name).read_text(encoding="utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(name: str, package: str = "app") -> CompiledTemplate:
+    """Read and compile a packaged template once per process."""
+    return CompiledTemplate(template_text(name, package))
+
+
+def iter_json(value: Any, **options: Any) -> Iterator[str]:
+    """
+    Stream `json.dumps(value, **options)` as chunks instead of building the whole string.
+
+    Lists are emitted one element at a time, each encoded by the C encoder (`JSONEncoder.iterencode`
+    would fall back to the much slower pure-Python encoder), and objects with string keys one value
+    at a time; the output is byte-for-byte the same.
+    """
+    encoder = json.JSONEncoder(**options)
+    if encoder.indent is not None or encoder.sort_keys:
+        yield encoder.encode(value)
+        return
+    yield from _iter_json(value, encoder)
+
+
+def _iter_json(value: Any, encoder: json.JSONEncoder) -> Iterator[str]:
+    separator = encoder.item_separator
+    if isinstance(value, dict) and all(isinstance(key, str) for key in value):
+        yield "{"
+        for idx, (key, item) in enumerate(value.items()):
+            yield (separator if idx else "") + encoder.encode(key) + encoder.key_separator
+            yield from _iter_json(item, encoder)
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        yield "["
+        for idx, item in enumerate(value):
+            yield encoder.encode(item) if idx == 0 else separator + encoder.encode(item)
+        yield "]"
+    else:
+        yield encoder.encode(value)
+
+
+def iter_json_bytes(value: Any, encoding: str = "utf-8", **options: Any) -> Iterator[bytes]:
+    """`iter_json`, re-joined into `CHUNK_SIZE` pieces and encoded, ready to stream to a file."""
+    for chunk in _coalesce(iter_json(value, **options)):
+        yield chunk.encode(encoding)
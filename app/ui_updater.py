@@ -1,41 +1,171 @@
 from __future__ import annotations
 
+import functools
+import gzip
+import hashlib
 import json
-from importlib import resources
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
-from plotly.colors import qualitative
+from app import metrics
+from app.analytics import ANALYTICS_FILENAME, Analytics, update_analytics
+from app.assets import ensure_asset, gzip_tee, minify_inline_scripts, plotly_asset, prune_asset_versions
+from app.build_manifest import BuildManifest
+from app.colors import COLOR_STATE_FILENAME, ColorAllocator, ColorState, month_fingerprint, palette_fingerprint
+from app.fileio import read_text
+from app.history_frame import HistoryFrame
+from app.palette import PALETTE
+from app.template import CompiledTemplate, Value, iter_json, iter_json_bytes, template_text
 
-Palette = qualitative.Plotly + qualitative.Safe + qualitative.Bold + qualitative.Pastel + qualitative.Antique
+Palette = PALETTE
+
+
+History = Union[HistoryFrame, Mapping[str, Dict[str, Any]]]
+
+TEMPLATE_NAME = "ui_template.html"
+SHARD_DIR = "data"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Bump whenever the generated files change shape, so existing sites are rebuilt.
+BUILD_FORMAT_VERSION = 5
+# Version tag of the dictionary-encoded payload inlined in index.html and written to history.json
+# (version 1 was a plain list of snapshot objects).
+PAYLOAD_VERSION = 2
+# Per-artist fields copied from the analytics index; present on every month except the oldest.
+MOVEMENT_FIELDS = ("rank_change", "playcount_delta", "streak")
+
+
+@dataclass
+class BuildResult:
+    html_path: Path
+    written: List[Path] = field(default_factory=list)
+    removed: List[Path] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.written or self.removed)
 
 
 def _default_palette() -> List[str]:
     return list(Palette or ["#3e7cb1", "#f45d48", "#ffd166", "#6a4c93"])
 
 
-def update_ui(history: Dict[str, Dict[str, Any]], output_dir: Path | str = "site") -> Path:
+def update_ui(
+    history: History,
+    output_dir: Path | str = "site",
+    sharded: bool = False,
+    asset_root: Path | str | None = None,
+) -> Path:
     """
     Build the static Plotly page along with helper assets.
 
     Args:
-        history: Ordered dict of month_key -> snapshot payload.
+        history: HistoryFrame, or ordered dict of month_key -> snapshot payload.
         output_dir: Target directory (published via GitHub Pages).
+        sharded: Write one JSON shard per month plus a manifest instead of inlining every month
+            into index.html; the page then fetches only the month it shows.
+        asset_root: Directory whose `assets/` holds the Plotly bundle, shared by every site under it
+            (defaults to `output_dir`, giving the site its own copy).
+    """
+    return build_site(history, output_dir=output_dir, sharded=sharded, asset_root=asset_root).html_path
+
+
+def build_site(
+    history: History,
+    output_dir: Path | str = "site",
+    sharded: bool = False,
+    asset_root: Path | str | None = None,
+) -> BuildResult:
+    """
+    Same as `update_ui`, but skips work that a previous build already did.
+
+    The inputs (history rows, template, palette, build mode) are fingerprinted and compared with the
+    `.build-manifest.json` of the last build: if nothing changed and the artifacts are intact, nothing
+    is rendered or written. Otherwise only artifacts whose bytes differ are rewritten.
+
+    Returns:
+        BuildResult listing the files that were written or removed (empty when the site was already current).
     """
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
+    html_path = output_path / "index.html"
 
-    seed_colors = _load_existing_colors(output_path / "history.json")
+    frame = history if isinstance(history, HistoryFrame) else HistoryFrame.from_history(history)
+    build = BuildManifest.load(output_path)
+    with metrics.span("ui.assets"):
+        plotly_src = _plotly_src(output_path, asset_root)
+    with metrics.span("ui.check_manifest"):
+        inputs = _build_inputs(frame, sharded, plotly_src)
+        current = build.is_current(inputs)
+    if current:
+        return BuildResult(html_path=html_path)
+
+    # The color ledger checkpoint lets us replay only the months that changed; history.json is the
+    # fallback seed for sites built before the ledger existed.
+    state_path = output_path / COLOR_STATE_FILENAME
+    color_state = ColorState.load(state_path)
+    seed_colors: Dict[str, str] = {}
+    if color_state is None:
+        seed_colors = _load_existing_colors(output_path / "history.json")
+        color_state = ColorState()
+
+    with metrics.span("ui.analytics"):
+        analytics = update_analytics(frame, output_path)
+    with metrics.span("ui.colors"):
+        snapshots = _prepare_snapshots(frame, seed_colors, color_state)
+        _attach_movement(snapshots, analytics)
+    with metrics.span("ui.render"):
+        html_gzip: List[bytes] = []
+        if sharded:
+            manifest = _write_shards(snapshots, output_path, build)
+            build.remove("history.json")  # left by an earlier unsharded build
+            page = _render_html_chunks(encode_payload([]), manifest=manifest, plotly_src=plotly_src)
+        else:
+            payload = encode_payload(snapshots)
+            page = _render_html_chunks(payload, plotly_src=plotly_src)
+            build.write_chunks("history.json", iter_json_bytes(payload, ensure_ascii=False, separators=(",", ":")))
+        build.write_chunks(html_path.name, gzip_tee(page, html_gzip))
+        build.write(f"{html_path.name}.gz", b"".join(html_gzip))
+        build.write(COLOR_STATE_FILENAME, color_state.to_bytes())
+        build.write(ANALYTICS_FILENAME, analytics.to_bytes())
+        build.commit(inputs)
+
+    return BuildResult(html_path=html_path, written=build.written, removed=build.removed)
+
+
+@functools.lru_cache(maxsize=None)
+def _template() -> CompiledTemplate:
+    """The page template with its inline scripts minified, compiled once per process."""
+    return CompiledTemplate(minify_inline_scripts(template_text(TEMPLATE_NAME)))
+
+
+def _plotly_src(output_path: Path, asset_root: Path | str | None) -> str:
+    """
+    Make sure the Plotly bundle is on disk and return its URL relative to the page.
 
-    snapshots = _prepare_snapshots(history, seed_colors)
-    html = _render_html(snapshots)
-    html_path = output_path / "index.html"
-    html_path.write_text(html, encoding="utf-8")
+    The bundle lives outside the build manifest: its name is its content hash, so it is only checked
+    for presence, and only compressed when it actually has to be written. A site with its own assets
+    drops superseded versions; a shared `asset_root` is pruned by whoever builds all of its pages.
+    """
+    asset = plotly_asset()
+    if asset_root is None:
+        target = ensure_asset(output_path, asset)
+        prune_asset_versions(output_path, asset)
+    else:
+        target = ensure_asset(Path(asset_root), asset)
+    return Path(os.path.relpath(target, output_path)).as_posix()
 
-    json_path = output_path / "history.json"
-    json_path.write_text(json.dumps(snapshots, indent=2), encoding="utf-8")
 
-    return html_path
+def _build_inputs(frame: HistoryFrame, sharded: bool, plotly_src: str) -> str:
+    """Fingerprint of everything the generated site depends on."""
+    digest = hashlib.sha256()
+    digest.update(f"format={BUILD_FORMAT_VERSION};sharded={sharded};plotly={plotly_src};".encode("utf-8"))
+    digest.update(palette_fingerprint(_default_palette()).encode("utf-8"))
+    digest.update(bytes.fromhex(_template().digest))
+    digest.update(frame.fingerprint().encode("utf-8"))
+    return digest.hexdigest()
 
 
 def _load_existing_colors(history_json_path: Path) -> Dict[str, str]:
@@ -44,12 +174,12 @@ def _load_existing_colors(history_json_path: Path) -> Dict[str, str]:
         return {}
 
     try:
-        existing = json.loads(history_json_path.read_text(encoding="utf-8"))
+        existing = json.loads(read_text(history_json_path))
     except (json.JSONDecodeError, OSError):
         return {}
 
     colors: Dict[str, str] = {}
-    for snapshot in existing:
+    for snapshot in decode_payload(existing):
         for artist in snapshot.get("artists", []):
             name = artist.get("name")
             color = artist.get("color")
@@ -59,113 +189,251 @@ def _load_existing_colors(history_json_path: Path) -> Dict[str, str]:
 
 
 def _prepare_snapshots(
-    history: Dict[str, Dict[str, Any]],
+    history: History,
     seed_colors: Dict[str, str] | None = None,
+    color_state: Optional[ColorState] = None,
 ) -> List[Dict[str, Any]]:
-    ordered_snapshots = [history[key] for key in sorted(history.keys())]
-    return _attach_consistent_colors(ordered_snapshots, seed_colors or {})
+    frame = history if isinstance(history, HistoryFrame) else HistoryFrame.from_history(history)
+    return _attach_consistent_colors(frame, seed_colors or {}, color_state)
 
 
 def _attach_consistent_colors(
-    snapshots: Iterable[Dict[str, Any]],
+    frame: HistoryFrame,
     seed_colors: Dict[str, str],
+    color_state: Optional[ColorState] = None,
 ) -> List[Dict[str, Any]]:
-    """Attach consistent colors to artists across snapshots."""
-    palette = [color for color in _default_palette()]
-    free_pool: List[str] = []
-    ledger: Dict[str, str] = {name: color for name, color in seed_colors.items() if color}
-    active_colors: Dict[str, str] = {}
-    in_use = set()
-
-    # Remove already-used colors from palette
-    palette = [color for color in palette if color not in ledger.values()]
+    """
+    Attach consistent colors to artists across the frame's months, building the page payload in one pass.
 
+    With a `color_state` from a previous run, months up to its checkpoint reuse their stored colors
+    and only later months are replayed through the allocator; the state is updated in place.
+    """
+    palette = _default_palette()
+    palette_key = palette_fingerprint(palette)
+    names = frame.artist_names
+    month_names = [[names[frame.artist_ids[pos]] for pos in frame.month_range(idx)] for idx in range(len(frame))]
+
+    fingerprints: List[str] = []
+    previous = ""
+    for month_key, current_names in zip(frame.month_keys, month_names):
+        previous = month_fingerprint(previous, month_key, current_names)
+        fingerprints.append(previous)
+
+    reuse_through = -1
+    if color_state is not None and color_state.palette_key == palette_key and color_state.allocator:
+        idx = frame.month_index(color_state.through)
+        if idx is not None and fingerprints[idx] == color_state.fingerprint:
+            reuse_through = idx
+
+    if reuse_through >= 0:
+        allocator = ColorAllocator.from_state(palette, color_state.allocator)
+    else:
+        allocator = ColorAllocator(palette)
+    if color_state is not None:
+        # Months that get replayed prefer the colors they had last time (e.g. re-running the current month).
+        for month_key in frame.month_keys[reuse_through + 1 :]:
+            allocator.seed(color_state.month_colors.get(month_key, {}))
+    allocator.seed(seed_colors)
+
+    checkpoint_idx = len(frame) - 2
+    checkpoint = color_state.allocator if reuse_through >= 0 else None
     decorated_snapshots: List[Dict[str, Any]] = []
+    month_colors: Dict[str, Dict[str, str]] = {}
 
-    for snapshot in snapshots:
-        current_names = [artist["name"] for artist in snapshot["artists"]]
-        current_set = set(current_names)
-
-        # Free colors for artists that just dropped out.
-        for artist_name in list(active_colors.keys()):
-            if artist_name not in current_set:
-                color = active_colors.pop(artist_name)
-                in_use.discard(color)
-                free_pool.append(color)
-                ledger.pop(artist_name, None)
+    for month_idx, month_key in enumerate(frame.month_keys):
+        if month_idx <= reuse_through:
+            colors = color_state.month_colors[month_key]
+        else:
+            colors = allocator.assign_month(month_names[month_idx])
+            if month_idx == checkpoint_idx:
+                checkpoint = allocator.to_state()
+        month_colors[month_key] = colors
 
         artists = []
-        for artist_payload in snapshot["artists"]:
-            name = artist_payload["name"]
-            if name not in active_colors:
-                color = _assign_color(
-                    artist_name=name,
-                    ledger=ledger,
-                    free_pool=free_pool,
-                    palette=palette,
-                    in_use=in_use,
-                )
-                active_colors[name] = color
-                ledger[name] = color
-                in_use.add(color)
-
+        for pos in frame.month_range(month_idx):
+            artist_id = frame.artist_ids[pos]
+            name = names[artist_id]
             artists.append(
                 {
                     "name": name,
-                    "playcount": int(artist_payload["playcount"]),
-                    "image_url": artist_payload.get("image_url"),
-                    "url": artist_payload.get("url"),
-                    "rank": artist_payload.get("rank"),
-                    "color": active_colors[name],
+                    "playcount": frame.playcounts[pos],
+                    "image_url": frame.artist_image_urls[artist_id],
+                    "url": frame.artist_urls[artist_id],
+                    "rank": frame.ranks[pos],
+                    "color": colors[name],
                 }
             )
 
         decorated_snapshots.append(
             {
-                "month_key": snapshot["month_key"],
-                "month_label": snapshot["month_label"],
-                "generated_at": snapshot["generated_at"],
+                "month_key": month_key,
+                "month_label": frame.month_labels[month_idx],
+                "generated_at": frame.generated_at[month_idx],
                 "artists": artists,
             }
         )
 
+    if color_state is not None:
+        through_idx = max(checkpoint_idx, reuse_through) if checkpoint is not None else -1
+        color_state.palette_key = palette_key
+        color_state.through = frame.month_keys[through_idx] if through_idx >= 0 else None
+        color_state.fingerprint = fingerprints[through_idx] if through_idx >= 0 else ""
+        color_state.allocator = checkpoint if through_idx >= 0 else None
+        color_state.month_colors = month_colors
+
     return decorated_snapshots
 
 
-def _assign_color(
-    artist_name: str,
-    ledger: Dict[str, str],
-    free_pool: List[str],
-    palette: List[str],
-    in_use: set,
-) -> str:
-    preferred = ledger.get(artist_name)
-    if preferred and preferred not in in_use:
-        if preferred in free_pool:
-            free_pool.remove(preferred)
-        elif preferred in palette:
-            palette.remove(preferred)
-        return preferred
-
-    if free_pool:
-        idx = abs(hash(artist_name)) % len(free_pool)
-        return free_pool.pop(idx)
-
-    if not palette:
-        palette.extend([color for color in _default_palette() if color not in in_use])
-        if not palette:
-            palette.extend(_default_palette())
-
-    return palette.pop(0)
-
-
-def _render_html(snapshots: List[Dict[str, Any]]) -> str:
-    template_path = resources.files("app").joinpath("ui_template.html")
-    template_text = template_path.read_text(encoding="utf-8")
-    replacements = {
-        "__SNAPSHOTS_JSON__": json.dumps(snapshots, ensure_ascii=False),
-        "__HAS_DATA__": "true" if snapshots else "false",
+def _attach_movement(snapshots: List[Dict[str, Any]], analytics: Analytics) -> None:
+    """Copy each artist's rank change, playcount delta and streak (plus the month's drop-outs) into the payload."""
+    # The oldest month has nothing to move relative to, so it is left undecorated.
+    for snapshot in snapshots[1:]:
+        trends = analytics.months.get(snapshot["month_key"])
+        if trends is None:
+            continue
+        for idx, artist in enumerate(snapshot["artists"]):
+            artist["rank_change"] = trends["rank_change"][idx]
+            artist["playcount_delta"] = trends["playcount_delta"][idx]
+            artist["streak"] = trends["streak"][idx]
+        snapshot["dropouts"] = trends["dropouts"]
+
+
+def encode_payload(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Dictionary-encode page snapshots for the wire.
+
+    Every distinct (name, url, color) triple is stored once in column arrays under `artists`; each
+    month then only carries parallel arrays of artist ids, ranks and playcounts (plus the movement
+    columns when present). `image_url` is not shipped: the page never shows it.
+    """
+    ids: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+    names: List[str] = []
+    urls: List[Optional[str]] = []
+    colors: List[Optional[str]] = []
+    months = []
+    for snapshot in snapshots:
+        artists = snapshot["artists"]
+        artist_ids = []
+        for artist in artists:
+            key = (artist["name"], artist.get("url"), artist.get("color"))
+            artist_id = ids.get(key)
+            if artist_id is None:
+                artist_id = ids[key] = len(names)
+                names.append(key[0])
+                urls.append(key[1])
+                colors.append(key[2])
+            artist_ids.append(artist_id)
+
+        month: Dict[str, Any] = {
+            "month_key": snapshot["month_key"],
+            "month_label": snapshot["month_label"],
+            "generated_at": snapshot["generated_at"],
+            "artist": artist_ids,
+            "rank": [artist.get("rank") for artist in artists],
+            "playcount": [artist["playcount"] for artist in artists],
+        }
+        if artists and MOVEMENT_FIELDS[0] in artists[0]:
+            for name in MOVEMENT_FIELDS:
+                month[name] = [artist[name] for artist in artists]
+        if "dropouts" in snapshot:
+            month["dropouts"] = snapshot["dropouts"]
+        months.append(month)
+
+    return {"version": PAYLOAD_VERSION, "artists": {"name": names, "url": urls, "color": colors}, "months": months}
+
+
+def decode_payload(payload: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Inverse of `encode_payload` (without `image_url`); version 1 payloads are returned unchanged."""
+    if isinstance(payload, list):
+        return payload
+    if payload.get("version") != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported payload version: {payload.get('version')!r}")
+    dictionary = payload["artists"]
+    names, urls, colors = dictionary["name"], dictionary["url"], dictionary["color"]
+    snapshots = []
+    for month in payload["months"]:
+        movement = [name for name in MOVEMENT_FIELDS if name in month]
+        artists = []
+        for idx, artist_id in enumerate(month["artist"]):
+            artist = {
+                "name": names[artist_id],
+                "playcount": month["playcount"][idx],
+                "url": urls[artist_id],
+                "rank": month["rank"][idx],
+                "color": colors[artist_id],
+            }
+            for name in movement:
+                artist[name] = month[name][idx]
+            artists.append(artist)
+        snapshot = {key: month[key] for key in ("month_key", "month_label", "generated_at")}
+        snapshot["artists"] = artists
+        if "dropouts" in month:
+            snapshot["dropouts"] = month["dropouts"]
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def _write_shards(snapshots: List[Dict[str, Any]], output_path: Path, build: BuildManifest) -> Dict[str, Any]:
+    """
+    Write one compact, content-hashed JSON file (plus a `.gz` twin) per month and the manifest listing them.
+
+    Shard names embed the content hash, so unchanged months keep their URL (and browser cache) across
+    builds; shards no longer referenced by the manifest are removed.
+    """
+    shard_root = output_path / SHARD_DIR
+    months_dir = shard_root / "months"
+    months_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = []
+    keep = set()
+    for snapshot in snapshots:
+        body = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        filename = f"{snapshot['month_key']}.{digest[:12]}.json"
+        relpath = f"{SHARD_DIR}/months/{filename}"
+        build.write(relpath, body)
+        build.write(f"{relpath}.gz", gzip.compress(body, mtime=0))  # mtime=0 keeps the bytes reproducible
+        keep.update({filename, filename + ".gz"})
+        entries.append(
+            {
+                "month_key": snapshot["month_key"],
+                "month_label": snapshot["month_label"],
+                "url": relpath,
+                "hash": f"sha256-{digest}",
+                "bytes": len(body),
+            }
+        )
+
+    for stale in months_dir.iterdir():
+        if stale.name not in keep and not stale.name.startswith("."):
+            stale.unlink()
+
+    manifest = {"version": MANIFEST_VERSION, "months": entries}
+    build.write(
+        f"{SHARD_DIR}/{MANIFEST_FILENAME}",
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    )
+    return manifest
+
+
+def _template_values(
+    payload: Dict[str, Any], manifest: Optional[Dict[str, Any]], plotly_src: Optional[str] = None
+) -> Dict[str, Value]:
+    has_data = bool(manifest["months"]) if manifest is not None else bool(payload["months"])
+    return {
+        "__PLOTLY_SRC__": plotly_src or plotly_asset().relpath,
+        "__PAYLOAD_JSON__": iter_json(payload, ensure_ascii=False, separators=(",", ":")),
+        "__MANIFEST_JSON__": json.dumps(manifest, ensure_ascii=False) if manifest is not None else "null",
+        "__HAS_DATA__": "true" if has_data else "false",
     }
-    for placeholder, value in replacements.items():
-        template_text = template_text.replace(placeholder, value)
-    return template_text
+
+
+def _render_html(snapshots: List[Dict[str, Any]], manifest: Optional[Dict[str, Any]] = None) -> str:
+    return _template().render(_template_values(encode_payload(snapshots), manifest))
+
+
+def _render_html_chunks(
+    payload: Dict[str, Any], manifest: Optional[Dict[str, Any]] = None, plotly_src: Optional[str] = None
+) -> Iterator[bytes]:
+    """The page for an encoded payload as UTF-8 chunks, streamed from the compiled template."""
+    return _template().render_bytes(_template_values(payload, manifest, plotly_src))
@@ -0,0 +1,237 @@
+"""
+Benchmark the storage, colour and rendering stages on synthetic histories.
+
+    python -m benchmarks.run --scale small medium --output results.json
+    python -m benchmarks.run --scale medium --compare benchmarks/baseline.json
+
+Each benchmark runs once per synthetic user: setup is untimed, the measured call is repeated and
+the best wall time kept, and one extra call runs under `tracemalloc` for the peak allocation.
+`seconds` is the sum of the per-user best times, so scales with more users measure throughput.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.data_processor import ArtistStat, MonthlySnapshot, process_data
+from app.history_frame import HistoryFrame
+from app.storage import CsvSegmentBackend, _write_history, load_history, save_data
+from app.ui_updater import _attach_consistent_colors, _prepare_snapshots, _render_html
+from benchmarks.synthetic import generate_users, lastfm_payload
+
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD = 0.25
+# Timing differences below this many seconds are noise, whatever the ratio.
+NOISE_FLOOR_SECONDS = 0.002
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    months: int
+    artists: int
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale(users=1, months=24, artists=15),
+    "medium": Scale(users=10, months=120, artists=50),
+    "large": Scale(users=100, months=240, artists=50),
+    # 20 years x 10k users x 50 artists; takes a while.
+    "full": Scale(users=10_000, months=240, artists=50),
+}
+
+# A benchmark gets one user's history and a scratch directory and returns the call to measure.
+Setup = Callable[[Dict[str, Dict[str, Any]], Path], Callable[[], object]]
+
+
+def _write_segments(history: Dict[str, Dict[str, Any]], workdir: Path) -> Path:
+    history_path = workdir / "listening_history.csv"
+    CsvSegmentBackend(history_path).save_snapshots(history.values())
+    return history_path
+
+
+def _setup_load_history(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    history_path = _write_segments(history, workdir)
+    return lambda: load_history(history_path)
+
+
+def _setup_save_data(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    history_path = _write_segments(history, workdir)
+    newest = history[max(history)]
+    bump = itertools.count(1)
+
+    def call() -> object:
+        # A different playcount every call, so each save really rewrites the newest month.
+        extra = next(bump)
+        snapshot = MonthlySnapshot(
+            month_key=newest["month_key"],
+            month_label=newest["month_label"],
+            generated_at=newest["generated_at"],
+            artists=[
+                ArtistStat(a["name"], a["playcount"] + extra, None, a["url"], a["rank"]) for a in newest["artists"]
+            ],
+        )
+        return save_data(snapshot, history_path)
+
+    return call
+
+
+def _setup_write_history(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    return lambda: _write_history(history.values(), workdir / "export.csv")
+
+
+def _setup_attach_colors(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    frame = HistoryFrame.from_history(history)
+    return lambda: _attach_consistent_colors(frame, {}, None)
+
+
+def _setup_render_html(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    snapshots = _prepare_snapshots(HistoryFrame.from_history(history))
+    return lambda: _render_html(snapshots)
+
+
+def _setup_process_data(history: Dict[str, Dict[str, Any]], workdir: Path) -> Callable[[], object]:
+    payload = lastfm_payload(artists=1000)
+    run_timestamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return lambda: process_data(payload, run_timestamp)
+
+
+BENCHMARKS: Dict[str, Setup] = {
+    "load_history": _setup_load_history,
+    "save_data": _setup_save_data,
+    "_write_history": _setup_write_history,
+    "_attach_consistent_colors": _setup_attach_colors,
+    "_render_html": _setup_render_html,
+    "process_data": _setup_process_data,
+}
+
+
+def _measure(call: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmark(name: str, scale_name: str, scale: Scale, repeat: int = 3) -> Dict[str, Any]:
+    setup = BENCHMARKS[name]
+    seconds = 0.0
+    peak_bytes = 0
+    for _, history in generate_users(scale.users, scale.months, scale.artists):
+        with tempfile.TemporaryDirectory(prefix="musichabits-bench-") as workdir:
+            best, peak = _measure(setup(history, Path(workdir)), repeat)
+        seconds += best
+        peak_bytes = max(peak_bytes, peak)
+    return {
+        "bench": name,
+        "scale": scale_name,
+        "users": scale.users,
+        "months": scale.months,
+        "artists": scale.artists,
+        "seconds": seconds,
+        "per_user_seconds": seconds / scale.users,
+        "peak_bytes": peak_bytes,
+    }
+
+
+def run_suite(
+    scales: List[str],
+    benches: Optional[List[str]] = None,
+    repeat: int = 3,
+    scale_table: Optional[Dict[str, Scale]] = None,
+) -> Dict[str, Any]:
+    scale_table = scale_table or SCALES
+    results: Dict[str, Dict[str, Any]] = {}
+    for scale_name in scales:
+        for name in benches or list(BENCHMARKS):
+            results[f"{name}@{scale_name}"] = run_benchmark(name, scale_name, scale_table[scale_name], repeat)
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.now(tz=timezone.utc).isoformat(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Names of benchmarks whose time or peak memory grew by more than `threshold` (0.25 = 25%)."""
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric == "seconds" and result[metric] - reference[metric] < NOISE_FLOOR_SECONDS:
+                continue
+            if reference[metric] and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}")
+    return regressions
+
+
+def format_results(current: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    lines = [f"{'benchmark':<40} {'seconds':>10} {'peak KiB':>10} {'vs base':>8}"]
+    for key, result in current["results"].items():
+        ratio = ""
+        reference = (baseline or {}).get("results", {}).get(key)
+        if reference and reference["seconds"]:
+            ratio = f"{result['seconds'] / reference['seconds']:.2f}x"
+        lines.append(f"{key:<40} {result['seconds']:>10.4f} {result['peak_bytes'] / 1024:>10.0f} {ratio:>8}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["small"], help="Scales to run.")
+    parser.add_argument("--bench", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per user; the best one counts.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Relative slow-down (or memory growth) that counts as a regression.",
+    )
+    args = parser.parse_args(argv)
+
+    current = run_suite(args.scale, args.bench, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2), encoding="utf-8")
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    print(format_results(current, baseline))
+    if baseline is None:
+        return 0
+    regressions = compare(current, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
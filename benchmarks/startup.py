@@ -0,0 +1,84 @@
+"""
+Measure how long a fresh interpreter takes to import the CLI, and enforce a budget.
+
+    python -m benchmarks.startup --budget-ms 150
+
+Each sample runs `python -X importtime -c "import app.main"` in a new process and reads the
+cumulative import time of the module; the median over `--runs` samples is compared with the
+budget. The run also fails if a module that the entry point must load lazily (plotly, requests,
+the UI builder) was imported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MODULE = "app.main"
+DEFAULT_BUDGET_MS = 150.0
+# Never needed just to start the CLI; each is imported by the command that uses it.
+FORBIDDEN_MODULES = ("plotly", "requests", "app.api_client", "app.ui_updater")
+
+
+def _sample(module: str) -> Dict[str, Any]:
+    code = f"import {module}, sys; print(' '.join(sorted(sys.modules)))"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.removeprefix("import time:").split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"No import time reported for {module}.")
+    return {"ms": cumulative_us / 1000, "modules": completed.stdout.split()}
+
+
+def measure_startup(module: str = DEFAULT_MODULE, runs: int = 5) -> Dict[str, Any]:
+    samples = [_sample(module) for _ in range(runs)]
+    loaded = set(samples[-1]["modules"])
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": statistics.median(sample["ms"] for sample in samples),
+        "min_ms": min(sample["ms"] for sample in samples),
+        "forbidden_loaded": [name for name in FORBIDDEN_MODULES if name in loaded],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default=DEFAULT_MODULE, help="Module whose import is measured.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to sample.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Allowed median import time.")
+    parser.add_argument("--output", help="Write the measurement as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    result = measure_startup(args.module, args.runs)
+    result["budget_ms"] = args.budget_ms
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=2)
+    print(f"import {result['module']}: median {result['median_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if result["median_ms"] > args.budget_ms:
+        print("OVER BUDGET")
+        failed = True
+    for name in result["forbidden_loaded"]:
+        print(f"IMPORTED AT STARTUP: {name}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
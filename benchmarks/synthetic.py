@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+GENERATED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc).isoformat()
+
+
+def month_keys(months: int, end_year: int = 2025, end_month: int = 1) -> List[Tuple[str, str]]:
+    """`months` consecutive (month_key, month_label) pairs ending at `end_year-end_month`."""
+    keys = []
+    year, month = end_year, end_month
+    for _ in range(months):
+        start = datetime(year, month, 1)
+        keys.append((start.strftime("%Y-%m"), start.strftime("%B %Y")))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys[::-1]
+
+
+def generate_history(
+    months: int = 240,
+    artists_per_month: int = 50,
+    pool_size: int = 2000,
+    churn: float = 0.2,
+    seed: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    A synthetic `month_key -> snapshot payload` history shaped like `load_history`'s output.
+
+    Each month keeps about `1 - churn` of the previous month's artists and replaces the rest with
+    draws from a Zipf-like popularity distribution over `pool_size` artists, so charts show the
+    long runs and occasional returns a real listener has. Playcounts are log-normal and sorted.
+    """
+    rng = random.Random(seed)
+    names = [f"Artist {idx:05d}" for idx in range(pool_size)]
+    weights = [1.0 / (idx + 1) for idx in range(pool_size)]
+    lineup: List[str] = []
+    history: Dict[str, Dict[str, Any]] = {}
+    for month_key, month_label in month_keys(months):
+        kept = [name for name in lineup if rng.random() >= churn]
+        chosen = dict.fromkeys(kept)
+        while len(chosen) < min(artists_per_month, pool_size):
+            chosen.setdefault(rng.choices(names, weights)[0])
+        lineup = list(chosen)
+        rng.shuffle(lineup)
+        playcounts = sorted((int(rng.lognormvariate(3.5, 0.8)) + 1 for _ in lineup), reverse=True)
+        history[month_key] = {
+            "month_key": month_key,
+            "month_label": month_label,
+            "generated_at": GENERATED_AT,
+            "artists": [
+                {
+                    "name": name,
+                    "playcount": playcount,
+                    "image_url": None,
+                    "url": f"https://www.last.fm/music/{name.replace(' ', '+')}",
+                    "rank": rank,
+                }
+                for rank, (name, playcount) in enumerate(zip(lineup, playcounts), start=1)
+            ],
+        }
+    return history
+
+
+def generate_users(
+    users: int,
+    months: int = 240,
+    artists_per_month: int = 50,
+    pool_size: int = 2000,
+    churn: float = 0.2,
+    seed: int = 0,
+) -> Iterator[Tuple[str, Dict[str, Dict[str, Any]]]]:
+    """Yield `(user, history)` one user at a time, so 10k-user runs never hold every history at once."""
+    for idx in range(users):
+        yield f"user{idx:05d}", generate_history(months, artists_per_month, pool_size, churn, seed + idx)
+
+
+def lastfm_payload(artists: int = 1000, seed: int = 0) -> Dict[str, Any]:
+    """A `user.gettopartists` response with `artists` entries, as `fetch_top_artists` returns it."""
+    rng = random.Random(seed)
+    playcounts = sorted((int(rng.lognormvariate(3.5, 1.0)) + 1 for _ in range(artists)), reverse=True)
+    return {
+        "topartists": {
+            "artist": [
+                {
+                    "name": f"Artist {idx:05d}",
+                    "playcount": str(playcount),
+                    "url": f"https://www.last.fm/music/Artist+{idx:05d}",
+                    "@attr": {"rank": str(idx + 1)},
+                }
+                for idx, playcount in enumerate(playcounts)
+            ],
+            "@attr": {"user": "bench", "page": "1", "perPage": str(artists), "totalPages": "1"},
+        }
+    }
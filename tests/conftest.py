@@ -0,0 +1,14 @@
+from app.data_processor import ArtistStat, MonthlySnapshot
+
+
+def make_snapshot(month: str, artists: dict[str, int]) -> MonthlySnapshot:
+    """A month's snapshot with the given artist playcounts, ranked in insertion order."""
+    return MonthlySnapshot(
+        month_key=month,
+        month_label=month,
+        generated_at=f"{month}-28T04:00:00+00:00",
+        artists=[
+            ArtistStat(name=name, playcount=playcount, image_url=None, url=f"https://example.com/{name}", rank=rank)
+            for rank, (name, playcount) in enumerate(artists.items(), start=1)
+        ],
+    )
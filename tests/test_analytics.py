@@ -0,0 +1,47 @@
+from typing import List, Tuple
+
+from app.analytics import Analytics, compute_analytics
+from app.history_frame import HistoryFrame
+
+
+def _frame(months: List[Tuple[str, List[Tuple[str, int]]]]) -> HistoryFrame:
+    frame = HistoryFrame()
+    for month_key, artists in months:
+        rows = [(name, playcount, None, None, rank) for rank, (name, playcount) in enumerate(artists, start=1)]
+        frame.upsert_month(month_key, month_key, "2024-01-01T00:00:00+00:00", rows)
+    return frame
+
+
+MONTHS = [
+    ("2024-01", [("A", 30), ("B", 20)]),
+    ("2024-02", [("B", 40), ("A", 25), ("C", 5)]),
+    ("2024-03", [("A", 50), ("C", 10)]),
+]
+
+
+def test_movement_streaks_and_lifetime_totals() -> None:
+    analytics = compute_analytics(_frame(MONTHS))
+
+    february = analytics.months["2024-02"]
+    assert february["rank_change"] == [1, -1, None]
+    assert february["playcount_delta"] == [20, -5, None]
+    assert february["streak"] == [2, 2, 1]
+    assert february["new"] == ["C"]
+    assert analytics.months["2024-03"]["dropouts"] == ["B"]
+    lifetime = analytics.lifetime
+    assert lifetime["name"] == ["A", "B", "C"]
+    assert lifetime["playcount"] == [105, 60, 15]
+    assert lifetime["best_rank"] == [1, 1, 2]
+    assert lifetime["streak"] == [3, 0, 2]
+    assert lifetime["first_month"][2] == "2024-02"
+
+
+def test_incremental_update_matches_full_recompute() -> None:
+    previous = Analytics.from_bytes(compute_analytics(_frame(MONTHS)).to_bytes())
+    assert previous.through == "2024-02"
+
+    updated = MONTHS[:2] + [("2024-03", [("C", 60), ("A", 55), ("D", 1)])]
+    incremental = compute_analytics(_frame(updated), previous)
+
+    assert incremental.to_bytes() == compute_analytics(_frame(updated)).to_bytes()
+    assert incremental.months["2024-01"] is previous.months["2024-01"]  # reused, not recomputed
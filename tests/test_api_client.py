@@ -0,0 +1,108 @@
+from typing import Any, Dict, List
+
+import pytest
+
+import app.api_client
+from app.api_client import LastFmClient, LastFmError
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, payload: Dict[str, Any]) -> None:
+        self.status_code = status_code
+        self.headers: Dict[str, str] = {}
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+
+class _FakeSession:
+    def __init__(self, responses: List[_FakeResponse]) -> None:
+        self.responses = list(responses)
+        self.calls: List[Dict[str, Any]] = []
+
+    def get(self, url: str, params: Dict[str, Any], timeout: float) -> _FakeResponse:
+        self.calls.append(params)
+        return self.responses.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app.api_client.time, "sleep", lambda _: None)
+
+
+def test_client_retries_rate_limit_and_server_errors() -> None:
+    ok = {"topartists": {"artist": []}}
+    session = _FakeSession(
+        [
+            _FakeResponse(200, {"error": 29, "message": "Rate limit exceeded"}),
+            _FakeResponse(503, {}),
+            _FakeResponse(200, ok),
+        ]
+    )
+    client = LastFmClient("key", rate_limit=0, session=session)
+
+    assert client.top_artists("alice", limit=5) == ok
+    assert len(session.calls) == 3
+    assert session.calls[0]["method"] == "user.gettopartists"
+    assert session.calls[0]["api_key"] == "key"
+
+
+def test_client_raises_non_retryable_errors_immediately() -> None:
+    session = _FakeSession([_FakeResponse(200, {"error": 6, "message": "User not found"})])
+    client = LastFmClient("key", rate_limit=0, session=session)
+
+    with pytest.raises(LastFmError, match="User not found"):
+        client.top_artists("ghost")
+    assert len(session.calls) == 1
+
+
+def test_client_gives_up_after_max_retries() -> None:
+    session = _FakeSession([_FakeResponse(502, {}) for _ in range(3)])
+    client = LastFmClient("key", rate_limit=0, max_retries=2, session=session)
+
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        client.top_artists("alice")
+
+
+class _PagedClient(LastFmClient):
+    def __init__(self, total_pages: int, page_size: int) -> None:
+        super().__init__("key", rate_limit=0, session=_FakeSession([]))
+        self.total_pages = total_pages
+        self.page_size = page_size
+        self.requested: List[int] = []
+
+    def top_artists(
+        self, user: str, period: str = "1month", limit: int = 15, page: int = 1, refresh: bool = False
+    ) -> dict:
+        self.requested.append(page)
+        start = (page - 1) * self.page_size
+        artists = [{"name": f"Artist {start + idx + 1}"} for idx in range(self.page_size)]
+        return {"topartists": {"artist": artists, "@attr": {"page": str(page), "totalPages": str(self.total_pages)}}}
+
+
+def test_iter_top_artists_streams_every_page_in_order() -> None:
+    client = _PagedClient(total_pages=5, page_size=3)
+
+    names = [artist["name"] for artist in client.iter_top_artists("alice", page_size=3, concurrency=2)]
+
+    assert names == [f"Artist {idx}" for idx in range(1, 16)]
+    assert sorted(client.requested) == [1, 2, 3, 4, 5]
+
+
+def test_iter_top_artists_only_prefetches_up_to_concurrency() -> None:
+    client = _PagedClient(total_pages=50, page_size=2)
+    stream = client.iter_top_artists("alice", page_size=2, concurrency=3)
+
+    for _ in range(4):  # consume pages 1 and 2
+        next(stream)
+    stream.close()
+
+    assert max(client.requested) <= 2 + 3
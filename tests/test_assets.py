@@ -0,0 +1,113 @@
+import gzip
+import re
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import app.assets
+from app.assets import minify_js, plotly_asset, plotly_bundle_path
+from app.ui_updater import build_site, update_ui
+
+
+def test_minify_js_strips_comments_but_not_strings() -> None:
+    source = """
+        // leading comment
+        const url = "https://example.com"; /* block */
+        const label = `a // b ${x}`;  // trailing
+        const quote = 'it\\'s';
+    """
+    assert (
+        minify_js(source)
+        == "const url = \"https://example.com\";\nconst label = `a // b ${x}`;\nconst quote = 'it\\'s';"
+    )
+
+
+def test_site_ships_fingerprinted_plotly_bundle(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, request: pytest.FixtureRequest
+) -> None:
+    """The page loads a self-hosted, content-hashed bundle; a new bundle replaces the old one."""
+    history = {
+        "2024-01": {
+            "month_key": "2024-01",
+            "month_label": "January 2024",
+            "generated_at": "2024-01-15T12:00:00+00:00",
+            "artists": [{"name": "Artist", "playcount": 3, "image_url": None, "url": None, "rank": 1}],
+        }
+    }
+    bundle = tmp_path / "plotly-basic.min.js"
+    bundle.write_text("window.Plotly={react(){}};", encoding="utf-8")
+    monkeypatch.setattr(app.assets, "PLOTLY_JS_PATH", str(bundle))
+    plotly_asset.cache_clear()
+    request.addfinalizer(plotly_asset.cache_clear)
+    site = tmp_path / "site"
+
+    html = update_ui(history, output_dir=site).read_text(encoding="utf-8")
+    first = site / plotly_asset().relpath
+    assert f'<script src="{plotly_asset().relpath}"></script>' in html
+    assert "cdn.plot.ly" not in html
+    assert gzip.decompress(first.with_name(first.name + ".gz").read_bytes()) == bundle.read_bytes()
+    assert gzip.decompress((site / "index.html.gz").read_bytes()) == (site / "index.html").read_bytes()
+
+    bundle.write_text("window.Plotly={react(){},newPlot(){}};", encoding="utf-8")
+    plotly_asset.cache_clear()
+    update_ui(history, output_dir=site)
+
+    assert not first.exists()
+    assert len(list((site / "assets").glob("plotly.*.min.js"))) == 1
+
+
+def test_rendered_page_uses_plotly_v3_title_objects(tmp_path: Path) -> None:
+    """plotly.js v3 dropped string-valued axis titles; the bundled v4 would silently show none."""
+    history = {
+        "2024-01": {
+            "month_key": "2024-01",
+            "month_label": "January 2024",
+            "generated_at": "2024-01-15T12:00:00+00:00",
+            "artists": [{"name": "Artist", "playcount": 3, "image_url": None, "url": None, "rank": 1}],
+        }
+    }
+    html = update_ui(history, output_dir=tmp_path / "site").read_text(encoding="utf-8")
+
+    assert 'title: { text: "Playcount" }' in html
+    assert not re.search(r"\btitle:\s*[\"'`]", html)
+
+
+def test_unchanged_rebuild_does_not_recompress_bundle(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, request: pytest.FixtureRequest
+) -> None:
+    history = {
+        "2024-01": {
+            "month_key": "2024-01",
+            "month_label": "January 2024",
+            "generated_at": "2024-01-15T12:00:00+00:00",
+            "artists": [{"name": "Artist", "playcount": 3, "image_url": None, "url": None, "rank": 1}],
+        }
+    }
+    bundle = tmp_path / "plotly.min.js"
+    bundle.write_text("window.Plotly={react(){}};", encoding="utf-8")
+    monkeypatch.setattr(app.assets, "PLOTLY_JS_PATH", str(bundle))
+    plotly_asset.cache_clear()
+    request.addfinalizer(plotly_asset.cache_clear)
+    compressed: List[int] = []
+    original = app.assets.compress_variants
+    monkeypatch.setattr(app.assets, "compress_variants", lambda data: compressed.append(len(data)) or original(data))
+    site = tmp_path / "site"
+
+    build_site(history, output_dir=site)
+    assert len(compressed) == 1
+
+    plotly_asset.cache_clear()  # a fresh process: nothing cached in memory
+    assert not build_site(history, output_dir=site).changed
+    assert len(compressed) == 1
+
+
+def test_vendored_basic_bundle_is_the_default(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    vendored = tmp_path / "plotly-basic.min.js"
+    monkeypatch.setattr(app.assets, "PLOTLY_JS_PATH", None)
+    monkeypatch.setattr(app.assets, "PLOTLY_BASIC_JS", vendored)
+
+    with pytest.warns(UserWarning, match="full plotly.js bundle"):
+        assert plotly_bundle_path().name == "plotly.min.js"
+    vendored.write_text("window.Plotly={};", encoding="utf-8")
+    assert plotly_bundle_path() == vendored
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.api_client import LastFmClient
+from app.backfill import backfill_history, week_month
+from app.storage import CsvSegmentBackend, load_history
+
+
+def _ts(year: int, month: int, day: int) -> int:
+    return int(datetime(year, month, day, tzinfo=timezone.utc).timestamp())
+
+
+class _WeeklyClient(LastFmClient):
+    def __init__(self, charts: Dict[int, List[Dict[str, Any]]], week: int = 7 * 86400) -> None:
+        super().__init__("key", rate_limit=0)
+        self.charts = charts
+        self.week = week
+        self.fetched: List[int] = []
+        self.refreshed: List[bool] = []
+
+    def weekly_chart_list(self, user: str, refresh: bool = False) -> List[Dict[str, str]]:
+        self.refreshed.append(refresh)
+        return [{"from": str(start), "to": str(start + self.week)} for start in sorted(self.charts)]
+
+    def weekly_artist_chart(self, user: str, from_ts: int, to_ts: int, refresh: bool = False) -> List[Dict[str, Any]]:
+        self.fetched.append(from_ts)
+        self.refreshed.append(refresh)
+        return self.charts[from_ts]
+
+
+class _CountingBackend(CsvSegmentBackend):
+    def __init__(self, history_path: Path) -> None:
+        super().__init__(history_path)
+        self.save_calls = 0
+
+    def save_snapshots(self, payloads: Any) -> None:
+        self.save_calls += 1
+        super().save_snapshots(payloads)
+
+
+def test_week_month_uses_the_midpoint() -> None:
+    # Jan 29 - Feb 5: midpoint Feb 1 -> February.
+    assert week_month(_ts(2024, 1, 29), _ts(2024, 2, 5)).strftime("%Y-%m") == "2024-02"
+    assert week_month(_ts(2024, 1, 25), _ts(2024, 2, 1)).strftime("%Y-%m") == "2024-01"
+
+
+def test_backfill_merges_weeks_into_months_with_one_write(tmp_path: Path) -> None:
+    history_path = tmp_path / "listening_history.csv"
+    client = _WeeklyClient(
+        {
+            _ts(2024, 1, 1): [
+                {"name": "A", "playcount": "5", "url": "https://last.fm/A"},
+                {"name": "B", "playcount": "9"},
+            ],
+            _ts(2024, 1, 8): [{"name": "A", "playcount": "6"}],
+            _ts(2024, 2, 5): [{"name": "C", "playcount": "1"}],
+            _ts(2024, 3, 4): [{"name": "D", "playcount": "2"}],
+        }
+    )
+    backend = _CountingBackend(history_path)
+    backend.save_snapshots([{"month_key": "2024-03", "month_label": "March 2024", "generated_at": "x", "artists": []}])
+    backend.save_calls = 0
+
+    run = datetime(2024, 6, 15, tzinfo=timezone.utc)
+    snapshots = backfill_history(client, "alice", backend=backend, max_workers=3, run_timestamp=run, refresh=True)
+
+    assert [snapshot.month_key for snapshot in snapshots] == ["2024-01", "2024-02"]
+    assert backend.save_calls == 1
+    assert _ts(2024, 3, 4) not in client.fetched  # already-stored month isn't fetched
+    assert client.refreshed == [True] * 4  # the chart list and the three weeks bypass the cache
+    history = load_history(history_path)
+    january = history["2024-01"]["artists"]
+    assert [(a["name"], a["playcount"], a["rank"]) for a in january] == [("A", 11, 1), ("B", 9, 2)]
+    assert january[0]["url"] == "https://last.fm/A"
+    assert history["2024-03"]["artists"] == []
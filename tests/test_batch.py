@@ -0,0 +1,46 @@
+import io
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import app.batch
+from app.batch import read_users, run_batch
+from app.multisite import user_output_dir
+
+
+def _payload(name: str) -> dict:
+    return {"topartists": {"artist": [{"name": name, "playcount": "12", "url": "https://example.com"}]}}
+
+
+def test_read_users_skips_blanks_comments_and_duplicates() -> None:
+    source = io.StringIO("alice\n\n# team\nbob  # second\nalice\nAlice\n")
+    assert read_users(source) == ["alice", "bob"]
+
+
+def test_user_output_dir_stays_under_the_output_root(tmp_path: Path) -> None:
+    for user in (".", "..", "..."):
+        with pytest.raises(ValueError, match="Invalid user name"):
+            user_output_dir(tmp_path, user)
+    assert user_output_dir(tmp_path, "../alice") == tmp_path / ".._alice"
+
+
+def test_run_batch_isolates_failures_per_user(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """One failing fetch is reported without affecting the other users' output."""
+
+    def fake_fetch(api_key: str, user: str, **_: object) -> dict:
+        if user == "broken":
+            raise RuntimeError("Last.fm error 6: User not found")
+        return _payload(f"{user} favourite")
+
+    monkeypatch.setattr(app.batch, "fetch_top_artists", fake_fetch)
+    run_at = datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+    results = run_batch("key", ["alice", "broken", "bob"], output_root=tmp_path, max_workers=2, run_timestamp=run_at)
+
+    assert [result.user for result in results] == ["alice", "broken", "bob"]
+    assert [result.ok for result in results] == [True, False, True]
+    assert "User not found" in results[1].error
+    assert (tmp_path / "alice" / "listening_history" / "index.json").exists()
+    assert "bob favourite" in (tmp_path / "bob" / "index.html").read_text(encoding="utf-8")
+    assert not (tmp_path / "broken").exists()
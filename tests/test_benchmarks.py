@@ -0,0 +1,26 @@
+from benchmarks.run import Scale, compare, run_suite
+from benchmarks.synthetic import generate_history
+
+
+def test_synthetic_history_is_deterministic_with_churn() -> None:
+    history = generate_history(months=12, artists_per_month=20, pool_size=200, churn=0.3, seed=7)
+
+    assert history == generate_history(months=12, artists_per_month=20, pool_size=200, churn=0.3, seed=7)
+    assert len(history) == 12 and sorted(history) == list(history)
+    first, second = (set(a["name"] for a in history[key]["artists"]) for key in list(history)[:2])
+    assert len(first) == len(second) == 20
+    assert 0 < len(first & second) < 20
+    playcounts = [a["playcount"] for a in history[max(history)]["artists"]]
+    assert playcounts == sorted(playcounts, reverse=True)
+
+
+def test_suite_runs_and_compare_flags_regressions() -> None:
+    results = run_suite(["tiny"], ["load_history", "_render_html"], repeat=1, scale_table={"tiny": Scale(1, 3, 5)})
+
+    assert set(results["results"]) == {"load_history@tiny", "_render_html@tiny"}
+    assert compare(results, results) == []
+    baseline = {"results": {key: dict(value) for key, value in results["results"].items()}}
+    baseline["results"]["_render_html@tiny"]["peak_bytes"] //= 2
+    baseline["results"]["load_history@tiny"]["seconds"] = 1e-9
+    results["results"]["load_history@tiny"]["seconds"] = 1.0
+    assert compare(results, baseline) == ["load_history@tiny seconds", "_render_html@tiny peak_bytes"]
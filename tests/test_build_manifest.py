@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.data_processor import ArtistStat, MonthlySnapshot
+from app.storage import load_month, save_data
+from app.ui_updater import build_site
+
+
+def _history(playcount: int) -> dict:
+    return {
+        "2024-02": {
+            "month_key": "2024-02",
+            "month_label": "February 2024",
+            "generated_at": "2024-02-15T12:00:00+00:00",
+            "artists": [{"name": "Artist", "playcount": playcount, "image_url": None, "url": None, "rank": 1}],
+        }
+    }
+
+
+def test_rebuild_with_unchanged_inputs_writes_nothing(tmp_path: Path) -> None:
+    first = build_site(_history(10), output_dir=tmp_path)
+    html_mtime = first.html_path.stat().st_mtime_ns
+
+    second = build_site(_history(10), output_dir=tmp_path)
+
+    assert first.changed
+    assert not second.changed
+    assert first.html_path.stat().st_mtime_ns == html_mtime
+
+
+def test_changed_or_damaged_artifacts_are_rebuilt(tmp_path: Path) -> None:
+    build_site(_history(10), output_dir=tmp_path)
+
+    changed = build_site(_history(11), output_dir=tmp_path)
+    assert {path.name for path in changed.written} >= {"index.html", "history.json"}
+
+    (tmp_path / "index.html").write_text("tampered", encoding="utf-8")
+    repaired = build_site(_history(11), output_dir=tmp_path)
+    assert [path.name for path in repaired.written] == ["index.html"]
+    assert "Artist" in (tmp_path / "index.html").read_text(encoding="utf-8")
+
+
+def test_unchanged_chart_keeps_stored_timestamp(tmp_path: Path) -> None:
+    history_path = tmp_path / "history.csv"
+
+    def snapshot(day: int, playcount: int) -> MonthlySnapshot:
+        return MonthlySnapshot(
+            month_key="2024-02",
+            month_label="February 2024",
+            generated_at=datetime(2024, 2, day, tzinfo=timezone.utc).isoformat(),
+            artists=[ArtistStat(name="Artist", playcount=playcount, image_url=None, url=None, rank=1)],
+        )
+
+    save_data(snapshot(10, 5), history_path=history_path)
+    save_data(snapshot(11, 5), history_path=history_path)
+    assert load_month("2024-02", history_path)["generated_at"].startswith("2024-02-10")
+
+    save_data(snapshot(12, 6), history_path=history_path)
+    assert load_month("2024-02", history_path)["generated_at"].startswith("2024-02-12")
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+from app.colors import COLOR_STATE_FILENAME, ColorAllocator, ColorState
+from app.ui_updater import _prepare_snapshots, update_ui
+
+
+def _month(month_key: str, names: list[str]) -> dict:
+    return {
+        "month_key": month_key,
+        "month_label": month_key,
+        "generated_at": f"{month_key}-28T04:00:00+00:00",
+        "artists": [
+            {"name": name, "playcount": 100 - rank, "image_url": None, "url": None, "rank": rank}
+            for rank, name in enumerate(names, start=1)
+        ],
+    }
+
+
+LINEUPS = [
+    ["A", "B", "C", "D"],
+    ["A", "C", "E", "F"],
+    ["G", "A", "F", "B"],
+    ["B", "H", "I", "A"],
+    ["J", "K", "A", "I"],
+]
+
+
+def _colors(snapshots: list[dict]) -> list[dict[str, str]]:
+    return [{artist["name"]: artist["color"] for artist in snapshot["artists"]} for snapshot in snapshots]
+
+
+def test_incremental_runs_match_a_full_replay(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Building month by month from the persisted ledger gives the same colors as replaying everything."""
+    history: dict[str, dict] = {}
+    for idx, lineup in enumerate(LINEUPS, start=1):
+        history[f"2024-0{idx}"] = _month(f"2024-0{idx}", lineup)
+        update_ui(history, output_dir=tmp_path)
+
+    full_replay = _prepare_snapshots(history)
+    state = ColorState.load(tmp_path / COLOR_STATE_FILENAME)
+    assert state is not None and state.through == "2024-04"
+
+    calls = []
+    original = ColorAllocator.color_for
+
+    def counting_color_for(self: ColorAllocator, name: str) -> str:
+        calls.append(name)
+        return original(self, name)
+
+    monkeypatch.setattr(ColorAllocator, "color_for", counting_color_for)
+    incremental = _prepare_snapshots(history, color_state=state)
+
+    assert _colors(incremental) == _colors(full_replay)
+    assert set(calls) == set(LINEUPS[-1])  # only the newest month went through the allocator
+
+
+def test_rerun_of_current_month_keeps_existing_colors(tmp_path: Path) -> None:
+    history = {"2024-01": _month("2024-01", ["A", "B"]), "2024-02": _month("2024-02", ["A", "C"])}
+    update_ui(history, output_dir=tmp_path)
+    before = _colors(_prepare_snapshots(history, color_state=ColorState.load(tmp_path / COLOR_STATE_FILENAME)))
+
+    history["2024-02"] = _month("2024-02", ["Z", "C", "A"])
+    update_ui(history, output_dir=tmp_path)
+    after = _colors(_prepare_snapshots(history, color_state=ColorState.load(tmp_path / COLOR_STATE_FILENAME)))
+
+    assert after[0] == before[0]
+    assert after[1]["A"] == before[1]["A"]
+    assert after[1]["C"] == before[1]["C"]
+    assert after[1]["Z"] not in {before[1]["A"], before[1]["C"]}
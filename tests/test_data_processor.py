@@ -1,5 +1,8 @@
+import json
 from datetime import datetime, timezone
 
+import pytest
+
 from app.data_processor import process_data
 
 
@@ -40,3 +43,83 @@ def test_process_data_normalizes_month_and_artists() -> None:
     assert top_artist.name == "Artist A"
     assert top_artist.playcount == 42
     # assert top_artist.image_url == "large_a.jpg"  # TODO implement after Spotipy fetch is added
+
+
+class _TrickleStream:
+    """Binary stream that returns a few bytes per read, to split entries (and UTF-8 sequences) across reads."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.data[self.offset : self.offset + 5]
+        self.offset += len(chunk)
+        return chunk
+
+
+def test_process_data_accepts_raw_bytes_and_streams() -> None:
+    run_at = datetime(2024, 2, 15, tzinfo=timezone.utc)
+    payload = _make_payload()
+    payload["topartists"]["artist"].append({"name": "Sigur Rós", "playcount": "3", "url": None})
+    payload["topartists"]["@attr"] = {"user": "someone", "total": "3"}
+    body = json.dumps(payload, ensure_ascii=False, indent=1).encode("utf-8")
+
+    expected = process_data(payload, run_timestamp=run_at)
+    assert process_data(body, run_timestamp=run_at) == expected
+    assert process_data(_TrickleStream(body), run_timestamp=run_at) == expected
+    assert [artist.name for artist in expected.artists] == ["Artist A", "Artist B", "Sigur Rós"]
+    with pytest.raises(ValueError, match="truncated"):
+        process_data(body[: len(body) // 2], run_timestamp=run_at)
+
+
+def test_process_data_keeps_top_n_by_playcount() -> None:
+    entries = iter(
+        [
+            {"name": "Low", "playcount": "1"},
+            {"name": "High", "playcount": "90"},
+            {"name": "Tie first", "playcount": "20"},
+            {"name": "Bad", "playcount": "n/a"},
+            {"name": "Tie second", "playcount": "20"},
+        ]
+    )
+    snapshot = process_data(entries, run_timestamp=datetime(2024, 2, 1, tzinfo=timezone.utc), top_n=3)
+
+    assert [(artist.name, artist.playcount, artist.rank) for artist in snapshot.artists] == [
+        ("High", 90, 1),
+        ("Tie first", 20, 2),
+        ("Tie second", 20, 3),
+    ]
+
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_process_data_raises_on_error_responses(as_bytes: bool) -> None:
+    body = {"error": 29, "message": "Rate Limit Exceeded"}
+    with pytest.raises(ValueError, match="Last.fm error 29: Rate Limit Exceeded"):
+        process_data(json.dumps(body).encode("utf-8") if as_bytes else body)
+
+
+@pytest.mark.parametrize("raw", [None, {}, b"", b"{}", b'{"topartists": {"@attr": {"user": "alice"}}}'])
+def test_process_data_without_artists_is_empty(raw: object) -> None:
+    assert process_data(raw).artists == []
+
+
+def test_ranked_bodies_are_read_only_up_to_top_n() -> None:
+    payload = {"topartists": {"artist": [{"name": f"A{idx}", "playcount": str(100 - idx)} for idx in range(50)]}}
+    stream = _TrickleStream(json.dumps(payload).encode("utf-8"))
+
+    snapshot = process_data(stream, top_n=3)
+
+    assert [artist.name for artist in snapshot.artists] == ["A0", "A1", "A2"]
+    assert stream.offset < len(stream.data) // 4
+
+
+def test_process_data_accepts_single_artist_object() -> None:
+    payload = {"topartists": {"artist": {"name": "Solo", "playcount": "3", "url": ""}, "@attr": {"total": "1"}}}
+    body = json.dumps(payload).encode("utf-8")
+    run_at = datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+    expected = process_data(payload, run_timestamp=run_at)
+    assert [(artist.name, artist.playcount) for artist in expected.artists] == [("Solo", 3)]
+    assert process_data(body, run_timestamp=run_at) == expected
+    assert process_data(_TrickleStream(body), run_timestamp=run_at) == expected
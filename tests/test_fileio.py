@@ -0,0 +1,24 @@
+import os
+import stat
+from pathlib import Path
+
+from app.fileio import DEFAULT_FILE_MODE, atomic_write_bytes
+
+
+def _mode(path: Path) -> int:
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+def test_atomic_write_uses_umask_mode_and_keeps_existing_mode(tmp_path: Path) -> None:
+    """Temp files are created 0600; the committed file must be readable like a normally written one."""
+    target = tmp_path / "index.html"
+    atomic_write_bytes(target, b"first")
+    assert _mode(target) == DEFAULT_FILE_MODE
+    plain = tmp_path / "plain.html"
+    plain.write_bytes(b"x")
+    assert _mode(target) == _mode(plain)
+
+    os.chmod(target, 0o640)
+    atomic_write_bytes(target, b"second", fsync=True)
+    assert target.read_bytes() == b"second"
+    assert _mode(target) == 0o640
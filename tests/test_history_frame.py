@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from app.history_frame import HistoryFrame
+from app.storage import load_history, load_history_frame, save_data
+from app.ui_updater import _prepare_snapshots
+from tests.conftest import make_snapshot
+
+
+def test_upsert_keeps_months_sorted_and_interns_artists() -> None:
+    frame = HistoryFrame()
+    frame.upsert_snapshot(make_snapshot("2024-03", {"A": 5, "B": 2}))
+    frame.upsert_snapshot(make_snapshot("2024-01", {"A": 9}))
+    frame.upsert_snapshot(make_snapshot("2024-02", {"C": 4, "A": 1, "B": 1}))
+    frame.upsert_snapshot(make_snapshot("2024-01", {"B": 7, "A": 6}))
+
+    assert frame.month_keys == ["2024-01", "2024-02", "2024-03"]
+    assert frame.artist_names == ["A", "B", "C"]
+    assert list(frame.offsets) == [0, 2, 5, 7]
+    january = frame.snapshot("2024-01")
+    assert [(artist.name, artist.playcount, artist.rank) for artist in january.artists] == [("B", 7, 1), ("A", 6, 2)]
+    assert frame.snapshot("2024-03").artists[1].url == "https://example.com/B"
+    assert HistoryFrame.from_history(frame.to_history()).to_history() == frame.to_history()
+
+
+def test_storage_frame_matches_dict_history(tmp_path: Path) -> None:
+    history_path = tmp_path / "history.csv"
+    save_data(make_snapshot("2024-01", {"A": 9, "B": 3}), history_path=history_path)
+    save_data(make_snapshot("2024-02", {"B": 8}), history_path=history_path)
+
+    frame = load_history_frame(history_path)
+
+    assert frame.to_history() == load_history(history_path)
+    assert _prepare_snapshots(frame) == _prepare_snapshots(load_history(history_path))
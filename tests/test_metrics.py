@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app import metrics
+from app.fileio import atomic_write_bytes, read_bytes
+
+
+@pytest.fixture(autouse=True)
+def _reset_collector() -> None:
+    yield
+    metrics.disable()
+
+
+def test_spans_nest_and_attribute_counters(tmp_path: Path) -> None:
+    collector = metrics.enable()
+    with metrics.span("outer"):
+        atomic_write_bytes(tmp_path / "a.bin", b"x" * 10)
+        with metrics.span("inner"):
+            read_bytes(tmp_path / "a.bin")
+            buffer = bytearray(2_000_000)
+            del buffer
+        metrics.count("http_requests", 2)
+
+    inner, outer = collector.spans
+    assert (inner["name"], inner["parent"]) == ("inner", "outer")
+    assert inner["counters"] == {"bytes_read": 10}
+    assert outer["counters"] == {"bytes_written": 10, "bytes_read": 10, "http_requests": 2}
+    assert inner["peak_bytes"] >= 2_000_000
+    assert outer["peak_bytes"] >= inner["peak_bytes"]
+    assert outer["wall_seconds"] >= inner["wall_seconds"] >= 0
+
+
+def test_disabled_metrics_are_no_ops_and_written_as_json(tmp_path: Path) -> None:
+    with metrics.span("ignored"):
+        metrics.count("http_requests")
+
+    collector = metrics.enable(trace_memory=False)
+    with metrics.span("run"):
+        metrics.count("http_requests")
+    collector.write(str(tmp_path / "metrics.json"))
+
+    payload = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert payload["counters"] == {"http_requests": 1}
+    assert payload["spans"][0]["name"] == "run" and payload["spans"][0]["peak_bytes"] is None
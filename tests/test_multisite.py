@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import app.batch
+from app.batch import run_batch
+from app.multisite import HISTORY_FILENAME, build_sites, discover_sites, format_site_summary
+
+
+def _seed_sites(root: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fake_fetch(api_key: str, user: str, **_: object) -> dict:
+        return {"topartists": {"artist": [{"name": f"{user} favourite", "playcount": "9", "url": ""}]}}
+
+    monkeypatch.setattr(app.batch, "fetch_top_artists", fake_fetch)
+    run_batch(
+        "key",
+        ["alice", "bob"],
+        output_root=root,
+        max_workers=1,
+        run_timestamp=datetime(2024, 3, 1, tzinfo=timezone.utc),
+    )
+
+
+def test_build_sites_isolates_failures_and_links_every_site(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _seed_sites(tmp_path, monkeypatch)
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    (broken / HISTORY_FILENAME).write_text("not,a,history\n1,2\n", encoding="utf-8")
+    for user in ("alice", "bob"):
+        (tmp_path / user / "index.html").unlink()
+
+    assert discover_sites(tmp_path) == ["alice", "bob", "broken"]
+    results = build_sites(output_root=tmp_path, max_workers=2, chunksize=1)
+
+    assert [result.user for result in results] == ["alice", "bob", "broken"]
+    assert [result.ok for result in results] == [True, True, False]
+    assert "alice favourite" in (tmp_path / "alice" / "index.html").read_text(encoding="utf-8")
+    index = (tmp_path / "index.html").read_text(encoding="utf-8")
+    for user in ("alice", "bob", "broken"):
+        assert f'href="{user}/index.html"' in index
+    assert "1 failed" in format_site_summary(results)
+
+
+def test_sites_share_one_plotly_bundle(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _seed_sites(tmp_path, monkeypatch)
+    build_sites(output_root=tmp_path, max_workers=1)
+
+    bundles = list(tmp_path.glob("*/plotly.*.min.js"))
+    assert [bundle.parent.name for bundle in bundles] == ["assets"]
+    for user in ("alice", "bob"):
+        assert not (tmp_path / user / "assets").exists()
+        html = (tmp_path / user / "index.html").read_text(encoding="utf-8")
+        assert f'<script src="../assets/{bundles[0].name}"></script>' in html
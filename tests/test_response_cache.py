@@ -0,0 +1,92 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from app.api_client import LastFmClient
+from app.response_cache import ResponseCache, cache_key
+
+
+class _CountingSession:
+    """Fake session that doubles as its own response."""
+
+    status_code = 200
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get(self, url: str, params: dict, timeout: float) -> "_CountingSession":
+        self.calls += 1
+        return self
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return {"topartists": {"artist": [{"name": f"call {self.calls}"}]}}
+
+
+def test_cache_key_ignores_api_key_and_username_case() -> None:
+    base = {"method": "user.gettopartists", "user": "Alice", "period": "1month", "limit": 15, "page": 1}
+    assert cache_key({**base, "api_key": "a"}) == cache_key({**base, "user": "alice", "api_key": "b"})
+    assert cache_key(base) != cache_key({**base, "page": 2})
+
+
+def test_client_serves_cached_response_until_refresh(tmp_path: Path) -> None:
+    session = _CountingSession()
+    client = LastFmClient("key", rate_limit=0, session=session, cache=ResponseCache(tmp_path))
+
+    first = client.top_artists("alice")
+    assert client.top_artists("alice") == first
+    assert session.calls == 1
+
+    refreshed = client.top_artists("alice", refresh=True)
+    assert session.calls == 2
+    assert refreshed != first
+    assert client.top_artists("alice") == refreshed
+
+
+def test_expired_entries_are_dropped(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path, ttl=60)
+    params = {"method": "user.gettopartists", "user": "alice"}
+    cache.put(params, {"ok": True})
+    assert cache.get(params) == {"ok": True}
+
+    cache.ttl = -1
+    assert cache.get(params) is None
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path, max_bytes=10_000)
+    blob = "x" * 3_000
+    for page in range(3):
+        cache.put({"page": page}, {"blob": blob})
+    # Make page 0 the oldest, then touch it so page 1 becomes least recently used.
+    past = time.time() - 100
+    for page in range(3):
+        os.utime(tmp_path / f"{cache_key({'page': page})}.json", (past + page, past + page))
+    assert cache.get({"page": 0}) is not None
+
+    cache.put({"page": 3}, {"blob": blob})
+
+    assert cache.get({"page": 1}) is None
+    assert cache.get({"page": 0}) is not None
+    assert cache.get({"page": 3}) is not None
+
+
+def test_puts_track_size_without_rescanning(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = ResponseCache(tmp_path, max_bytes=1_000_000)
+    cache.put({"page": 0}, {"blob": "x"})
+    scans = []
+    original_scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or original_scan())
+
+    for page in range(1, 50):
+        cache.put({"page": page}, {"blob": "x"})
+    cache.put({"page": 1}, {"blob": "y" * 10})
+
+    assert scans == []
+    assert cache.entry_count == 50
+    assert cache.size_bytes == sum(path.stat().st_size for path in tmp_path.glob("*.json"))
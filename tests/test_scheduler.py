@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import app.scheduler
+from app.scheduler import (
+    MIN_INTERVAL_SECONDS,
+    RefreshOutcome,
+    RefreshScheduler,
+    Schedule,
+    UserSchedule,
+    refresh_user,
+)
+
+
+def _chart(playcount: int) -> dict:
+    return {"topartists": {"artist": [{"name": "Artist", "playcount": str(playcount), "url": ""}]}}
+
+
+def test_refresh_user_skips_storage_when_chart_is_unchanged(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    charts = [_chart(5), _chart(5), _chart(9)]
+    stored: List[Path] = []
+    monkeypatch.setattr(app.scheduler, "fetch_top_artists", lambda **_: charts.pop(0))
+    monkeypatch.setattr(
+        app.scheduler, "refresh_user_site", lambda payload, output_dir, *_, **__: stored.append(output_dir)
+    )
+    entry = UserSchedule(user="alice")
+    run_at = datetime(2024, 3, 10, tzinfo=timezone.utc)
+
+    outcomes = []
+    for _ in range(3):
+        outcome = refresh_user("key", entry, output_root=tmp_path, run_timestamp=run_at)
+        entry.payload_hash = outcome.payload_hash
+        outcomes.append(outcome)
+
+    assert [outcome.changed for outcome in outcomes] == [True, False, True]
+    assert stored == [tmp_path / "alice", tmp_path / "alice"]
+
+
+def test_scheduler_refreshes_busy_users_more_often(tmp_path: Path) -> None:
+    """A user whose chart keeps changing comes back sooner than one whose chart never moves."""
+    now = [1_000.0]
+    schedule = Schedule()
+    schedule.sync_users(["busy", "still"], now[0])
+    plays = {"busy": 0, "still": 0}
+
+    def refresh(entry: UserSchedule) -> RefreshOutcome:
+        if entry.user == "busy":
+            plays["busy"] += 10
+        changed = entry.payload_hash is None or entry.user == "busy"
+        return RefreshOutcome(
+            entry.user,
+            ok=True,
+            changed=changed,
+            payload_hash=f"{plays[entry.user]}",
+            playcounts={"A": plays[entry.user] + 1},
+        )
+
+    scheduler = RefreshScheduler(
+        refresh, schedule, tmp_path / "schedule.json", budget_per_minute=6000, max_workers=2, clock=lambda: now[0]
+    )
+    refreshed = []
+    for _ in range(8):
+        refreshed += [outcome.user for outcome in scheduler.run(once=True)]
+        now[0] = schedule.peek_due()
+
+    assert sorted(refreshed[:2]) == ["busy", "still"]
+    assert refreshed[2:].count("busy") > refreshed[2:].count("still")
+    assert schedule.entries["busy"].interval < schedule.entries["still"].interval
+    assert schedule.entries["busy"].interval >= MIN_INTERVAL_SECONDS
+    assert Schedule.load(tmp_path / "schedule.json").entries["still"].payload_hash == "0"
@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.api_client import LastFmClient
+from app.scrobbles import MonthlyAggregator, ingest_scrobbles
+from app.storage import load_history
+
+
+def _uts(year: int, month: int, day: int, hour: int = 12) -> int:
+    return int(datetime(year, month, day, hour, tzinfo=timezone.utc).timestamp())
+
+
+def _track(name: str, uts: int, title: str = "Song") -> Dict[str, Any]:
+    return {"name": title, "artist": {"name": name, "url": f"https://last.fm/{name}"}, "date": {"uts": str(uts)}}
+
+
+class _Response:
+    status_code = 200
+    headers: Dict[str, str] = {}
+
+    def __init__(self, payload: Dict[str, Any]) -> None:
+        self.payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Dict[str, Any]:
+        return self.payload
+
+
+class _RecentTracksSession:
+    """Serves `user.getrecenttracks` newest first, honouring `from`/`to`, like Last.fm does."""
+
+    def __init__(self, scrobbles: List[Dict[str, Any]], page_size: int) -> None:
+        self.scrobbles = sorted(scrobbles, key=lambda track: -int(track["date"]["uts"]))
+        self.page_size = page_size
+        self.calls: List[Dict[str, Any]] = []
+
+    def get(self, url: str, params: Dict[str, Any], timeout: float) -> Any:
+        self.calls.append(params)
+        matching = [
+            track
+            for track in self.scrobbles
+            if int(params.get("from", 0)) <= int(track["date"]["uts"]) <= int(params["to"])
+        ]
+        page = int(params["page"])
+        total_pages = max(1, -(-len(matching) // self.page_size))
+        tracks = matching[(page - 1) * self.page_size : page * self.page_size]
+        if page == 1:
+            tracks = [{"artist": {"name": "Now Playing"}, "@attr": {"nowplaying": "true"}}] + tracks
+        payload = {"recenttracks": {"track": tracks, "@attr": {"totalPages": str(total_pages)}}}
+        return _Response(payload)
+
+    def close(self) -> None:
+        pass
+
+
+def test_iter_recent_tracks_yields_oldest_first_and_skips_now_playing() -> None:
+    scrobbles = [_track(f"A{idx}", _uts(2024, 1, 1 + idx)) for idx in range(7)]
+    client = LastFmClient("key", rate_limit=0, session=_RecentTracksSession(scrobbles, page_size=3))
+
+    names = [
+        track["artist"]["name"] for track in client.iter_recent_tracks("alice", page_size=3, to_ts=_uts(2025, 1, 1))
+    ]
+
+    assert names == [f"A{idx}" for idx in range(7)]
+
+
+def test_aggregator_closes_calendar_months_and_round_trips_state() -> None:
+    aggregator = MonthlyAggregator(top_n=2)
+    assert aggregator.add(_uts(2024, 1, 31, 23), "Low", None) is None
+    aggregator.add(_uts(2024, 1, 31, 23) + 1, "Low")
+    aggregator.add(_uts(2024, 1, 31, 23) + 2, "High")
+    aggregator.add(_uts(2024, 1, 31, 23) + 3, "High")
+    aggregator.add(_uts(2024, 1, 31, 23) + 4, "High")
+    aggregator.add(_uts(2024, 1, 31, 23) + 5, "Third")
+
+    january = aggregator.add(_uts(2024, 2, 1, 0), "Feb")
+
+    assert january is not None and january.month_key == "2024-01"
+    assert [(a.name, a.playcount, a.rank) for a in january.artists] == [("High", 3, 1), ("Low", 2, 2)]
+    restored = MonthlyAggregator.from_state(aggregator.to_state(), top_n=2)
+    assert restored.add(_uts(2024, 2, 1, 0), "Feb") is None  # already counted
+    assert restored.snapshot().month_key == "2024-02"
+    assert dict(restored.counts) == {"Feb": 1}
+
+
+def test_ingest_resumes_from_checkpoint(tmp_path: Path) -> None:
+    history_path = tmp_path / "listening_history.csv"
+    scrobbles = [_track("Jan", _uts(2024, 1, day)) for day in (3, 4)] + [_track("Feb", _uts(2024, 2, 2))]
+    session = _RecentTracksSession(scrobbles, page_size=2)
+    client = LastFmClient("key", rate_limit=0, session=session)
+
+    assert ingest_scrobbles(client, "alice", history_path=history_path) == 2
+    session.scrobbles.insert(0, _track("Feb", _uts(2024, 2, 20)))
+    session.scrobbles.insert(0, _track("Mar", _uts(2024, 3, 1)))
+    session.calls.clear()
+    assert ingest_scrobbles(client, "alice", history_path=history_path) == 2
+
+    assert session.calls[0]["from"] == _uts(2024, 2, 2)
+    history = load_history(history_path)
+    assert sorted(history) == ["2024-01", "2024-02", "2024-03"]
+    assert history["2024-01"]["artists"][0]["playcount"] == 2
+    assert history["2024-02"]["artists"][0]["playcount"] == 2
+    assert history["2024-03"]["month_label"] == "March 2024"
+
+
+def test_scrobbles_sharing_a_second_are_counted_once_each(tmp_path: Path) -> None:
+    history_path = tmp_path / "listening_history.csv"
+    second = _uts(2024, 1, 5)
+    scrobbles = [_track("Band", second, "Intro"), _track("Band", second, "Outro")]
+    session = _RecentTracksSession(scrobbles, page_size=1)
+    client = LastFmClient("key", rate_limit=0, session=session)
+
+    assert ingest_scrobbles(client, "alice", history_path=history_path) == 1
+    january = history_path.with_suffix("") / "2024-01.csv"
+    mtime = january.stat().st_mtime_ns
+    # The resumed run re-reads the checkpoint's second; nothing new, so nothing is rewritten.
+    assert ingest_scrobbles(client, "alice", history_path=history_path) == 0
+    assert january.stat().st_mtime_ns == mtime
+
+    session.scrobbles.insert(0, _track("Band", second, "Encore"))
+    assert ingest_scrobbles(client, "alice", history_path=history_path) == 1
+    assert load_history(history_path)["2024-01"]["artists"][0]["playcount"] == 3
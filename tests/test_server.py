@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pytest
+
+import app.server
+from app.data_processor import ArtistStat, MonthlySnapshot
+from app.multisite import HISTORY_FILENAME, user_output_dir
+from app.server import CachedSite, SiteCache, start_server
+from app.storage import save_snapshots, segment_dir
+
+
+def _save_month(root: Path, user: str, month: str, playcount: int) -> None:
+    run_date = datetime.strptime(month, "%Y-%m").replace(day=15, tzinfo=timezone.utc)
+    snapshot = MonthlySnapshot(
+        month_key=month,
+        month_label=run_date.strftime("%B %Y"),
+        generated_at=run_date.isoformat(),
+        artists=[ArtistStat(name=f"{user} favourite", playcount=playcount, image_url=None, url=None, rank=1)],
+    )
+    save_snapshots([snapshot], history_path=user_output_dir(root, user) / HISTORY_FILENAME)
+
+
+async def _get(port: int, path: str, headers: Dict[str, str] | None = None) -> Tuple[int, Dict[str, str], bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    response_headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split(" ")[1]), response_headers, body
+
+
+def test_site_cache_evicts_least_recently_used_by_bytes() -> None:
+    cache = SiteCache(max_bytes=10)
+    for user in ("a", "b", "c"):
+        cache.put(user, CachedSite((), b"x" * 4, "", b"", ""))
+        if user == "b":
+            cache.get("a")
+    assert cache.get("b") is None and cache.get("a") is not None and cache.size == 8
+    cache.put("big", CachedSite((), b"x" * 11, "", b"", ""))
+    assert cache.get("big") is None and len(cache) == 2
+
+
+def test_server_coalesces_refreshes_and_honours_etags(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _save_month(tmp_path, "alice", "2024-01", 5)
+    renders = []
+    render_site = app.server.render_site
+    monkeypatch.setattr(app.server, "render_site", lambda *args: renders.append(args[0]) or render_site(*args))
+
+    async def scenario() -> None:
+        server = await start_server(tmp_path, port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            pages = await asyncio.gather(*(_get(port, "/alice/") for _ in range(5)))
+            assert {status for status, _, _ in pages} == {200}
+            assert b"alice favourite" in pages[0][2]
+            assert renders == ["alice"]
+
+            status, headers, body = await _get(port, "/alice/history.json")
+            assert status == 200 and body.startswith(b'{"version":2')
+            status, _, body = await _get(port, "/alice/history.json", {"If-None-Match": headers["ETag"]})
+            assert (status, body) == (304, b"")
+            assert renders == ["alice"]
+
+            _save_month(tmp_path, "alice", "2024-02", 7)
+            status, _, _ = await _get(port, "/alice/history.json", {"If-None-Match": headers["ETag"]})
+            assert status == 200 and renders == ["alice", "alice"]
+            assert (await _get(port, "/nobody/"))[0] == 404
+
+    asyncio.run(scenario())
+
+
+def test_server_answers_500_when_a_history_cannot_be_rendered(tmp_path: Path) -> None:
+    _save_month(tmp_path, "alice", "2024-01", 5)
+    _save_month(tmp_path, "bob", "2024-01", 7)
+    segment = segment_dir(user_output_dir(tmp_path, "alice") / HISTORY_FILENAME) / "2024-01.csv"
+    segment.write_text(segment.read_text(encoding="utf-8").replace(",5,", ",notanint,"), encoding="utf-8")
+
+    async def scenario() -> None:
+        server = await start_server(tmp_path, port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, _, _ = await _get(port, "/alice/")
+            assert status == 500
+            status, _, body = await _get(port, "/bob/")
+            assert status == 200 and b"bob favourite" in body
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from app.sqlite_storage import SqliteBackend
+from app.storage import get_backend, load_history, save_data
+from tests.conftest import make_snapshot
+
+
+def test_sqlite_suffix_selects_sqlite_backend(tmp_path: Path) -> None:
+    history_path = tmp_path / "history.sqlite"
+    save_data(make_snapshot("2024-02", {"A": 10}), history_path=history_path)
+    history = save_data(make_snapshot("2024-02", {"A": 25, "B": 4}), history_path=history_path)
+
+    with get_backend(history_path) as backend:
+        assert isinstance(backend, SqliteBackend)
+    assert [artist["playcount"] for artist in history["2024-02"]["artists"]] == [25, 4]
+    assert load_history(history_path) == history
+
+
+def test_sqlite_queries_are_scoped_per_user(tmp_path: Path) -> None:
+    db_path = tmp_path / "history.db"
+    with SqliteBackend(db_path, user="alice") as alice, SqliteBackend(db_path, user="bob") as bob:
+        save_data(make_snapshot("2024-01", {"A": 10, "B": 5}), backend=alice)
+        save_data(make_snapshot("2024-02", {"B": 20, "C": 3}), backend=alice)
+        save_data(make_snapshot("2024-02", {"A": 99}), backend=bob)
+
+        assert [row["month_key"] for row in alice.artist_history("B")] == ["2024-01", "2024-02"]
+        assert alice.top_artists(limit=2) == [{"name": "B", "playcount": 25}, {"name": "A", "playcount": 10}]
+        assert alice.top_artists(start_month="2024-02") == [
+            {"name": "B", "playcount": 20},
+            {"name": "C", "playcount": 3},
+        ]
+        assert list(bob.load_history()) == ["2024-02"]
+        assert alice.months() == ["2024-01", "2024-02"]
+        assert bob.months() == ["2024-02"]
+        assert alice.load_month("2023-12") is None
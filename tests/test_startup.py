@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.palette import PALETTE
+from benchmarks.startup import DEFAULT_BUDGET_MS, FORBIDDEN_MODULES, measure_startup
+
+
+def test_vendored_palette_matches_plotly() -> None:
+    qualitative = pytest.importorskip("plotly.colors").qualitative
+
+    expected = qualitative.Plotly + qualitative.Safe + qualitative.Bold + qualitative.Pastel + qualitative.Antique
+    assert PALETTE == expected
+
+
+def test_cli_import_does_not_load_heavy_subsystems() -> None:
+    result = measure_startup(runs=3)
+
+    assert result["forbidden_loaded"] == []
+    assert set(FORBIDDEN_MODULES) >= {"plotly", "requests"}
+    # Three times the CI budget, so a busy test machine doesn't flake but a gross regression still fails.
+    assert result["median_ms"] < DEFAULT_BUDGET_MS * 3
+
+
+def test_building_the_site_does_not_import_plotly() -> None:
+    code = "import sys, app.ui_updater; print('plotly' in sys.modules)"
+    completed = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+
+    assert completed.stdout.strip() == "False"
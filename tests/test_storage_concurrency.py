@@ -0,0 +1,43 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.storage import CsvSegmentBackend, load_history, segment_dir
+
+
+def _payload(month_key: str, writer: int) -> dict:
+    return {
+        "month_key": month_key,
+        "month_label": month_key,
+        "generated_at": f"{month_key}-28T00:00:00+00:00",
+        "artists": [{"name": f"Writer {writer}", "playcount": writer + 1, "image_url": None, "url": None, "rank": 1}],
+    }
+
+
+def test_parallel_writers_never_lose_months(tmp_path: Path) -> None:
+    """Each writer uses its own backend, like separate processes sharing the history directory."""
+    history_path = tmp_path / "listening_history.csv"
+    months = [f"2023-{month:02d}" for month in range(1, 13)]
+
+    def write(writer: int) -> None:
+        CsvSegmentBackend(history_path).save_snapshots([_payload(months[writer % len(months)], writer)])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(24)))
+
+    history = load_history(history_path)
+    index = json.loads((segment_dir(history_path) / "index.json").read_text(encoding="utf-8"))
+    assert list(history) == months
+    assert index["revision"] == 24
+    for month_key, snapshot in history.items():
+        # Two writers per month: whichever committed last, segment and index entry agree.
+        assert snapshot["artists"][0]["name"] in {
+            f"Writer {months.index(month_key)}",
+            f"Writer {months.index(month_key) + 12}",
+        }
+        assert index["months"][month_key]["rows"] == 1
+    assert not list(segment_dir(history_path).glob("*.tmp")) and not list(segment_dir(history_path).glob(".*.tmp"))
+    # Lock files stay out of the published history directory.
+    assert {path.name for path in segment_dir(history_path).iterdir()} == {"index.json"} | {
+        f"{month}.csv" for month in months
+    }
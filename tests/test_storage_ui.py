@@ -1,9 +1,12 @@
+import gzip
+import hashlib
+import json
 from datetime import datetime, timezone
 from pathlib import Path
 
 from app.data_processor import ArtistStat, MonthlySnapshot
-from app.storage import save_data
-from app.ui_updater import _prepare_snapshots, update_ui
+from app.storage import CsvSegmentBackend, load_history, load_month, save_data, segment_dir
+from app.ui_updater import PAYLOAD_VERSION, _load_existing_colors, _prepare_snapshots, decode_payload, update_ui
 
 
 def _snapshot(month: str, playcount: int) -> MonthlySnapshot:
@@ -31,12 +34,46 @@ def test_save_data_overwrites_existing_month(tmp_path: Path) -> None:
     save_data(_snapshot("2024-02", 10), history_path=history_path)
     history = save_data(_snapshot("2024-02", 55), history_path=history_path)
 
-    assert history_path.exists()
+    assert (segment_dir(history_path) / "2024-02.csv").exists()
     assert len(history) == 1
     latest = history["2024-02"]
     assert latest["artists"][0]["playcount"] == 55
 
 
+def test_save_data_only_rewrites_the_saved_month(tmp_path: Path) -> None:
+    """Earlier month segments are left untouched and can be read on their own."""
+    history_path = tmp_path / "history.csv"
+    save_data(_snapshot("2024-01", 3), history_path=history_path)
+    january_segment = segment_dir(history_path) / "2024-01.csv"
+    january_mtime = january_segment.stat().st_mtime_ns
+
+    history = save_data(_snapshot("2024-02", 9), history_path=history_path)
+
+    assert list(history) == ["2024-01", "2024-02"]
+    assert january_segment.stat().st_mtime_ns == january_mtime
+    assert load_month("2024-02", history_path)["artists"][0]["playcount"] == 9
+    assert load_month("2023-12", history_path) is None
+
+
+def test_legacy_csv_is_migrated_to_segments(tmp_path: Path) -> None:
+    """A single-file history from older versions is still readable and gets split on the next save."""
+    history_path = tmp_path / "history.csv"
+    history_path.write_text(
+        "month_key,month_label,generated_at,artist_name,playcount,image_url,url,rank\n"
+        "2023-12,December 2023,2023-12-28T04:00:00+00:00,Old Artist,30,,https://example.com/old,1\n",
+        encoding="utf-8",
+    )
+    assert load_history(history_path)["2023-12"]["artists"][0]["name"] == "Old Artist"
+    assert CsvSegmentBackend(history_path).months() == ["2023-12"]
+
+    history = save_data(_snapshot("2024-01", 5), history_path=history_path)
+
+    assert list(history) == ["2023-12", "2024-01"]
+    assert (segment_dir(history_path) / "2023-12.csv").exists()
+    assert not history_path.exists()  # no stale copy published next to the segments
+    assert CsvSegmentBackend(history_path).months() == ["2023-12", "2024-01"]
+
+
 def test_update_ui_builds_html(tmp_path: Path) -> None:
     """UI builder writes an HTML file containing the artist name."""
     history = {
@@ -63,6 +100,60 @@ def test_update_ui_builds_html(tmp_path: Path) -> None:
     assert "Test Artist" in html
 
 
+def test_update_ui_sharded_writes_month_shards_and_manifest(tmp_path: Path) -> None:
+    """Sharded builds keep month data out of index.html and list content-hashed shards in a manifest."""
+    history = {
+        "2024-01": _history_entry(
+            "2024-01", [{"name": "January Artist", "playcount": 3, "image_url": None, "url": None, "rank": 1}]
+        ),
+        "2024-02": _history_entry(
+            "2024-02", [{"name": "February Artist", "playcount": 5, "image_url": None, "url": None, "rank": 1}]
+        ),
+    }
+    update_ui(history, output_dir=tmp_path)
+    assert (tmp_path / "history.json").exists()
+    html = update_ui(history, output_dir=tmp_path, sharded=True).read_text(encoding="utf-8")
+    assert not (tmp_path / "history.json").exists()  # not published alongside the shards
+    manifest = json.loads((tmp_path / "data" / "manifest.json").read_text(encoding="utf-8"))
+
+    assert "February Artist" not in html
+    assert [entry["month_key"] for entry in manifest["months"]] == ["2024-01", "2024-02"]
+    shard = tmp_path / manifest["months"][1]["url"]
+    assert json.loads(shard.read_text(encoding="utf-8"))["artists"][0]["name"] == "February Artist"
+    assert gzip.decompress(shard.with_name(shard.name + ".gz").read_bytes()) == shard.read_bytes()
+    assert manifest["months"][1]["hash"] == "sha256-" + hashlib.sha256(shard.read_bytes()).hexdigest()
+
+    history["2024-02"]["artists"][0]["playcount"] = 8
+    update_ui(history, output_dir=tmp_path, sharded=True)
+    assert not shard.exists()  # superseded shard is cleaned up
+    assert len(list((tmp_path / "data" / "months").glob("*.json"))) == 2
+
+
+def test_history_json_is_dictionary_encoded(tmp_path: Path) -> None:
+    """Artists repeated across months are stored once; decoding restores the page snapshots."""
+    shared = {"name": "Shared", "playcount": 4, "image_url": None, "url": "https://example.com/shared", "rank": 1}
+    history = {
+        month: _history_entry(
+            month, [dict(shared), {"name": f"Only {month}", "playcount": 2, "image_url": None, "url": None, "rank": 2}]
+        )
+        for month in ("2024-01", "2024-02", "2024-03")
+    }
+    update_ui(history, output_dir=tmp_path)
+    payload = json.loads((tmp_path / "history.json").read_text(encoding="utf-8"))
+
+    assert payload["version"] == PAYLOAD_VERSION
+    assert payload["artists"]["name"].count("Shared") == 1
+    assert payload["months"][1]["artist"][0] == payload["months"][0]["artist"][0]
+    decoded = decode_payload(payload)
+    expected = _prepare_snapshots(history)
+    assert [[(a["name"], a["playcount"], a["color"]) for a in s["artists"]] for s in decoded] == [
+        [(a["name"], a["playcount"], a["color"]) for a in s["artists"]] for s in expected
+    ]
+    assert decoded[2]["artists"][0]["streak"] == 3
+    colors = {name: color for snapshot in expected for name, color in _snapshot_colors(snapshot).items()}
+    assert _load_existing_colors(tmp_path / "history.json") == colors
+
+
 def _history_entry(month_key: str, artists: list[dict]) -> dict:
     return {
         "month_key": month_key,
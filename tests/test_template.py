@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.build_manifest import BuildManifest
+from app.template import CompiledTemplate, iter_json, iter_json_bytes
+
+
+def test_template_is_split_once_into_literals_and_placeholders() -> None:
+    template = CompiledTemplate("<p>__A__ and __B__</p>")
+
+    assert template.segments == [(False, "<p>"), (True, "__A__"), (False, " and "), (True, "__B__"), (False, "</p>")]
+    # Values are inserted verbatim, even when they contain another placeholder's marker.
+    assert template.render({"__A__": "__B__", "__B__": iter(["x", "y"])}) == "<p>__B__ and xy</p>"
+    with pytest.raises(KeyError, match="__B__"):
+        template.render({"__A__": ""})
+
+
+def test_streaming_json_matches_json_dumps() -> None:
+    value = [{"name": "Röyksopp", "plays": [1, 2]}, {"name": "</script>"}, []]
+
+    for options in ({"ensure_ascii": False}, {"separators": (",", ":")}):
+        assert "".join(iter_json(value, **options)) == json.dumps(value, **options)
+    nested = {"version": 2, "months": [{"a": [1, 2]}, {"b": None}], "names": {"x": ["é"]}}
+    for options in ({}, {"separators": (",", ":")}, {"sort_keys": True}):
+        assert "".join(iter_json(nested, **options)) == json.dumps(nested, **options)
+    assert "".join(iter_json({"a": {1: 2}})) == json.dumps({"a": {1: 2}})
+    assert b"".join(iter_json_bytes(value, ensure_ascii=False)) == json.dumps(value, ensure_ascii=False).encode()
+
+
+def test_streamed_artifacts_are_only_replaced_when_changed(tmp_path: Path) -> None:
+    build = BuildManifest.load(tmp_path)
+    assert build.write_chunks("page.html", [b"<p>", b"one</p>"])
+    assert not build.write_chunks("page.html", iter([b"<p>one</p>"]))
+    assert build.write_chunks("page.html", [b"<p>two</p>"])
+
+    assert (tmp_path / "page.html").read_bytes() == b"<p>two</p>"
+    assert [path.name for path in tmp_path.iterdir()] == ["page.html"]  # no temp files left behind